@@ -81,4 +81,61 @@ class Config:
     GCS_PROJECT_ID = os.environ.get('GCS_PROJECT_ID', 'focused-mote-477703-f0')
     # Public URL base for images (e.g., https://storage.googleapis.com/gsf-app-product-images/)
     GCS_PUBLIC_URL_BASE = os.environ.get('GCS_PUBLIC_URL_BASE', f'https://storage.googleapis.com/{GCS_BUCKET_NAME}')
-
+    
+    # Bearer token resolution cache (see utils/auth.py)
+    # Entries are evicted explicitly on logout/ban/role changes; TTL bounds staleness across instances
+    AUTH_CACHE_TTL_SECONDS = int(os.environ.get('AUTH_CACHE_TTL_SECONDS') or 60)
+    AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES') or 10000)
+    # Minimum seconds between sliding-expiry write-backs for the same token
+    AUTH_TOKEN_REFRESH_INTERVAL_SECONDS = int(os.environ.get('AUTH_TOKEN_REFRESH_INTERVAL_SECONDS') or 3600)
+    
+    # Token mode for phone OTP / Google logins: 'opaque' (AuthToken rows) or 'jwt' (signed, stateless)
+    # Opaque tokens issued earlier keep working in either mode
+    AUTH_TOKEN_MODE = os.environ.get('AUTH_TOKEN_MODE', 'opaque')
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or SECRET_KEY
+    JWT_ACCESS_TOKEN_TTL_SECONDS = int(os.environ.get('JWT_ACCESS_TOKEN_TTL_SECONDS') or 86400)
+    # How often each worker reloads the revocation denylist for stateless tokens
+    AUTH_DENYLIST_REFRESH_SECONDS = int(os.environ.get('AUTH_DENYLIST_REFRESH_SECONDS') or 30)
+    
+    # Per-process sold-out gate in front of order creation (see utils/stock_management.py)
+    # Known-short products are rejected without a transaction until the entry expires or stock is restored
+    STOCK_GATE_TTL_SECONDS = int(os.environ.get('STOCK_GATE_TTL_SECONDS') or 10)
+    
+    # How often each worker re-checks the active delivery fee config version (see utils/shipping.py)
+    DELIVERY_FEE_TABLE_REFRESH_SECONDS = int(os.environ.get('DELIVERY_FEE_TABLE_REFRESH_SECONDS') or 5)
+    
+    # How often each worker re-checks the product catalog fingerprint (see utils/catalog.py)
+    CATALOG_VERSION_CHECK_SECONDS = int(os.environ.get('CATALOG_VERSION_CHECK_SECONDS') or 5)
+    
+    # How often each worker re-checks the group deal fingerprint behind cached deal menus (see utils/deal_menu.py)
+    DEAL_MENU_CHECK_SECONDS = int(os.environ.get('DEAL_MENU_CHECK_SECONDS') or 5)
+    
+    # Live deal stock endpoint and SSE stream (see utils/stock_events.py)
+    # Snapshot lifetime for GET /api/group-deals/<id>/stock (also sent as Cache-Control max-age)
+    DEAL_STOCK_TTL_SECONDS = int(os.environ.get('DEAL_STOCK_TTL_SECONDS') or 2)
+    # Streams re-read stock at least this often to pick up changes committed by other workers
+    DEAL_STOCK_STREAM_POLL_SECONDS = int(os.environ.get('DEAL_STOCK_STREAM_POLL_SECONDS') or 3)
+    # Each stream holds a gunicorn thread; cap them per worker and end them so clients reconnect
+    DEAL_STOCK_STREAM_LIMIT = int(os.environ.get('DEAL_STOCK_STREAM_LIMIT') or 4)
+    DEAL_STOCK_STREAM_MAX_SECONDS = int(os.environ.get('DEAL_STOCK_STREAM_MAX_SECONDS') or 300)
+    
+    # Per-worker cache of per-product sales totals for listings with stats (see utils/sales_stats.py)
+    SALES_TOTALS_TTL_SECONDS = int(os.environ.get('SALES_TOTALS_TTL_SECONDS') or 60)
+    
+    # How often each worker flushes queued sales stats changes (see utils/sales_stats.py)
+    SALES_STATS_FLUSH_SECONDS = int(os.environ.get('SALES_STATS_FLUSH_SECONDS') or 2)
+    
+    # How long the admin order list may reuse a previous total for the same filters (total=cached)
+    ADMIN_ORDER_COUNT_TTL_SECONDS = int(os.environ.get('ADMIN_ORDER_COUNT_TTL_SECONDS') or 30)
+    
+    # Orders per transaction in bulk order status updates (see utils/order_lifecycle.py)
+    ORDER_STATUS_BULK_CHUNK_SIZE = int(os.environ.get('ORDER_STATUS_BULK_CHUNK_SIZE') or 500)
+    
+    # Users per transaction in bulk user source / status / role changes (see utils/user_bulk.py)
+    USER_BULK_CHUNK_SIZE = int(os.environ.get('USER_BULK_CHUNK_SIZE') or 500)
+    
+    # Orders hydrated per batch when streaming the duplicate order report (see utils/duplicate_orders.py)
+    DUPLICATE_ORDERS_BATCH_SIZE = int(os.environ.get('DUPLICATE_ORDERS_BATCH_SIZE') or 200)
+    
+    # Seconds a sales stats flush waits for another worker's flush to finish (see utils/sales_stats.py)
+    SALES_STATS_LOCK_TIMEOUT_SECONDS = int(os.environ.get('SALES_STATS_LOCK_TIMEOUT_SECONDS') or 30)
@@ -229,6 +229,35 @@ class PaymentMethod(str, Enum):
         return {method.value: cls.get_label(method) for method in cls}
 
 
+class StockMode(str, Enum):
+    """
+    Stock reservation mode for a product in a group deal
+    locked: SELECT ... FOR UPDATE, validate, then write (default)
+    atomic: lock-free conditional decrement for high-demand products
+    """
+    LOCKED = 'locked'      # 行锁
+    ATOMIC = 'atomic'      # 原子扣减
+
+    @classmethod
+    def get_label(cls, mode):
+        """Get Chinese label for stock mode"""
+        labels = {
+            cls.LOCKED: '行锁',
+            cls.ATOMIC: '原子扣减',
+        }
+        return labels.get(mode, mode)
+    
+    @classmethod
+    def get_all_values(cls):
+        """Get all valid stock modes"""
+        return [mode.value for mode in cls]
+    
+    @classmethod
+    def get_all_labels(cls):
+        """Get all stock modes with labels"""
+        return {mode.value: cls.get_label(mode) for mode in cls}
+
+
 # Export for easy access
-__all__ = ['OrderStatus', 'PaymentStatus', 'GroupDealStatus', 'UserStatus', 'DeliveryMethod', 'PaymentMethod']
+__all__ = ['OrderStatus', 'PaymentStatus', 'GroupDealStatus', 'UserStatus', 'DeliveryMethod', 'PaymentMethod', 'StockMode']
 
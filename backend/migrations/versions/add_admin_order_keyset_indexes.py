@@ -0,0 +1,26 @@
+"""add_admin_order_keyset_indexes
+
+Revision ID: add_admin_order_keyset_indexes
+Revises: add_sales_stats_cumulative_columns
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_admin_order_keyset_indexes'
+down_revision = 'add_sales_stats_cumulative_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Admin order list keyset pagination on (created_at, id), overall and per group deal
+    op.create_index('idx_orders_created', 'orders', ['created_at', 'id'])
+    op.create_index('idx_orders_group_deal_created', 'orders', ['group_deal_id', 'created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_orders_group_deal_created', table_name='orders')
+    op.drop_index('idx_orders_created', table_name='orders')
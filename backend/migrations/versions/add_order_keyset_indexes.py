@@ -0,0 +1,26 @@
+"""add_order_keyset_indexes
+
+Revision ID: add_order_keyset_indexes
+Revises: add_token_revocations
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_keyset_indexes'
+down_revision = 'add_token_revocations'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pagination on (created_at, id) and incremental sync on (updated_at, id) per user
+    op.create_index('idx_orders_user_created', 'orders', ['user_id', 'created_at', 'id'])
+    op.create_index('idx_orders_user_updated', 'orders', ['user_id', 'updated_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_orders_user_updated', table_name='orders')
+    op.drop_index('idx_orders_user_created', table_name='orders')
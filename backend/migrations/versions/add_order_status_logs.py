@@ -0,0 +1,38 @@
+"""add_order_status_logs
+
+Revision ID: add_order_status_logs
+Revises: add_search_indexes
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_status_logs'
+down_revision = 'add_search_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_status_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('from_status', sa.String(length=50), nullable=True),
+        sa.Column('to_status', sa.String(length=50), nullable=False),
+        sa.Column('changed_by', sa.Integer(), nullable=True),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['changed_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_order_status_logs_order_created', 'order_status_logs', ['order_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_order_status_logs_order_created', table_name='order_status_logs')
+    op.drop_table('order_status_logs')
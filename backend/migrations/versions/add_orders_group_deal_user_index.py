@@ -0,0 +1,24 @@
+"""add_orders_group_deal_user_index
+
+Revision ID: add_orders_group_deal_user_index
+Revises: add_order_status_logs
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_orders_group_deal_user_index'
+down_revision = 'add_order_status_logs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Duplicate order report: window over (user_id, group_deal_id) within a deal
+    op.create_index('idx_orders_group_deal_user', 'orders', ['group_deal_id', 'user_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('idx_orders_group_deal_user', table_name='orders')
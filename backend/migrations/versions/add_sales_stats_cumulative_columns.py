@@ -0,0 +1,40 @@
+"""add_sales_stats_cumulative_columns
+
+Revision ID: add_sales_stats_cumulative_columns
+Revises: add_stock_mode_to_group_deal_products
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_sales_stats_cumulative_columns'
+down_revision = 'add_stock_mode_to_group_deal_products'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Running totals per product up to and including sale_date; range totals are a difference of two rows
+    op.add_column('product_sales_stats', sa.Column('cumulative_quantity_sold', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('product_sales_stats', sa.Column('cumulative_order_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from existing daily rows
+    op.execute("""
+        UPDATE product_sales_stats s
+        JOIN (
+            SELECT id,
+                   SUM(quantity_sold) OVER (PARTITION BY product_id ORDER BY sale_date) AS cumulative_quantity_sold,
+                   SUM(order_count) OVER (PARTITION BY product_id ORDER BY sale_date) AS cumulative_order_count
+            FROM product_sales_stats
+        ) running ON running.id = s.id
+        SET s.cumulative_quantity_sold = running.cumulative_quantity_sold,
+            s.cumulative_order_count = running.cumulative_order_count
+    """)
+
+
+def downgrade():
+    op.drop_column('product_sales_stats', 'cumulative_order_count')
+    op.drop_column('product_sales_stats', 'cumulative_quantity_sold')
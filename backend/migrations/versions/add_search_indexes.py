@@ -0,0 +1,92 @@
+"""add_search_indexes
+
+Revision ID: add_search_indexes
+Revises: add_admin_order_keyset_indexes
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_search_indexes'
+down_revision = 'add_admin_order_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def _tokens(values):
+    # Same grams as models/user.py tokens_for_values at the time of this migration
+    tokens = set()
+    for value in values:
+        text = unicodedata.normalize('NFKC', value or '').lower().strip()
+        tokens |= {text[i:i + size] for size in (1, 2, 3) for i in range(len(text) - size + 1)}
+    tokens.discard('')
+    return tokens
+
+
+def upgrade():
+    connection = op.get_bind()
+
+    # Stored pickup code (last segment of GSF-{timestamp}-{code}) for QR scans
+    op.add_column('orders', sa.Column('pickup_code', sa.String(length=20), nullable=True))
+    connection.execute(sa.text("UPDATE orders SET pickup_code = UPPER(SUBSTRING_INDEX(order_number, '-', -1))"))
+    op.create_index(op.f('ix_orders_pickup_code'), 'orders', ['pickup_code'], unique=False)
+
+    # Reversed phone digits for suffix search
+    op.add_column('users', sa.Column('phone_reversed', sa.String(length=20), nullable=True))
+    connection.execute(sa.text(
+        "UPDATE users SET phone_reversed = NULLIF(REVERSE(REGEXP_REPLACE(phone, '[^0-9]', '')), '') "
+        "WHERE phone IS NOT NULL"
+    ))
+    op.create_index(op.f('ix_users_phone_reversed'), 'users', ['phone_reversed'], unique=False)
+
+    # N-gram token index over nickname, email and WeChat ID
+    op.create_table('user_search_tokens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(length=3, collation='utf8mb4_bin'), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_search_tokens_user_id'), 'user_search_tokens', ['user_id'], unique=False)
+    op.create_index('idx_user_search_tokens_token_user', 'user_search_tokens', ['token', 'user_id'], unique=True)
+
+    tokens_table = sa.table(
+        'user_search_tokens',
+        sa.column('user_id', sa.Integer),
+        sa.column('token', sa.String),
+        sa.column('created_at', sa.DateTime),
+        sa.column('updated_at', sa.DateTime)
+    )
+    now = connection.execute(sa.text('SELECT NOW()')).scalar()
+    last_id = 0
+    while True:
+        users = connection.execute(sa.text(
+            'SELECT id, nickname, email, wechat FROM users WHERE id > :last_id ORDER BY id LIMIT 500'
+        ), {'last_id': last_id}).all()
+        if not users:
+            break
+        rows = [
+            {'user_id': user_id, 'token': token, 'created_at': now, 'updated_at': now}
+            for user_id, *values in users
+            for token in _tokens(values)
+        ]
+        if rows:
+            connection.execute(tokens_table.insert(), rows)
+        last_id = users[-1][0]
+
+
+def downgrade():
+    op.drop_index('idx_user_search_tokens_token_user', table_name='user_search_tokens')
+    op.drop_index(op.f('ix_user_search_tokens_user_id'), table_name='user_search_tokens')
+    op.drop_table('user_search_tokens')
+    op.drop_index(op.f('ix_users_phone_reversed'), table_name='users')
+    op.drop_column('users', 'phone_reversed')
+    op.drop_index(op.f('ix_orders_pickup_code'), table_name='orders')
+    op.drop_column('orders', 'pickup_code')
@@ -0,0 +1,25 @@
+"""add_stock_mode_to_group_deal_products
+
+Revision ID: add_stock_mode_to_group_deal_products
+Revises: add_order_keyset_indexes
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_stock_mode_to_group_deal_products'
+down_revision = 'add_order_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 'locked' (SELECT ... FOR UPDATE) or 'atomic' (conditional decrement without row locks)
+    op.add_column('group_deal_products', sa.Column('stock_mode', sa.String(length=20), nullable=False, server_default='locked'))
+
+
+def downgrade():
+    op.drop_column('group_deal_products', 'stock_mode')
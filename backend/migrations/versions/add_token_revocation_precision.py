@@ -0,0 +1,32 @@
+"""add_token_revocation_precision
+
+Revision ID: add_token_revocation_precision
+Revises: add_orders_group_deal_user_index
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_token_revocation_precision'
+down_revision = 'add_orders_group_deal_user_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Per-user cut-offs are compared with millisecond token issue times
+    op.alter_column('token_revocations', 'revoked_before',
+                    existing_type=sa.DateTime(),
+                    type_=mysql.DATETIME(fsp=6),
+                    existing_nullable=True)
+
+
+def downgrade():
+    op.alter_column('token_revocations', 'revoked_before',
+                    existing_type=mysql.DATETIME(fsp=6),
+                    type_=sa.DateTime(),
+                    existing_nullable=True)
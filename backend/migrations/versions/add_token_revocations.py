@@ -0,0 +1,41 @@
+"""add_token_revocations
+
+Revision ID: add_token_revocations
+Revises: migrate_delivery_fee_to_tiers
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_token_revocations'
+down_revision = 'migrate_delivery_fee_to_tiers'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Denylist for stateless access tokens (single jti or per-user cut-off)
+    op.create_table('token_revocations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('jti', sa.String(length=64), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('revoked_before', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_token_revocations_jti', 'token_revocations', ['jti'])
+    op.create_index('ix_token_revocations_user_id', 'token_revocations', ['user_id'])
+    op.create_index('ix_token_revocations_expires_at', 'token_revocations', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_token_revocations_expires_at', table_name='token_revocations')
+    op.drop_index('ix_token_revocations_user_id', table_name='token_revocations')
+    op.drop_index('ix_token_revocations_jti', table_name='token_revocations')
+    op.drop_table('token_revocations')
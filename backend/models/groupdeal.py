@@ -1,7 +1,7 @@
 from models.base import BaseModel, utc_now
 from models import db
 from datetime import datetime
-from constants.status_enums import GroupDealStatus
+from constants.status_enums import GroupDealStatus, StockMode
 
 class GroupDeal(BaseModel):
     """Group Deal model - creates group buy events with order window and pickup date"""
@@ -63,12 +63,16 @@ class GroupDealProduct(BaseModel):
     # Stock limit for this deal (optional)
     deal_stock_limit = db.Column(db.Integer, nullable=True)
     
+    # Reservation mode (see constants.status_enums.StockMode); 'atomic' skips row locks for hot products
+    stock_mode = db.Column(db.String(20), default=StockMode.LOCKED.value, nullable=False)
+    
     def to_dict(self):
         data = super().to_dict()
         data.update({
             'group_deal_id': self.group_deal_id,
             'product_id': self.product_id,
-            'deal_stock_limit': self.deal_stock_limit
+            'deal_stock_limit': self.deal_stock_limit,
+            'stock_mode': self.stock_mode
         })
         return data
 
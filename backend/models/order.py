@@ -3,6 +3,7 @@ from models import db
 from sqlalchemy import Numeric
 from datetime import datetime
 from constants.status_enums import OrderStatus, PaymentStatus, DeliveryMethod
+from sqlalchemy.orm import validates
 
 class Order(BaseModel):
     """Order model - tracks order details, payment, pickup status, and points"""
@@ -15,6 +16,10 @@ class Order(BaseModel):
     # Order number (unique identifier)
     order_number = db.Column(db.String(50), unique=True, nullable=False, index=True)
     
+    # Pickup code: last segment of order_number (GSF-{timestamp}-{pickup_code}), kept in
+    # sync with it so QR pickup scans are an index seek instead of LIKE '%-CODE'
+    pickup_code = db.Column(db.String(20), nullable=True, index=True)
+    
     # Order totals
     subtotal = db.Column(Numeric(10, 2), nullable=False)
     tax = db.Column(Numeric(10, 2), default=0, nullable=False)
@@ -59,6 +64,22 @@ class Order(BaseModel):
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     address = db.relationship('Address', backref='orders')
     
+    # Composite indexes for keyset pagination / incremental sync of a user's orders,
+    # for the admin order list (all orders, or one group deal's) paged on (created_at, id),
+    # and for the duplicate order report
+    __table_args__ = (
+        db.Index('idx_orders_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('idx_orders_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('idx_orders_created', 'created_at', 'id'),
+        db.Index('idx_orders_group_deal_created', 'group_deal_id', 'created_at', 'id'),
+        db.Index('idx_orders_group_deal_user', 'group_deal_id', 'user_id', 'created_at'),
+    )
+    
+    @validates('order_number')
+    def _sync_pickup_code(self, key, order_number):
+        self.pickup_code = order_number.rsplit('-', 1)[-1].upper() if order_number else None
+        return order_number
+    
     def to_dict(self, include_editable=True):
         data = super().to_dict()
         
@@ -106,6 +127,31 @@ class Order(BaseModel):
         
         return data
 
+class OrderStatusLog(BaseModel):
+    """Append-only history of order status changes (written in bulk, never updated)"""
+    __tablename__ = 'order_status_logs'
+    
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False)
+    from_status = db.Column(db.String(50), nullable=True)
+    to_status = db.Column(db.String(50), nullable=False)
+    changed_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Admin user ID
+    source = db.Column(db.String(20), nullable=False)  # 'admin' (single order), 'bulk'
+    
+    __table_args__ = (
+        db.Index('idx_order_status_logs_order_created', 'order_id', 'created_at'),
+    )
+    
+    def to_dict(self):
+        data = super().to_dict()
+        data.update({
+            'order_id': self.order_id,
+            'from_status': self.from_status,
+            'to_status': self.to_status,
+            'changed_by': self.changed_by,
+            'source': self.source
+        })
+        return data
+
 class OrderItem(BaseModel):
     """Order Item model - individual items in an order"""
     __tablename__ = 'order_items'
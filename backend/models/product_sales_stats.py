@@ -21,6 +21,11 @@ class ProductSalesStats(BaseModel):
     quantity_sold = db.Column(Integer, default=0, nullable=False)  # Total quantity sold
     order_count = db.Column(Integer, default=0, nullable=False)  # Number of orders containing this product
     
+    # Running totals for this product up to and including sale_date (see utils/sales_stats.py)
+    # Sales between two dates = cumulative at the end row - cumulative at the last row before the start
+    cumulative_quantity_sold = db.Column(Integer, default=0, nullable=False)
+    cumulative_order_count = db.Column(Integer, default=0, nullable=False)
+    
     # Relationships
     product = db.relationship('Product', backref='sales_stats', lazy=True)
     
@@ -35,7 +40,9 @@ class ProductSalesStats(BaseModel):
             'product_id': self.product_id,
             'sale_date': self.sale_date.isoformat() if self.sale_date else None,
             'quantity_sold': self.quantity_sold,
-            'order_count': self.order_count
+            'order_count': self.order_count,
+            'cumulative_quantity_sold': self.cumulative_quantity_sold,
+            'cumulative_order_count': self.cumulative_order_count
         })
         return data
 
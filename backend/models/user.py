@@ -3,6 +3,39 @@ from models import db
 from datetime import datetime, timezone
 from models.base import utc_now
 from constants.status_enums import UserStatus
+import unicodedata
+from sqlalchemy import delete, event, insert, inspect
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session, validates
+
+
+# Search tokens: every 1-3 character gram of these fields (see UserSearchToken)
+TOKEN_LENGTH = 3
+TOKEN_FIELDS = ('nickname', 'email', 'wechat')
+
+
+def phone_digits(phone):
+    """Digits of a phone number ('+1 (416) 555-1234' -> '14165551234')"""
+    return ''.join(c for c in (phone or '') if c.isdigit())
+
+
+def normalize_text(value):
+    """NFKC-normalize and lowercase (full-width letters/digits fold to ASCII)"""
+    return unicodedata.normalize('NFKC', value or '').lower().strip()
+
+
+def text_grams(text, sizes=range(1, TOKEN_LENGTH + 1)):
+    """Every substring of text with one of the given lengths"""
+    return {text[i:i + size] for size in sizes for i in range(len(text) - size + 1)}
+
+
+def tokens_for_values(values):
+    """All 1-3 character grams of the given field values"""
+    tokens = set()
+    for value in values:
+        tokens |= text_grams(normalize_text(value))
+    tokens.discard('')
+    return tokens
 
 class User(BaseModel):
     """User model"""
@@ -10,6 +43,9 @@ class User(BaseModel):
     
     # Required: phone number (nullable for WeChat-only users, but required for phone auth)
     phone = db.Column(db.String(20), unique=True, nullable=True, index=True)
+    # Phone digits reversed, kept in sync with phone: suffix search ("ends with 1234")
+    # becomes an index prefix scan (phone_reversed LIKE '4321%'), see utils/search.py
+    phone_reversed = db.Column(db.String(20), nullable=True, index=True)
     
     # Optional: nickname
     nickname = db.Column(db.String(255), nullable=True)
@@ -49,6 +85,11 @@ class User(BaseModel):
     tokens = db.relationship('AuthToken', backref='user', lazy=True, cascade='all, delete-orphan')
     roles = db.relationship('UserRole', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    @validates('phone')
+    def _sync_phone_reversed(self, key, phone):
+        self.phone_reversed = phone_digits(phone)[::-1] or None
+        return phone
+    
     @property
     def is_active(self):
         """Check if user is active"""
@@ -140,3 +181,72 @@ class UserRole(BaseModel):
             'role': self.role
         })
         return data
+
+class TokenRevocation(BaseModel):
+    """Revocation entry for stateless (JWT) access tokens.
+
+    Either revokes a single token by jti (logout) or every token a user was
+    issued before revoked_before (ban, role removal). Rows are only needed
+    until the tokens they cover would have expired anyway.
+    """
+    __tablename__ = 'token_revocations'
+    
+    jti = db.Column(db.String(64), nullable=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    # Microseconds, so a token re-issued right after a ban or role change is not caught by it
+    revoked_before = db.Column(db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql'), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def to_dict(self):
+        data = super().to_dict()
+        data.update({
+            'jti': self.jti,
+            'user_id': self.user_id,
+            'revoked_before': self.revoked_before.isoformat() if self.revoked_before else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        })
+        return data
+
+
+class UserSearchToken(BaseModel):
+    """N-gram index over users' nickname, email and WeChat ID for admin search.
+
+    One row per distinct 1-3 character gram (NFKC, lowercased) of those fields,
+    rewritten in the same flush as the user row (_sync_user_tokens below), so
+    the index never lags behind a committed change. Grams rather than words so
+    CJK nicknames are searchable by any substring; queries are in
+    utils/search.py.
+    """
+    __tablename__ = 'user_search_tokens'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    # Binary collation: tokens are already normalized, and 'a'/'á' must stay distinct rows
+    token = db.Column(db.String(3, collation='utf8mb4_bin'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('idx_user_search_tokens_token_user', 'token', 'user_id', unique=True),
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_user_tokens(session, flush_context):
+    """Rewrite tokens for users inserted or with a changed searchable field in this flush"""
+    changed = [obj for obj in session.new if isinstance(obj, User)]
+    for obj in session.dirty:
+        if isinstance(obj, User) and obj not in session.deleted:
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in TOKEN_FIELDS):
+                changed.append(obj)
+    if not changed:
+        return
+
+    rows = [
+        {'user_id': user.id, 'token': token}
+        for user in changed
+        for token in tokens_for_values([getattr(user, field) for field in TOKEN_FIELDS])
+    ]
+
+    connection = session.connection()
+    connection.execute(delete(UserSearchToken).where(UserSearchToken.user_id.in_([user.id for user in changed])))
+    if rows:
+        connection.execute(insert(UserSearchToken), rows)
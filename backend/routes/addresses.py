@@ -1,36 +1,14 @@
 from flask import Blueprint, jsonify, request, current_app
 from models import db
 from models.address import Address
-from models.user import User, AuthToken
 from datetime import datetime, timezone
 from models.base import utc_now
 from schemas.address import CreateAddressSchema, UpdateAddressSchema
 from schemas.utils import validate_request
+from utils.auth import require_auth
 
 addresses_bp = Blueprint('addresses', __name__)
 
-def require_auth():
-    """Check if user is authenticated and return user_id"""
-    auth_header = request.headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        token = auth_header.replace('Bearer ', '').strip()
-    else:
-        token = auth_header.strip()
-    
-    if not token:
-        return None, jsonify({'error': 'No token provided'}), 401
-    
-    auth_token = AuthToken.query.filter_by(token=token, is_revoked=False).first()
-    if not auth_token or not auth_token.is_valid():
-        return None, jsonify({'error': 'Invalid or expired token'}), 401
-    
-    # Get user
-    user = User.query.get(auth_token.user_id)
-    if not user or not user.is_active:
-        return None, jsonify({'error': 'User not found or inactive'}), 401
-    
-    return user.id, None, None
-
 @addresses_bp.route('/addresses', methods=['GET'])
 def get_user_addresses():
     """Get all addresses for the current authenticated user"""
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request, current_app, Response
+from flask import Blueprint, jsonify, request, current_app, Response, g, stream_with_context
 from models import db
 from models.product import Product
 from models.user import User, AuthToken, UserRole
@@ -11,15 +11,15 @@ from models.product_sales_stats import ProductSalesStats
 from models.delivery_fee_config import DeliveryFeeConfig
 from models.sdr import SDR, CommissionRule, CommissionRecord
 from models.base import utc_now, est_now
-from utils.sales_stats import update_product_sales_stats, get_product_sales_by_date_range, get_popular_products
+from utils.sales_stats import record_order_sales, record_orders_sales, record_order_sales_change, get_product_sales_by_date_range, get_popular_products, get_sales_totals, get_sales_time_series, SERIES_GRANULARITIES
 from utils.date_helpers import normalize_date_start, normalize_date_end
 from utils.commission import calculate_commission_for_group_deal, get_commission_summary_for_group_deal
 from datetime import datetime, timedelta, timezone, date
 from config import Config
-from constants.status_enums import OrderStatus, PaymentStatus, GroupDealStatus, UserStatus, PaymentMethod, DeliveryMethod
+from constants.status_enums import OrderStatus, PaymentStatus, GroupDealStatus, UserStatus, PaymentMethod, DeliveryMethod, StockMode
 from schemas.product import CreateProductSchema, UpdateProductSchema, BulkUpdateSortOrderSchema
 from schemas.groupdeal import CreateGroupDealSchema, UpdateGroupDealSchema, UpdateGroupDealStatusSchema
-from schemas.admin import CreateSupplierSchema, UpdateSupplierSchema, AssignRoleSchema, UpdateOrderStatusSchema, UpdateOrderPaymentSchema, MergeOrdersSchema, UpdateDeliveryFeeConfigSchema, UpdateUserSchema
+from schemas.admin import CreateSupplierSchema, UpdateSupplierSchema, AssignRoleSchema, UpdateOrderStatusSchema, UpdateOrderPaymentSchema, MergeOrdersSchema, UpdateDeliveryFeeConfigSchema, UpdateUserSchema, BulkUserSourceSchema, BulkUserStatusSchema, BulkUserRoleSchema
 from schemas.order import UpdateOrderWeightsSchema, AdminUpdateOrderSchema
 from schemas.utils import validate_request
 from urllib.parse import quote
@@ -30,10 +30,21 @@ from werkzeug.utils import secure_filename
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload, selectinload
 from decimal import Decimal
-from utils.shipping import calculate_shipping_fee
-from utils.stock_management import restore_stock
+from utils.shipping import calculate_shipping_fee, invalidate_delivery_fee_table
+from utils.pricing import get_compiled_pricing, price_line, total_from_rate
+from utils.catalog import bump_catalog_version
+from utils.deal_menu import serialize_deals, rebuild_deal_menu
+from utils.pagination import InvalidCursorError, apply_keyset, cached_count, decode_cursor, encode_cursor, fetch_page
+from utils.stock_events import publish_stock_change
+from utils.stock_management import restore_stock, invalidate_stock_gate
+from utils.order_lifecycle import cascade_group_deal_status, bulk_set_order_status, log_status_changes
+from utils.search import order_search_clause, search_user_ids
+from utils.auth import get_bearer_token, resolve_principal, refresh_token_expiry, evict_user, evict_users, revoke_user_tokens, revoke_users_tokens
+from utils.duplicate_orders import find_duplicate_sets, batch_duplicate_sets, hydrate_duplicate_sets
+from utils.user_bulk import user_filters, bulk_set_user_fields, bulk_assign_role, bulk_remove_role
 import csv
 import io
+import json
 
 # Optional imports for image upload
 try:
@@ -54,40 +65,31 @@ except ImportError:
 
 admin_bp = Blueprint('admin', __name__)
 
+# GET /admin/orders: largest keyset page and accepted ?total= modes
+ADMIN_ORDERS_MAX_PAGE_SIZE = 1000
+ADMIN_ORDER_TOTAL_MODES = ('exact', 'cached', 'none')
+
 def require_admin_auth():
     """Check if user is authenticated and has admin role"""
-    auth_header = request.headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        token = auth_header.replace('Bearer ', '').strip()
-    else:
-        token = auth_header.strip()
-    
+    token = get_bearer_token()
     if not token:
         return None, jsonify({'error': 'No token provided'}), 401
     
-    auth_token = AuthToken.query.filter_by(token=token, is_revoked=False).first()
-    if not auth_token or not auth_token.is_valid():
+    principal = resolve_principal(token)
+    if not principal:
         return None, jsonify({'error': 'Invalid or expired token'}), 401
     
-    # Refresh token expiration on each use (extend to 100 years from now)
-    # Token effectively never expires
-    # Make sure expires_at is stored as naive datetime (MySQL doesn't support timezone-aware)
-    new_expires_at = utc_now() + timedelta(days=36500)  # 100 years
-    auth_token.expires_at = new_expires_at  # Already naive UTC datetime
-    db.session.commit()
+    # Sliding expiration: written back at most once per AUTH_TOKEN_REFRESH_INTERVAL_SECONDS
+    refresh_token_expiry(principal)
     
-    # Get user and check admin role
-    user = User.query.get(auth_token.user_id)
-    if not user:
-        return None, jsonify({'error': 'User not found'}), 401
-    
-    if not user.is_active:
+    if not principal.is_active:
         return None, jsonify({'error': 'User account is inactive'}), 403
     
-    if not user.is_admin:
+    if not principal.is_admin:
         return None, jsonify({'error': 'Admin access required'}), 403
     
-    return auth_token.user_id, None, None
+    g.principal = principal
+    return principal.user_id, None, None
 
 def get_gcs_client():
     """Get Google Cloud Storage client"""
@@ -238,6 +240,7 @@ def create_product():
         
         db.session.add(product)
         db.session.commit()
+        bump_catalog_version()
         
         current_app.logger.info(f'Created product: {product.id} - {product.name}')
         
@@ -323,6 +326,7 @@ def update_product(product_id):
             product.counts_toward_free_shipping = validated_data['counts_toward_free_shipping']
         
         db.session.commit()
+        bump_catalog_version()
         
         current_app.logger.info(f'Updated product: {product.id} - {product.name}')
         
@@ -351,6 +355,7 @@ def delete_product(product_id):
         # Soft delete - set is_active to False
         product.is_active = False
         db.session.commit()
+        bump_catalog_version()
         
         current_app.logger.info(f'Deleted product: {product.id} - {product.name}')
         
@@ -387,6 +392,7 @@ def update_product_sort_orders():
                 updated_count += 1
         
         db.session.commit()
+        bump_catalog_version()
         
         current_app.logger.info(f'Updated sort order for {updated_count} products')
         
@@ -425,17 +431,9 @@ def get_users():
         # Build query
         query = User.query
         
-        # Apply search filter
+        # Apply search filter (phone prefix/suffix, nickname/email/WeChat substring via the token index)
         if search:
-            search_term = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    User.phone.like(search_term),
-                    User.nickname.like(search_term),
-                    User.email.like(search_term),
-                    User.wechat.like(search_term)
-                )
-            )
+            query = query.filter(User.id.in_(search_user_ids(search)))
         
         # Apply status filter
         if status_filter:
@@ -535,6 +533,10 @@ def update_user(user_id):
             user.status = data['status']
         
         db.session.commit()
+        if not user.is_active:
+            revoke_user_tokens(user.id)
+        else:
+            evict_user(user.id)
         
         current_app.logger.info(f'Admin {admin_user_id} updated user {user_id}')
         
@@ -577,6 +579,7 @@ def impersonate_user(user_id):
         )
         db.session.add(auth_token)
         db.session.commit()
+        evict_user(target_user.id)
         
         # Get app frontend URL from config
         app_frontend_url = Config.APP_FRONTEND_URL
@@ -618,6 +621,8 @@ def ban_user(user_id):
         user = User.query.get_or_404(user_id)
         user.status = 'banned'
         db.session.commit()
+        # Also cuts off stateless access tokens, which carry no live status
+        revoke_user_tokens(user.id)
         
         current_app.logger.info(f'Banned user: {user.id} - {user.phone or user.email}')
         
@@ -645,6 +650,7 @@ def unban_user(user_id):
         user = User.query.get_or_404(user_id)
         user.status = UserStatus.ACTIVE.value
         db.session.commit()
+        evict_user(user.id)
         
         current_app.logger.info(f'Unbanned user: {user.id} - {user.phone or user.email}')
         
@@ -661,60 +667,132 @@ def unban_user(user_id):
             'message': str(e)
         }), 500
 
+def _user_bulk_chunk_size():
+    return current_app.config.get('USER_BULK_CHUNK_SIZE', Config.USER_BULK_CHUNK_SIZE)
+
 @admin_bp.route('/users/bulk-assign-source', methods=['POST'])
 def bulk_assign_user_source():
-    """Bulk assign user source to multiple users (admin only)"""
+    """Bulk assign user source (admin only)
+    
+    Body: user_source, plus user_ids or filter ({status, user_source, role, search})
+    """
     user_id, error_response, status_code = require_admin_auth()
     if error_response:
         return error_response, status_code
     
+    validated_data, error_response, status_code = validate_request(BulkUserSourceSchema)
+    if error_response:
+        return error_response, status_code
+    
+    user_source = validated_data['user_source']
+    
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        user_ids = data.get('user_ids', [])
-        user_source = data.get('user_source', '').strip()
+        filters = user_filters(validated_data.get('user_ids'), validated_data.get('filter'))
+        user_ids = bulk_set_user_fields(filters, {'user_source': user_source}, _user_bulk_chunk_size())
+        evict_users(user_ids)
         
-        if not user_ids:
-            return jsonify({'error': 'user_ids is required'}), 400
+        current_app.logger.info(f'Admin {user_id} bulk updated {len(user_ids)} users source to {user_source}')
         
-        if not user_source:
-            return jsonify({'error': 'user_source is required'}), 400
+        return jsonify({
+            'message': f'Successfully updated {len(user_ids)} users source to {user_source}',
+            'updated_count': len(user_ids),
+            'user_ids': user_ids
+        }), 200
         
-        # Validate user_source (should be "花泽" or "default")
-        if user_source not in ['花泽', 'default']:
-            return jsonify({'error': f'Invalid user_source: {user_source}. Must be "花泽" or "default"'}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error bulk updating user source: {e}', exc_info=True)
+        return jsonify({
+            'error': 'Failed to bulk update user source',
+            'message': str(e)
+        }), 500
+
+@admin_bp.route('/users/bulk-update-status', methods=['POST'])
+def bulk_update_user_status():
+    """Bulk ban / unban users (admin only)
+    
+    Body: status, plus user_ids or filter. The acting admin is never banned.
+    """
+    admin_user_id, error_response, status_code = require_admin_auth()
+    if error_response:
+        return error_response, status_code
+    
+    validated_data, error_response, status_code = validate_request(BulkUserStatusSchema)
+    if error_response:
+        return error_response, status_code
+    
+    status = validated_data['status']
+    
+    try:
+        filters = user_filters(validated_data.get('user_ids'), validated_data.get('filter'),
+                               exclude_user_id=admin_user_id if status != UserStatus.ACTIVE.value else None)
+        user_ids = bulk_set_user_fields(filters, {'status': status}, _user_bulk_chunk_size())
+        if status == UserStatus.ACTIVE.value:
+            evict_users(user_ids)
+        else:
+            # Also cuts off stateless access tokens, which carry no live status
+            revoke_users_tokens(user_ids)
         
-        # Get users to update
-        users = User.query.filter(User.id.in_(user_ids)).all()
+        current_app.logger.info(f'Admin {admin_user_id} bulk set {len(user_ids)} users to {status}')
         
-        if not users:
-            return jsonify({
-                'message': 'No users found',
-                'updated_count': 0
-            }), 200
+        return jsonify({
+            'message': f'Successfully updated {len(user_ids)} users to {UserStatus.get_label(status)}',
+            'updated_count': len(user_ids),
+            'user_ids': user_ids
+        }), 200
         
-        # Update all users
-        updated_count = 0
-        for user in users:
-            user.user_source = user_source
-            user.updated_at = utc_now()
-            updated_count += 1
-            current_app.logger.info(f'Bulk updated user {user.id} source to {user_source}')
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error bulk updating user status: {e}', exc_info=True)
+        return jsonify({
+            'error': 'Failed to bulk update user status',
+            'message': str(e)
+        }), 500
+
+@admin_bp.route('/users/bulk-roles', methods=['POST'])
+def bulk_update_user_roles():
+    """Bulk assign or remove a role (admin only)
+    
+    Body: role, action ('assign' or 'remove'), plus user_ids or filter.
+    The acting admin never loses the admin role this way.
+    """
+    admin_user_id, error_response, status_code = require_admin_auth()
+    if error_response:
+        return error_response, status_code
+    
+    validated_data, error_response, status_code = validate_request(BulkUserRoleSchema)
+    if error_response:
+        return error_response, status_code
+    
+    role_name = validated_data['role'].lower()
+    action = validated_data['action']
+    
+    try:
+        chunk_size = _user_bulk_chunk_size()
+        if action == 'assign':
+            filters = user_filters(validated_data.get('user_ids'), validated_data.get('filter'))
+            user_ids = bulk_assign_role(filters, role_name, chunk_size)
+            evict_users(user_ids)
+        else:
+            filters = user_filters(validated_data.get('user_ids'), validated_data.get('filter'),
+                                   exclude_user_id=admin_user_id if role_name == 'admin' else None)
+            user_ids = bulk_remove_role(filters, role_name, chunk_size)
+            # Stateless access tokens embed roles, so they must be revoked
+            revoke_users_tokens(user_ids)
         
-        db.session.commit()
+        current_app.logger.info(f'Admin {admin_user_id} bulk {action} role {role_name} for {len(user_ids)} users')
         
         return jsonify({
-            'message': f'Successfully updated {updated_count} users source to {user_source}',
-            'updated_count': updated_count
+            'message': f'Successfully {"assigned" if action == "assign" else "removed"} role {role_name} for {len(user_ids)} users',
+            'updated_count': len(user_ids),
+            'user_ids': user_ids
         }), 200
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f'Error bulk updating user source: {e}', exc_info=True)
+        current_app.logger.error(f'Error bulk updating user roles: {e}', exc_info=True)
         return jsonify({
-            'error': 'Failed to bulk update user source',
+            'error': 'Failed to bulk update user roles',
             'message': str(e)
         }), 500
 
@@ -843,6 +921,7 @@ def assign_user_role(user_id):
         user_role = UserRole(user_id=user.id, role=role_name)
         db.session.add(user_role)
         db.session.commit()
+        evict_user(user.id)
         
         current_app.logger.info(f'Assigned role {role_name} to user {user.id}')
         
@@ -881,6 +960,8 @@ def remove_user_role(user_id, role_name):
         
         db.session.delete(user_role)
         db.session.commit()
+        # Stateless access tokens embed roles, so they must be revoked
+        revoke_user_tokens(user.id)
         
         current_app.logger.info(f'Removed role {role_name} from user {user.id}')
         
@@ -925,22 +1006,8 @@ def get_group_deals():
         
         deals = pagination.items
         
-        # Include products for each deal
-        deals_data = []
-        for deal in deals:
-            deal_dict = deal.to_dict()
-            # Get products for this deal
-            deal_products = GroupDealProduct.query.filter_by(group_deal_id=deal.id).all()
-            products_data = []
-            for dp in deal_products:
-                product = Product.query.get(dp.product_id)
-                if product:
-                    product_dict = product.to_dict()
-                    product_dict['deal_stock_limit'] = dp.deal_stock_limit
-                    product_dict['group_deal_product_id'] = dp.id
-                    products_data.append(product_dict)
-            deal_dict['products'] = products_data
-            deals_data.append(deal_dict)
+        # Include products for each deal (fixed number of queries regardless of page size)
+        deals_data = serialize_deals(deals, admin_view=True)
         
         return jsonify({
             'group_deals': deals_data,
@@ -971,19 +1038,7 @@ def get_group_deal(deal_id):
             GroupDeal.id == deal_id,
             GroupDeal.deleted_at.is_(None)
         ).first_or_404()
-        deal_dict = deal.to_dict()
-        
-        # Get products for this deal
-        deal_products = GroupDealProduct.query.filter_by(group_deal_id=deal.id).all()
-        products_data = []
-        for dp in deal_products:
-            product = Product.query.get(dp.product_id)
-            if product:
-                product_dict = product.to_dict()
-                product_dict['deal_stock_limit'] = dp.deal_stock_limit
-                product_dict['group_deal_product_id'] = dp.id
-                products_data.append(product_dict)
-        deal_dict['products'] = products_data
+        deal_dict = serialize_deals([deal], admin_view=True)[0]
         
         return jsonify({
             'group_deal': deal_dict
@@ -1049,7 +1104,8 @@ def create_group_deal():
             deal_product = GroupDealProduct(
                 group_deal_id=group_deal.id,
                 product_id=product_id,
-                deal_stock_limit=product_data.get('deal_stock_limit')
+                deal_stock_limit=product_data.get('deal_stock_limit'),
+                stock_mode=product_data.get('stock_mode') or StockMode.LOCKED.value
             )
             db.session.add(deal_product)
         
@@ -1066,6 +1122,7 @@ def create_group_deal():
             if product:
                 product_dict = product.to_dict()
                 product_dict['deal_stock_limit'] = dp.deal_stock_limit
+                product_dict['stock_mode'] = dp.stock_mode
                 products_data.append(product_dict)
         deal_dict['products'] = products_data
         
@@ -1156,42 +1213,7 @@ def update_group_deal(deal_id):
         # Cascade status changes to orders (same logic as update_group_deal_status endpoint)
         orders_updated = 0
         if final_status != original_status:
-            if final_status == GroupDealStatus.PREPARING.value:
-                # All submitted/confirmed orders become preparing
-                orders = Order.query.filter(
-                    Order.group_deal_id == deal_id,
-                    Order.status.in_([OrderStatus.SUBMITTED.value, OrderStatus.CONFIRMED.value]),
-                    Order.status != OrderStatus.CANCELLED.value
-                ).all()
-                for order in orders:
-                    order.status = OrderStatus.PREPARING.value
-                    orders_updated += 1
-            
-            elif final_status == GroupDealStatus.READY_FOR_PICKUP.value:
-                # All submitted/confirmed/preparing orders become ready_for_pickup
-                orders = Order.query.filter(
-                    Order.group_deal_id == deal_id,
-                    Order.status.in_([
-                        OrderStatus.SUBMITTED.value,
-                        OrderStatus.CONFIRMED.value,
-                        OrderStatus.PREPARING.value
-                    ]),
-                    Order.status != OrderStatus.CANCELLED.value
-                ).all()
-                for order in orders:
-                    order.status = OrderStatus.READY_FOR_PICKUP.value
-                    orders_updated += 1
-            
-            elif final_status == GroupDealStatus.CLOSED.value:
-                # All submitted orders become confirmed when group deal is closed
-                orders = Order.query.filter(
-                    Order.group_deal_id == deal_id,
-                    Order.status == OrderStatus.SUBMITTED.value,
-                    Order.status != OrderStatus.CANCELLED.value
-                ).all()
-                for order in orders:
-                    order.status = OrderStatus.CONFIRMED.value
-                    orders_updated += 1
+            orders_updated = cascade_group_deal_status(deal_id, final_status)
             
             if orders_updated > 0:
                 current_app.logger.info(f'Cascaded group deal status change from {original_status} to {final_status} to {orders_updated} orders')
@@ -1236,6 +1258,13 @@ def update_group_deal(deal_id):
                         'message': f'以下商品已在订单中，无法移除: {", ".join(product_names_list)}'
                     }), 400
             
+            # Keep each product's stock mode unless the request sets one
+            existing_stock_modes = dict(
+                db.session.query(GroupDealProduct.product_id, GroupDealProduct.stock_mode).filter(
+                    GroupDealProduct.group_deal_id == deal.id
+                ).all()
+            )
+            
             # Remove existing products (safe now - we've validated)
             GroupDealProduct.query.filter_by(group_deal_id=deal.id).delete()
             
@@ -1248,25 +1277,21 @@ def update_group_deal(deal_id):
                 deal_product = GroupDealProduct(
                     group_deal_id=deal.id,
                     product_id=product_id,
-                    deal_stock_limit=product_data.get('deal_stock_limit')
+                    deal_stock_limit=product_data.get('deal_stock_limit'),
+                    stock_mode=product_data.get('stock_mode') or existing_stock_modes.get(product_id, StockMode.LOCKED.value)
                 )
                 db.session.add(deal_product)
         
         db.session.commit()
+        # Stock limits may have been raised; let checkouts re-validate against the database
+        invalidate_stock_gate(deal.id)
+        publish_stock_change([deal.id])
+        rebuild_deal_menu(deal.id)
         
         current_app.logger.info(f'Updated group deal: {deal.id} - {deal.title}')
         
         # Return full deal with products
-        deal_dict = deal.to_dict()
-        deal_products = GroupDealProduct.query.filter_by(group_deal_id=deal.id).all()
-        products_data = []
-        for dp in deal_products:
-            product = Product.query.get(dp.product_id)
-            if product:
-                product_dict = product.to_dict()
-                product_dict['deal_stock_limit'] = dp.deal_stock_limit
-                products_data.append(product_dict)
-        deal_dict['products'] = products_data
+        deal_dict = serialize_deals([deal], admin_view=True)[0]
         
         return jsonify({
             'group_deal': deal_dict
@@ -1306,6 +1331,9 @@ def delete_group_deal(deal_id):
             Order.deleted_at.is_(None)
         ).all()
         
+        # Deleted orders stop counting toward sales stats
+        record_orders_sales([order for order in associated_orders if order.status != OrderStatus.CANCELLED.value], sign=-1)
+        
         orders_deleted = 0
         for order in associated_orders:
             # Restore stock if order is not already cancelled (cancelled orders already had stock restored)
@@ -1324,6 +1352,7 @@ def delete_group_deal(deal_id):
         # Soft delete the group deal
         deal.deleted_at = now
         db.session.commit()
+        rebuild_deal_menu(deal.id)
         
         current_app.logger.info(f'Soft deleted group deal: {deal.id} - {deal.title} and {orders_deleted} associated orders')
         
@@ -1353,7 +1382,7 @@ def get_admin_products():
         days = request.args.get('days', 30, type=int)  # Days for popularity calculation
         
         # Base query
-        query = Product.query
+        query = Product.query.options(joinedload(Product.supplier))
         
         # Apply sorting
         if sort_by == 'popularity':
@@ -1383,27 +1412,17 @@ def get_admin_products():
         
         products = query.all()
         
-        # Get sales stats for each product
-        start_date = date.today() - timedelta(days=days)
+        # Sales stats for every product in one GROUP BY (cached per days/date)
+        sales_totals = get_sales_totals(days)
         products_data = []
         for product in products:
             product_dict = product.to_dict()
-            
-            # Get sales stats for date range
-            stats_query = db.session.query(
-                func.sum(ProductSalesStats.quantity_sold).label('total_sold'),
-                func.sum(ProductSalesStats.order_count).label('total_orders')
-            ).filter(
-                ProductSalesStats.product_id == product.id,
-                ProductSalesStats.sale_date >= start_date
-            ).first()
-            
+            total_sold, total_orders = sales_totals.get(product.id, (0, 0))
             product_dict['sales_stats'] = {
-                'total_sold': int(stats_query.total_sold) if stats_query.total_sold else 0,
-                'total_orders': int(stats_query.total_orders) if stats_query.total_orders else 0,
+                'total_sold': total_sold,
+                'total_orders': total_orders,
                 'period_days': days
             }
-            
             products_data.append(product_dict)
         
         return jsonify({
@@ -1453,6 +1472,61 @@ def get_product_sales_stats(product_id):
             'message': str(e)
         }), 500
 
+@admin_bp.route('/products/<int:product_id>/sales-series', methods=['GET'])
+def get_product_sales_series(product_id):
+    """Get a product's sales bucketed by day, week or month for charts
+    
+    Query params:
+    - granularity: 'day' (default), 'week' or 'month'
+    - start_date / end_date: YYYY-MM-DD (default: last 30 days)
+    """
+    user_id, error_response, status_code = require_admin_auth()
+    if error_response:
+        return error_response, status_code
+    
+    granularity = request.args.get('granularity', 'day').strip()
+    if granularity not in SERIES_GRANULARITIES:
+        return jsonify({
+            'error': 'Invalid granularity',
+            'message': f'granularity must be one of: {", ".join(SERIES_GRANULARITIES)}'
+        }), 400
+    
+    try:
+        end_date = date.fromisoformat(request.args['end_date']) if request.args.get('end_date') else date.today()
+        start_date = date.fromisoformat(request.args['start_date']) if request.args.get('start_date') else end_date - timedelta(days=30)
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid date format',
+            'message': str(e)
+        }), 400
+    if start_date > end_date:
+        return jsonify({
+            'error': 'Invalid date range',
+            'message': 'start_date must not be after end_date'
+        }), 400
+    
+    try:
+        product = Product.query.get_or_404(product_id)
+        series = get_sales_time_series(product_id, start_date, end_date, granularity)
+        
+        return jsonify({
+            'product_id': product_id,
+            'product_name': product.name,
+            'granularity': granularity,
+            'date_range': {
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat()
+            },
+            'series': series
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f'Error fetching product sales series: {e}', exc_info=True)
+        return jsonify({
+            'error': 'Failed to fetch sales series',
+            'message': str(e)
+        }), 500
+
 @admin_bp.route('/stats', methods=['GET'])
 def get_dashboard_stats():
     """Get dashboard statistics"""
@@ -1587,7 +1661,18 @@ def get_otp_stats():
 # Orders Management
 @admin_bp.route('/orders', methods=['GET'])
 def get_admin_orders():
-    """Get all orders (admin only)"""
+    """Get all orders (admin only)
+    
+    Query params:
+        page, per_page: Offset pagination (default)
+        cursor: Keyset pagination on (created_at, id), newest first. Pass an empty
+            cursor for the first page, then next_cursor from the previous response.
+        total: 'exact' (COUNT on every request, default for offset pages),
+            'cached' (reuse a count for the same filters for ADMIN_ORDER_COUNT_TTL_SECONDS,
+            default for cursor pages) or 'none' (skip the count)
+        status, payment_status, payment_method, delivery_method, group_deal_id,
+        user_source, search: Optional filters
+    """
     user_id, error_response, status_code = require_admin_auth()
     if error_response:
         return error_response, status_code
@@ -1603,26 +1688,19 @@ def get_admin_orders():
         group_deal_id = request.args.get('group_deal_id')
         user_source_filter = request.args.get('user_source', '').strip()
         search = request.args.get('search', '').strip()
+        cursor = request.args.get('cursor')
+        use_cursor = cursor is not None
+        total_mode = request.args.get('total', 'cached' if use_cursor else 'exact').strip()
+        if total_mode not in ADMIN_ORDER_TOTAL_MODES:
+            return jsonify({'error': f'total must be one of: {", ".join(ADMIN_ORDER_TOTAL_MODES)}'}), 400
         
-        # Build query - join with User for phone search and eager load relationships
+        # Build query - join with User for phone search
         # Filter out soft-deleted orders (deleted_at IS NULL)
-        # Use eager loading to prevent N+1 queries
-        query = Order.query.options(
-            joinedload(Order.user),  # Eager load user (already joined)
-            selectinload(Order.items).selectinload(OrderItem.product),  # Eager load items and their products
-            selectinload(Order.address),  # Eager load address if exists
-            joinedload(Order.group_deal)  # Eager load group deal (many-to-one via backref)
-        ).join(User, Order.user_id == User.id).filter(Order.deleted_at.is_(None))
+        query = Order.query.join(User, Order.user_id == User.id).filter(Order.deleted_at.is_(None))
         
-        # Apply search filter (order number or phone)
+        # Apply search filter (pickup code, order number prefix or customer phone)
         if search:
-            search_term = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    Order.order_number.like(search_term),
-                    User.phone.like(search_term)
-                )
-            )
+            query = query.filter(order_search_clause(search))
         
         # Apply filters
         if status_filter:
@@ -1643,13 +1721,41 @@ def get_admin_orders():
         if user_source_filter:
             query = query.filter(User.user_source == user_source_filter)
         
-        # Order by creation date (newest first)
-        query = query.order_by(Order.created_at.desc())
+        # Total for the filtered list, counted before eager loading is attached
+        total = None
+        total_is_cached = False
+        if total_mode == 'exact':
+            total = query.order_by(None).with_entities(func.count(Order.id)).scalar()
+        elif total_mode == 'cached':
+            count_key = ('admin_orders', status_filter, payment_filter, payment_method_filter,
+                         delivery_method_filter, group_deal_id, user_source_filter, search)
+            total, fresh = cached_count(
+                count_key, query, Order.id,
+                current_app.config.get('ADMIN_ORDER_COUNT_TTL_SECONDS', Config.ADMIN_ORDER_COUNT_TTL_SECONDS)
+            )
+            total_is_cached = not fresh
         
-        # Paginate
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Use eager loading to prevent N+1 queries
+        query = query.options(
+            joinedload(Order.user),  # Eager load user (already joined)
+            selectinload(Order.items).selectinload(OrderItem.product),  # Eager load items and their products
+            selectinload(Order.address),  # Eager load address if exists
+            joinedload(Order.group_deal)  # Eager load group deal (many-to-one via backref)
+        )
         
-        orders = pagination.items
+        if use_cursor:
+            per_page = max(1, min(per_page, ADMIN_ORDERS_MAX_PAGE_SIZE))
+            # Keyset page: bounded index range scan however deep the admin pages
+            position = decode_cursor(cursor.strip()) if cursor.strip() else None
+            query = apply_keyset(query, Order.created_at, Order.id, position, descending=True)
+            orders, has_more = fetch_page(query, per_page)
+        else:
+            # Order by creation date (newest first)
+            query = query.order_by(Order.created_at.desc(), Order.id.desc())
+            
+            # Paginate (the total was counted above, if requested)
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+            orders = pagination.items
         
         # Build response with order details (all relationships already loaded)
         orders_data = []
@@ -1698,16 +1804,30 @@ def get_admin_orders():
             
             orders_data.append(order_dict)
         
-        return jsonify({
-            'orders': orders_data,
-            'pagination': {
+        if use_cursor:
+            pagination_data = {
+                'per_page': per_page,
+                'has_more': has_more,
+                'next_cursor': encode_cursor(orders[-1].created_at, orders[-1].id) if has_more else None
+            }
+        else:
+            pagination_data = {
                 'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
+                'per_page': pagination.per_page
             }
+            if total is not None:
+                pagination_data['pages'] = (total + pagination.per_page - 1) // pagination.per_page
+        pagination_data['total'] = total
+        # Cached totals may trail the list by up to ADMIN_ORDER_COUNT_TTL_SECONDS
+        pagination_data['total_is_estimate'] = total_is_cached
+        
+        return jsonify({
+            'orders': orders_data,
+            'pagination': pagination_data
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f'Error fetching orders: {e}', exc_info=True)
         return jsonify({
@@ -1795,8 +1915,13 @@ def update_order_status(order_id):
             except Exception as e:
                 current_app.logger.error(f'Failed to restore stock when changing order status to cancelled: {e}')
                 # Continue with status change even if stock restoration fails
+            record_order_sales(order, items_to_restore, sign=-1)
+        elif old_status == OrderStatus.CANCELLED.value and status != OrderStatus.CANCELLED.value:
+            record_order_sales(order)
         
         order.status = status
+        if status != old_status:
+            log_status_changes([(order.id, old_status)], status, changed_by=user_id)
         
         # For pickup orders with cash payment: auto-mark as paid when completing
         if (status == OrderStatus.COMPLETED.value and 
@@ -1854,7 +1979,11 @@ def update_order_status(order_id):
 
 @admin_bp.route('/orders/bulk-update-status', methods=['POST'])
 def bulk_update_order_status():
-    """Bulk update order status for multiple orders (admin only)"""
+    """Bulk update order status for multiple orders (admin only)
+    
+    Body: status (required), group_deal_id, delivery_method, current_status
+    Returns updated_count and the IDs of the orders that changed (order_ids).
+    """
     user_id, error_response, status_code = require_admin_auth()
     if error_response:
         return error_response, status_code
@@ -1876,50 +2005,43 @@ def bulk_update_order_status():
         if new_status not in OrderStatus.get_all_values():
             return jsonify({'error': f'Invalid status: {new_status}'}), 400
         
-        # Build query for orders to update
-        query = Order.query.filter(Order.deleted_at.is_(None))
+        # Filters for the orders to update
+        filters = [Order.deleted_at.is_(None)]
         
-        # Apply filters
         if group_deal_id:
-            query = query.filter(Order.group_deal_id == group_deal_id)
+            filters.append(Order.group_deal_id == group_deal_id)
         
         if delivery_method:
-            query = query.filter(Order.delivery_method == delivery_method)
+            filters.append(Order.delivery_method == delivery_method)
         
         if current_status:
-            query = query.filter(Order.status == current_status)
+            filters.append(Order.status == current_status)
         else:
             # If no specific current status is provided, exclude orders that are already in final states
             # Don't update orders that are already out_for_delivery, completed, or cancelled
-            query = query.filter(Order.status.notin_([
+            filters.append(Order.status.notin_([
                 OrderStatus.OUT_FOR_DELIVERY.value,
                 OrderStatus.COMPLETED.value,
                 OrderStatus.CANCELLED.value
             ]))
         
-        # Get orders to update
-        orders = query.all()
+        # Chunked set-based UPDATEs; each chunk commits on its own so row locks stay short
+        chunk_size = current_app.config.get('ORDER_STATUS_BULK_CHUNK_SIZE', Config.ORDER_STATUS_BULK_CHUNK_SIZE)
+        order_ids = bulk_set_order_status(filters, new_status, chunk_size, changed_by=user_id)
         
-        if not orders:
+        if not order_ids:
             return jsonify({
                 'message': 'No orders found matching the criteria',
-                'updated_count': 0
+                'updated_count': 0,
+                'order_ids': []
             }), 200
         
-        # Update all orders
-        updated_count = 0
-        for order in orders:
-            old_status = order.status
-            order.status = new_status
-            order.updated_at = utc_now()
-            updated_count += 1
-            current_app.logger.info(f'Bulk updated order {order.id} status from {old_status} to {new_status}')
-        
-        db.session.commit()
+        current_app.logger.info(f'Bulk updated {len(order_ids)} orders to {new_status}')
         
         return jsonify({
-            'message': f'Successfully updated {updated_count} orders to {OrderStatus.get_label(new_status)}',
-            'updated_count': updated_count
+            'message': f'Successfully updated {len(order_ids)} orders to {OrderStatus.get_label(new_status)}',
+            'updated_count': len(order_ids),
+            'order_ids': order_ids
         }), 200
         
     except Exception as e:
@@ -1957,6 +2079,7 @@ def admin_cancel_order(order_id):
         
         old_status = order.status
         order.status = OrderStatus.CANCELLED.value
+        record_order_sales(order, items_to_restore, sign=-1)
         db.session.commit()
         
         current_app.logger.info(f'Admin cancelled order {order_id} (was {old_status})')
@@ -2106,11 +2229,10 @@ def get_order_by_pickup_code(pickup_code):
         return error_response, status_code
     
     try:
-        # pickup_code is the last part of order_number (e.g., "CGN7O7" from "GSF-20231225123456-CGN7O7")
-        # Search for orders where order_number ends with the pickup code
-        # Format: GSF-{timestamp}-{pickup_code}
+        # pickup_code is the last part of order_number (e.g., "CGN7O7" from "GSF-20231225123456-CGN7O7"),
+        # stored in its own indexed column
         order = Order.query.filter(
-            Order.order_number.like(f'%-{pickup_code}'),
+            Order.pickup_code == pickup_code.strip().upper(),
             Order.deleted_at.is_(None)
         ).first()
         
@@ -2201,33 +2323,11 @@ def update_order_weights(order_id):
             if final_weight is not None:
                 order_item.final_weight = float(final_weight)
             
-            # Recalculate price if product is weight-based
-            if product.pricing_type in ['weight_range', 'unit_weight', 'bundled_weight'] and final_weight is not None:
-                # For weight-based products: unit_price = price_per_unit, total_price = price_per_unit * weight
-                # Quantity is always 1 for weight-based products (they're weighed individually, not stacked)
-                if product.pricing_type == 'weight_range':
-                    # Find matching range based on final_weight
-                    ranges = product.pricing_data.get('ranges', []) if product.pricing_data else []
-                    matched_price = None
-                    for range_item in ranges:
-                        min_weight = range_item.get('min', 0)
-                        max_weight = range_item.get('max')
-                        if final_weight >= min_weight and (max_weight is None or final_weight < max_weight):
-                            matched_price = float(range_item.get('price', 0))
-                            break
-                    if matched_price is not None:
-                        order_item.unit_price = matched_price
-                        order_item.total_price = matched_price  # Quantity is 1 for weight-based products
-                elif product.pricing_type == 'unit_weight':
-                    price_per_unit = float(product.pricing_data.get('price_per_unit', 0) if product.pricing_data else 0)
-                    if price_per_unit > 0:
-                        order_item.unit_price = price_per_unit
-                        order_item.total_price = price_per_unit * float(final_weight)
-                elif product.pricing_type == 'bundled_weight':
-                    price_per_unit = float(product.pricing_data.get('price_per_unit', 0) if product.pricing_data else 0)
-                    if price_per_unit > 0:
-                        order_item.unit_price = price_per_unit
-                        order_item.total_price = price_per_unit * float(final_weight)
+            # Re-price weight-based lines with the shared pricing engine (see utils/pricing.py)
+            if final_weight is not None:
+                repriced = get_compiled_pricing(product).price_weighed(order_item.quantity, final_weight)
+                if repriced is not None:
+                    order_item.unit_price, order_item.total_price = repriced
         
         # Recalculate subtotal from ALL items in the order (not just updated ones)
         from decimal import Decimal
@@ -2342,6 +2442,8 @@ def update_admin_order(order_id):
         if not group_deal:
             return jsonify({'error': 'Group deal not found'}), 404
         
+        old_items = [{'product_id': item.product_id, 'quantity': item.quantity} for item in order.items]
+        
         # Delete all existing order items
         OrderItem.query.filter_by(order_id=order_id).delete()
         
@@ -2366,93 +2468,8 @@ def update_admin_order(order_id):
             if not product:
                 continue
             
-            # ============================================================================
-            # CRITICAL: Calculate item price based on pricing type
-            # ============================================================================
-            # This logic MUST handle ALL pricing types correctly, especially when
-            # final_weight is provided. DO NOT REMOVE OR SIMPLIFY WITHOUT TESTING!
-            #
-            # Pricing types:
-            # 1. bundled_weight: Price = final_weight × price_per_unit (e.g., 3.77 lb × $6.99/lb)
-            # 2. weight_range: Price based on weight ranges
-            # 3. unit_weight: Price = weight × price_per_unit
-            # 4. per_item: Fixed price per item
-            #
-            # REGRESSION WARNING: This code was previously missing bundled_weight handling,
-            # causing incorrect prices when final_weight was provided. The bug was:
-            # - User enters final_weight = 3.77 lb for a $6.99/lb product
-            # - Expected: $26.35 (3.77 × 6.99)
-            # - Bug caused: $38.45 (using estimated mid-weight instead)
-            # ============================================================================
-            
-            if product.pricing_type == 'bundled_weight':
-                # BUNDLED WEIGHT: Products are weighed individually, not stacked
-                # unit_price = price_per_unit (the rate)
-                # total_price = price_per_unit * final_weight (or estimated weight)
-                # Quantity is always 1 for weight-based products (they're weighed individually, not stacked)
-                price_per_unit = float(product.pricing_data.get('price_per_unit', 0) if product.pricing_data else 0)
-                
-                unit_price = price_per_unit  # Unit price is the rate itself
-                
-                if final_weight is not None and final_weight > 0 and price_per_unit > 0:
-                    # ACTUAL WEIGHT PROVIDED: Use exact weight for precise calculation
-                    total_price = float(final_weight) * price_per_unit
-                else:
-                    # NO WEIGHT PROVIDED: Use mid-weight estimation
-                    if price_per_unit > 0:
-                        min_weight = float(product.pricing_data.get('min_weight', 7) if product.pricing_data else 7)
-                        max_weight = float(product.pricing_data.get('max_weight', 15) if product.pricing_data else 15)
-                        mid_weight = (min_weight + max_weight) / 2
-                        total_price = price_per_unit * mid_weight
-                    else:
-                        # price_per_unit is 0 or missing - unit_price stays as price_per_unit (0)
-                        # No fallback - unit_price should always be price_per_unit from DB
-                        total_price = 0
-                        
-            elif product.pricing_type == 'unit_weight':
-                # UNIT WEIGHT: Products are weighed individually, not stacked
-                # unit_price = price_per_unit (the rate)
-                # total_price = price_per_unit * final_weight (or estimated weight)
-                # Quantity is always 1 for weight-based products (they're weighed individually, not stacked)
-                price_per_unit = float(product.pricing_data.get('price_per_unit', 0) if product.pricing_data else 0)
-                
-                unit_price = price_per_unit  # Unit price is the rate itself
-                
-                if final_weight is not None and final_weight > 0 and price_per_unit > 0:
-                    total_price = price_per_unit * float(final_weight)
-                else:
-                    # Use estimated weight if not provided
-                    estimated_weight = 1
-                    total_price = price_per_unit * estimated_weight
-                    
-            elif final_weight is not None and product.pricing_type == 'weight_range':
-                # WEIGHT RANGE: Find matching range based on final_weight
-                ranges = product.pricing_data.get('ranges', []) if product.pricing_data else []
-                matched_price = None
-                for range_item in ranges:
-                    min_weight = range_item.get('min', 0)
-                    max_weight = range_item.get('max')
-                    if float(final_weight) >= min_weight and (max_weight is None or float(final_weight) < max_weight):
-                        matched_price = float(range_item.get('price', 0))
-                        break
-                
-                if matched_price is not None:
-                    unit_price = matched_price
-                    total_price = matched_price * quantity
-                else:
-                    # No matching range, use first range (lowest weight) for estimation
-                    unit_price = float(ranges[0].get('price', 0)) if ranges else 0
-                    total_price = unit_price * quantity
-                
-            else:
-                # PER ITEM or NO WEIGHT: Use fixed price per item
-                unit_price = product.get_display_price() or 0
-                total_price = unit_price * quantity
-            
-            # Ensure unit_price and total_price are set
-            if 'unit_price' not in locals() or 'total_price' not in locals():
-                unit_price = 0
-                total_price = 0
+            # Price the line with the shared pricing engine (see utils/pricing.py)
+            unit_price, total_price = price_line(product, quantity, final_weight)
             
             # Create order item
             order_item = OrderItem(
@@ -2465,7 +2482,7 @@ def update_admin_order(order_id):
             )
             db.session.add(order_item)
             new_order_items.append(order_item)
-            subtotal += Decimal(str(total_price))
+            subtotal += total_price
         
         # Update payment method if provided
         if payment_method:
@@ -2535,6 +2552,14 @@ def update_admin_order(order_id):
         order.total = total
         order.points_earned = points_earned
         
+        # Cancelled orders are already out of the sales stats
+        if order.status != OrderStatus.CANCELLED.value:
+            record_order_sales_change(
+                order,
+                old_items,
+                [{'product_id': item.product_id, 'quantity': item.quantity} for item in new_order_items]
+            )
+        
         db.session.commit()
         
         current_app.logger.info(f'Admin updated order {order_id} items')
@@ -2601,6 +2626,7 @@ def delete_order(order_id):
             except Exception as e:
                 current_app.logger.error(f'Failed to restore stock when deleting order {order_id}: {e}')
                 # Continue with deletion even if stock restoration fails
+            record_order_sales(order, items_to_restore, sign=-1)
         
         # Soft delete: set deleted_at timestamp
         order.deleted_at = utc_now()
@@ -2623,86 +2649,38 @@ def delete_order(order_id):
 
 @admin_bp.route('/orders/duplicates', methods=['GET'])
 def find_duplicate_orders():
-    """Find duplicate orders placed by same users in the same group deal (admin only)"""
+    """Find duplicate orders placed by same users in the same group deal (admin only)
+    
+    Query params:
+        group_deal_id: Optional group deal filter
+        stream: If true, respond with NDJSON instead: one {"duplicate_set": ...} line per set,
+            hydrated DUPLICATE_ORDERS_BATCH_SIZE orders at a time, then {"total_sets": n}
+    """
     user_id, error_response, status_code = require_admin_auth()
     if error_response:
         return error_response, status_code
     
     try:
         group_deal_id = request.args.get('group_deal_id', type=int)
+        stream = request.args.get('stream', 'false').lower() == 'true'
         
-        # Build base query - find users with multiple orders in the same group deal
-        query = db.session.query(
-            Order.user_id,
-            Order.group_deal_id,
-            func.count(Order.id).label('order_count')
-        ).filter(
-            Order.deleted_at.is_(None),
-            Order.status != OrderStatus.CANCELLED.value
-        ).group_by(
-            Order.user_id,
-            Order.group_deal_id
-        ).having(
-            func.count(Order.id) > 1
-        )
+        # One window-function query for the ids of every order in a duplicate set
+        sets = find_duplicate_sets(group_deal_id)
         
-        # Filter by group deal if specified
-        if group_deal_id:
-            query = query.filter(Order.group_deal_id == group_deal_id)
-        
-        duplicates = query.all()
-        
-        # Get full order details for each duplicate set
-        duplicate_sets = []
-        for dup in duplicates:
-            orders = Order.query.filter(
-                Order.user_id == dup.user_id,
-                Order.group_deal_id == dup.group_deal_id,
-                Order.deleted_at.is_(None),
-                Order.status != OrderStatus.CANCELLED.value
-            ).order_by(Order.created_at.asc()).all()
+        if stream:
+            batch_size = current_app.config.get('DUPLICATE_ORDERS_BATCH_SIZE', Config.DUPLICATE_ORDERS_BATCH_SIZE)
             
-            # Get user info
-            user = User.query.get(dup.user_id)
-            group_deal = GroupDeal.query.filter(
-                GroupDeal.id == dup.group_deal_id,
-                GroupDeal.deleted_at.is_(None)
-            ).first()
-            
-            orders_data = []
-            for order in orders:
-                order_dict = order.to_dict()
-                
-                # Get items with product details
-                items_data = []
-                for item in order.items:
-                    item_dict = item.to_dict()
-                    product = Product.query.get(item.product_id)
-                    if product:
-                        item_dict['product'] = {
-                            'id': product.id,
-                            'name': product.name,
-                            'image': product.image,
-                            'pricing_type': product.pricing_type,
-                            'pricing_data': product.pricing_data
-                        }
-                    items_data.append(item_dict)
-                order_dict['items'] = items_data
-                
-                # Get address info if delivery order
-                if order.address_id:
-                    address = Address.query.get(order.address_id)
-                    if address:
-                        order_dict['address'] = address.to_dict()
-                
-                orders_data.append(order_dict)
+            def generate():
+                for batch in batch_duplicate_sets(sets, batch_size):
+                    for duplicate_set in hydrate_duplicate_sets(batch):
+                        yield json.dumps({'duplicate_set': duplicate_set}, ensure_ascii=False) + '\n'
+                    # Keep the identity map bounded to one batch
+                    db.session.expunge_all()
+                yield json.dumps({'total_sets': len(sets)}) + '\n'
             
-            duplicate_sets.append({
-                'user': user.to_dict() if user else None,
-                'group_deal': group_deal.to_dict() if group_deal else None,
-                'orders': orders_data,
-                'order_count': dup.order_count
-            })
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        duplicate_sets = hydrate_duplicate_sets(sets)
         
         return jsonify({
             'duplicate_sets': duplicate_sets,
@@ -2776,31 +2754,57 @@ def merge_orders():
                 if item.product_id not in all_items:
                     all_items[item.product_id] = {
                         'quantity': item.quantity,
-                        'unit_price': float(item.unit_price),
+                        'unit_price': item.unit_price,
+                        'total_price': item.total_price,
                         'final_weight': float(item.final_weight) if item.final_weight else None
                     }
                 else:
                     # Add quantities
                     all_items[item.product_id]['quantity'] += item.quantity
+                    all_items[item.product_id]['total_price'] += item.total_price
                     # Add weights if applicable
                     if item.final_weight and all_items[item.product_id]['final_weight'] is not None:
                         all_items[item.product_id]['final_weight'] += float(item.final_weight)
         
+        # Items before the merge, for the sales stats change below
+        main_old_items = [{'product_id': item.product_id, 'quantity': item.quantity} for item in main_order.items]
+        merged_away_items = {
+            order.id: [{'product_id': item.product_id, 'quantity': item.quantity} for item in order.items]
+            for order in orders_to_merge
+        }
+        
         # Update main order with merged items
         # Delete existing items from main order
         OrderItem.query.filter_by(order_id=main_order.id).delete()
         
         # Create new merged items
+        products = {
+            product.id: product
+            for product in Product.query.filter(Product.id.in_(list(all_items.keys()))).all()
+        }
         subtotal = Decimal('0')
+        order_items_for_shipping = []
+        main_new_items = []
         for product_id, item_data in all_items.items():
-            product = Product.query.get(product_id)
+            product = products.get(product_id)
             if not product:
                 continue
             
-            unit_price = Decimal(str(item_data['unit_price']))
+            # Keep the agreed unit price; weight-based totals follow the merged weight
+            unit_price = item_data['unit_price']
             quantity = item_data['quantity']
-            total_price = unit_price * quantity
+            total_price = total_from_rate(
+                product.pricing_type,
+                unit_price,
+                quantity,
+                item_data['final_weight'],
+                estimated_total=item_data['total_price']
+            )
             subtotal += total_price
+            order_items_for_shipping.append({
+                'product': product,
+                'total_price': total_price
+            })
             
             order_item = OrderItem(
                 order_id=main_order.id,
@@ -2811,6 +2815,7 @@ def merge_orders():
                 final_weight=Decimal(str(item_data['final_weight'])) if item_data['final_weight'] else None
             )
             db.session.add(order_item)
+            main_new_items.append({'product_id': product_id, 'quantity': quantity})
         
         # Update main order attributes based on admin's choices
         if keep_payment_method:
@@ -2837,16 +2842,6 @@ def merge_orders():
         if main_order.delivery_method == 'delivery' and main_order.address_id:
             address = Address.query.get(main_order.address_id)
         
-        # Build order items for shipping calculation
-        order_items_for_shipping = []
-        for product_id, item_data in all_items.items():
-            product = Product.query.get(product_id)
-            if product:
-                order_items_for_shipping.append({
-                    'product': product,
-                    'quantity': item_data['quantity']
-                })
-        
         shipping_fee = calculate_shipping_fee(
             subtotal,
             main_order.delivery_method,
@@ -2869,6 +2864,11 @@ def merge_orders():
         for order in orders_to_merge:
             order.deleted_at = utc_now()
         
+        # Sales stats: the main order now carries the merged items; merged-away orders stop counting
+        record_order_sales_change(main_order, main_old_items, main_new_items)
+        for order in orders_to_merge:
+            record_order_sales(order, merged_away_items[order.id], sign=-1)
+        
         db.session.commit()
         
         # Log the merge
@@ -2942,47 +2942,11 @@ def update_group_deal_status(deal_id):
         old_status = deal.status
         deal.status = new_status
         
-        # Cascade status to orders
-        orders_updated = 0
-        if new_status == GroupDealStatus.PREPARING.value:
-            # All submitted/confirmed orders become preparing
-            orders = Order.query.filter(
-                Order.group_deal_id == deal_id,
-                Order.status.in_([OrderStatus.SUBMITTED.value, OrderStatus.CONFIRMED.value]),
-                Order.status != OrderStatus.CANCELLED.value
-            ).all()
-            for order in orders:
-                order.status = OrderStatus.PREPARING.value
-                orders_updated += 1
-        
-        elif new_status == GroupDealStatus.READY_FOR_PICKUP.value:
-            # All submitted/confirmed/preparing orders become ready_for_pickup
-            orders = Order.query.filter(
-                Order.group_deal_id == deal_id,
-                Order.status.in_([
-                    OrderStatus.SUBMITTED.value,
-                    OrderStatus.CONFIRMED.value,
-                    OrderStatus.PREPARING.value
-                ]),
-                Order.status != OrderStatus.CANCELLED.value
-            ).all()
-            for order in orders:
-                order.status = OrderStatus.READY_FOR_PICKUP.value
-                orders_updated += 1
-        
-        elif new_status == GroupDealStatus.CLOSED.value:
-            # All submitted orders become confirmed when group deal is closed
-            # Orders that are already confirmed or beyond should not be changed
-            orders = Order.query.filter(
-                Order.group_deal_id == deal_id,
-                Order.status == OrderStatus.SUBMITTED.value,
-                Order.status != OrderStatus.CANCELLED.value
-            ).all()
-            for order in orders:
-                order.status = OrderStatus.CONFIRMED.value
-                orders_updated += 1
+        # Cascade status to orders (one set-based UPDATE)
+        orders_updated = cascade_group_deal_status(deal_id, new_status)
         
         db.session.commit()
+        rebuild_deal_menu(deal_id)
         
         current_app.logger.info(f'Updated group deal {deal_id} status from {old_status} to {new_status}. Cascaded to {orders_updated} orders.')
         
@@ -3105,6 +3069,7 @@ def create_supplier():
         
         db.session.add(supplier)
         db.session.commit()
+        bump_catalog_version()
         
         current_app.logger.info(f'Created supplier: {supplier.id} - {supplier.name}')
         
@@ -3151,6 +3116,7 @@ def update_supplier(supplier_id):
             supplier.is_active = validated_data['is_active']
         
         db.session.commit()
+        bump_catalog_version()
         
         current_app.logger.info(f'Updated supplier: {supplier.id} - {supplier.name}')
         
@@ -3179,6 +3145,7 @@ def delete_supplier(supplier_id):
         # Soft delete - set is_active to False
         supplier.is_active = False
         db.session.commit()
+        bump_catalog_version()
         
         current_app.logger.info(f'Deleted supplier: {supplier.id} - {supplier.name}')
         
@@ -3469,6 +3436,7 @@ def update_delivery_fee_config():
             config.tiers = tiers
         
         db.session.commit()
+        invalidate_delivery_fee_table()
         
         current_app.logger.info(f'Updated delivery fee config: {config.id}')
         
@@ -15,6 +15,10 @@ from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 from urllib.parse import urlencode, quote
 from decimal import Decimal
+from utils.auth import (
+    get_bearer_token, resolve_principal, refresh_token_expiry, evict_token, evict_user,
+    jwt_mode_enabled, is_jwt_token, issue_access_token, revoke_access_token
+)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -393,6 +397,16 @@ def phone_verify():
             current_app.logger.error(f'Failed to track successful verification: {track_error}')
             db.session.rollback()
     
+    # Stateless mode: short-lived signed token, no auth_tokens row
+    if jwt_mode_enabled():
+        token, expires_at = issue_access_token(user.id, user.get_roles())
+        current_app.logger.info(f'Issued access token for user {user.id}')
+        return jsonify({
+            'token': token,
+            'user': user.to_dict(),
+            'expires_at': expires_at.isoformat()
+        }), 200
+    
     # Generate new auth token (100 years expiration - effectively never expires)
     # Store as naive datetime (MySQL doesn't support timezone-aware)
     expires_at = utc_now() + timedelta(days=36500)  # 100 years
@@ -417,35 +431,21 @@ def phone_verify():
 def get_current_user():
     """Get current authenticated user"""
     try:
-        # Extract token from Authorization header
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Bearer '):
-            token = auth_header.replace('Bearer ', '').strip()
-        else:
-            token = auth_header.strip()
-        
+        token = get_bearer_token()
         if not token:
             return jsonify({'error': 'No token provided'}), 401
         
-        # Find valid auth token
-        auth_token = AuthToken.query.filter_by(token=token, is_revoked=False).first()
-        
-        if not auth_token:
-            return jsonify({'error': 'Invalid token'}), 401
+        # Resolve opaque or signed token (invalid, revoked and expired tokens resolve to None)
+        principal = resolve_principal(token)
+        if not principal:
+            return jsonify({'error': 'Invalid or expired token'}), 401
         
-        if not auth_token.is_valid():
-            return jsonify({'error': 'Token expired'}), 401
-        
-        # Refresh token expiration on each use (extend to 100 years from now)
-        # Token effectively never expires
-        # Make sure expires_at is stored as naive datetime (MySQL doesn't support timezone-aware)
-        new_expires_at = utc_now() + timedelta(days=36500)  # 100 years
-        # Already naive UTC datetime for database storage
-        auth_token.expires_at = new_expires_at
-        db.session.commit()
+        # Refresh opaque token expiration (extend to 100 years from now), but only write it
+        # back once per AUTH_TOKEN_REFRESH_INTERVAL_SECONDS so /me stays a read
+        refresh_token_expiry(principal)
         
         # Get user
-        user = User.query.get(auth_token.user_id)
+        user = User.query.get(principal.user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 401
@@ -456,8 +456,8 @@ def get_current_user():
         return jsonify({
             'user': user.to_dict(),
             'token': {
-                'expires_at': auth_token.expires_at.isoformat(),
-                'token_type': auth_token.token_type
+                'expires_at': principal.expires_at.isoformat() if principal.expires_at else None,
+                'token_type': principal.token_type
             }
         }), 200
     except Exception as e:
@@ -471,19 +471,19 @@ def get_current_user():
 def logout():
     """Logout and revoke token"""
 
-    # Extract token from Authorization header
-    auth_header = request.headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        token = auth_header.replace('Bearer ', '').strip()
-    else:
-        token = auth_header.strip()
+    token = get_bearer_token()
 
-    if token:
+    if token and is_jwt_token(token):
+        # Stateless token: add it to the revocation denylist
+        if revoke_access_token(token):
+            current_app.logger.info('Revoked access token')
+    elif token:
         auth_token = AuthToken.query.filter_by(token=token).first()
         if auth_token:
             auth_token.is_revoked = True
             db.session.commit()
             current_app.logger.info(f'Revoked token for user {auth_token.user_id}')
+        evict_token(token)
 
     return jsonify({'message': 'Logged out successfully'}), 200
 
@@ -491,27 +491,16 @@ def logout():
 def update_wechat():
     """Update current user's WeChat ID"""
     try:
-        # Extract token from Authorization header
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Bearer '):
-            token = auth_header.replace('Bearer ', '').strip()
-        else:
-            token = auth_header.strip()
-        
+        token = get_bearer_token()
         if not token:
             return jsonify({'error': 'No token provided'}), 401
         
-        # Find valid auth token
-        auth_token = AuthToken.query.filter_by(token=token, is_revoked=False).first()
-        
-        if not auth_token:
-            return jsonify({'error': 'Invalid token'}), 401
-        
-        if not auth_token.is_valid():
-            return jsonify({'error': 'Token expired'}), 401
+        principal = resolve_principal(token)
+        if not principal:
+            return jsonify({'error': 'Invalid or expired token'}), 401
         
         # Get user
-        user = User.query.get(auth_token.user_id)
+        user = User.query.get(principal.user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 401
@@ -698,27 +687,33 @@ def google_callback():
             current_app.logger.info(f'Assigned admin role to user: {email}, ID: {user.id}')
 
         db.session.commit()
+        evict_user(user.id)
         
-        # Generate auth token (100 years expiration - effectively never expires)
-        # Store as naive datetime (MySQL doesn't support timezone-aware)
-        expires_at = utc_now() + timedelta(days=36500)  # 100 years
-        auth_token = AuthToken(
-            user_id=user.id,
-            token=secrets.token_urlsafe(32),
-            token_type='google',
-            expires_at=expires_at  # Already naive datetime
-        )
-        db.session.add(auth_token)
-        db.session.commit()
+        if jwt_mode_enabled():
+            # Stateless mode: short-lived signed token carrying the admin role
+            token, _ = issue_access_token(user.id, user.get_roles())
+        else:
+            # Generate auth token (100 years expiration - effectively never expires)
+            # Store as naive datetime (MySQL doesn't support timezone-aware)
+            expires_at = utc_now() + timedelta(days=36500)  # 100 years
+            auth_token = AuthToken(
+                user_id=user.id,
+                token=secrets.token_urlsafe(32),
+                token_type='google',
+                expires_at=expires_at  # Already naive datetime
+            )
+            db.session.add(auth_token)
+            db.session.commit()
+            token = auth_token.token
         
         # Always redirect to admin frontend with token
         # Get frontend URL from config (already validated above)
         frontend_url = Config.ADMIN_FRONTEND_URL or 'http://localhost:3001'
         
         # Log for debugging
-        current_app.logger.info(f'Redirecting to admin frontend: {frontend_url}/login#token={auth_token.token[:10]}...')
+        current_app.logger.info(f'Redirecting to admin frontend: {frontend_url}/login#token={token[:10]}...')
         
-        return redirect(f'{frontend_url}/login#token={auth_token.token}&user={user.id}')
+        return redirect(f'{frontend_url}/login#token={token}&user={user.id}')
         
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f'Google OAuth request error: {e}')
@@ -4,7 +4,7 @@ Expose status enums to frontend
 """
 from flask import Blueprint, jsonify
 from constants.status_enums import OrderStatus, PaymentStatus, GroupDealStatus, UserStatus, DeliveryMethod
-from utils.shipping import get_delivery_fee_config
+from utils.shipping import get_delivery_fee_table, DEFAULT_DELIVERY_FEE_TIERS
 
 constants_bp = Blueprint('constants', __name__, url_prefix='/api/constants')
 
@@ -55,31 +55,16 @@ def get_delivery_methods():
 def get_delivery_fee_config_public():
     """Get active delivery fee configuration (public endpoint)"""
     try:
-        config = get_delivery_fee_config()
-        
-        if not config:
-            # Return default values if no config exists
-            return jsonify({
-                'tiers': [
-                    {'threshold': 0, 'fee': 7.99},
-                    {'threshold': 58.00, 'fee': 5.99},
-                    {'threshold': 128.00, 'fee': 3.99},
-                    {'threshold': 150.00, 'fee': 0}
-                ]
-            }), 200
+        # Served from the same cached tier table used for shipping calculation
+        table = get_delivery_fee_table()
         
         return jsonify({
-            'tiers': config.tiers if config.tiers else []
+            'tiers': table.tiers
         }), 200
     except Exception as e:
         # Return defaults on error
         return jsonify({
-            'tiers': [
-                {'threshold': 0, 'fee': 7.99},
-                {'threshold': 58.00, 'fee': 5.99},
-                {'threshold': 128.00, 'fee': 3.99},
-                {'threshold': 150.00, 'fee': 0}
-            ]
+            'tiers': DEFAULT_DELIVERY_FEE_TIERS
         }), 200
 
 
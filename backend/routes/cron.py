@@ -4,10 +4,10 @@ These endpoints are called by Cloud Scheduler to run scheduled tasks
 """
 from flask import Blueprint, jsonify, request, current_app
 from models import db
-from models.order import Order
 from models.groupdeal import GroupDeal
 from models.base import est_now
-from constants.status_enums import OrderStatus, GroupDealStatus
+from constants.status_enums import GroupDealStatus
+from utils.order_lifecycle import confirm_expired_orders
 import os
 
 cron_bp = Blueprint('cron', __name__)
@@ -54,25 +54,10 @@ def auto_confirm_orders_cron():
         # ==============================================
         current_app.logger.info("Task 1: Auto-confirming expired orders...")
         
-        orders_to_confirm = db.session.query(Order).join(
-            GroupDeal, Order.group_deal_id == GroupDeal.id
-        ).filter(
-            Order.status == OrderStatus.SUBMITTED.value,
-            GroupDeal.order_end_date < now,
-            GroupDeal.deleted_at.is_(None)
-        ).all()
-        
-        confirmed_orders = []
-        for order in orders_to_confirm:
-            order.status = OrderStatus.CONFIRMED.value
-            order.updated_at = now
-            confirmed_orders.append({
-                'order_id': order.id,
-                'order_number': order.order_number,
-                'user_id': order.user_id,
-                'group_deal_id': order.group_deal_id
-            })
-            current_app.logger.info(f"  Auto-confirmed order #{order.order_number} (ID: {order.id})")
+        # Single set-based UPDATE; customer reads report the effective status until this runs
+        confirmed_orders = confirm_expired_orders(now)
+        for confirmed in confirmed_orders:
+            current_app.logger.info(f"  Auto-confirmed order #{confirmed['order_number']} (ID: {confirmed['order_id']})")
         
         if len(confirmed_orders) > 0:
             current_app.logger.info(f"✅ Auto-confirmed {len(confirmed_orders)} orders")
@@ -1,45 +1,40 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, g
 from models import db
 from models.order import Order, OrderItem
-from models.groupdeal import GroupDeal
+from models.groupdeal import GroupDeal, GroupDealProduct
 from models.product import Product
-from models.user import User, AuthToken
+from models.user import User
 from models.address import Address
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert
 from models.base import utc_now
 from constants.status_enums import OrderStatus, PaymentStatus, DeliveryMethod, PaymentMethod, GroupDealStatus
-from schemas.order import CreateOrderSchema, UpdateOrderSchema
+from schemas.order import CreateOrderSchema, QuoteOrderSchema, UpdateOrderSchema
 from schemas.utils import validate_request
 from decimal import Decimal
-from utils.stock_management import check_and_reserve_stock, restore_stock, update_stock_after_order_modification
+from utils.stock_management import check_and_reserve_stock, check_stock_gate, restore_stock, update_stock_after_order_modification
 from utils.shipping import calculate_shipping_fee
-from utils.sales_stats import update_product_sales_stats
+from utils.pricing import price_cart, build_quote, compute_quote_hash
+from utils.sales_stats import record_order_sales, record_order_sales_change
+from utils.auth import require_auth
+from utils.order_hydration import OrderHydrator
+from utils.deal_menu import get_deal_pricing
+from utils.order_lifecycle import get_effective_order_status
+from utils.pagination import (
+    InvalidCursorError, encode_cursor, decode_cursor, parse_since, apply_keyset, fetch_page
+)
 import random
 import string
 
 orders_bp = Blueprint('orders', __name__)
 
-def require_auth():
-    """Check if user is authenticated and return user_id"""
-    auth_header = request.headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        token = auth_header.replace('Bearer ', '').strip()
-    else:
-        token = auth_header.strip()
-    
-    if not token:
-        return None, jsonify({'error': 'No token provided'}), 401
-    
-    auth_token = AuthToken.query.filter_by(token=token, is_revoked=False).first()
-    if not auth_token or not auth_token.is_valid():
-        return None, jsonify({'error': 'Invalid or expired token'}), 401
-    
-    # Get user
-    user = User.query.get(auth_token.user_id)
-    if not user or not user.is_active:
-        return None, jsonify({'error': 'User not found or inactive'}), 401
-    
-    return user.id, None, None
+# Page sizes for GET /orders keyset pagination and incremental sync
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+ORDERS_SYNC_PAGE_SIZE = 100
+ORDERS_MAX_SYNC_PAGE_SIZE = 500
+# A caught-up sync_token is rewound this far so changes committed late are re-sent
+ORDERS_SYNC_OVERLAP = timedelta(seconds=5)
 
 def can_access_order(user_id, order):
     """Check if user can access an order (user owns it or is admin)"""
@@ -50,7 +45,10 @@ def can_access_order(user_id, order):
     if order.user_id == user_id:
         return True
     
-    # Check if user is admin
+    # Check if user is admin (principal was resolved by require_auth)
+    principal = g.get('principal')
+    if principal is not None and principal.user_id == user_id:
+        return principal.is_admin
     user = User.query.get(user_id)
     if user and user.is_admin:
         return True
@@ -59,7 +57,20 @@ def can_access_order(user_id, order):
 
 @orders_bp.route('/orders', methods=['GET'])
 def get_user_orders():
-    """Get all orders for the current authenticated user"""
+    """Get orders for the current authenticated user
+    
+    Query params:
+        status, payment_status, group_deal_id: Optional filters
+        limit: Page size. When set (or with cursor), results are keyset-paginated on
+            (created_at, id), newest first, and the response includes next_cursor/has_more.
+            Without limit/cursor/updated_since the full history is returned (legacy clients).
+        cursor: next_cursor from the previous page
+        updated_since: Incremental sync. Either an ISO datetime or the sync_token from the
+            previous sync. Returns orders changed since then (oldest change first) plus
+            tombstones for soft-deleted orders, and a new sync_token. Delivery is
+            at-least-once: an order may be sent again on a later sync, so clients
+            upsert by id.
+    """
     user_id, error_response, status_code = require_auth()
     if error_response:
         return error_response, status_code
@@ -69,9 +80,12 @@ def get_user_orders():
         status_filter = request.args.get('status', '').strip()  # 'pending', 'confirmed', 'completed', 'cancelled'
         payment_status_filter = request.args.get('payment_status', '').strip()  # 'pending', 'paid', 'failed', 'refunded'
         group_deal_id = request.args.get('group_deal_id')  # Filter by group deal
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor', '').strip()
+        updated_since = request.args.get('updated_since', '').strip()
         
-        # Build query - filter out soft-deleted orders
-        query = Order.query.filter_by(user_id=user_id).filter(Order.deleted_at.is_(None))
+        # Build query
+        query = Order.query.filter_by(user_id=user_id)
         
         # Apply filters
         if status_filter:
@@ -83,70 +97,38 @@ def get_user_orders():
         if group_deal_id:
             query = query.filter(Order.group_deal_id == int(group_deal_id))
         
-        # Order by creation date (newest first)
-        query = query.order_by(Order.created_at.desc())
+        if updated_since:
+            return _sync_user_orders(query, updated_since, limit)
         
-        orders = query.all()
+        # Filter out soft-deleted orders
+        query = query.filter(Order.deleted_at.is_(None))
         
-        # Build response with order details
-        orders_data = []
-        for order in orders:
-            order_dict = order.to_dict()
-            
-            # Get group deal info (excluding soft-deleted)
-            group_deal = GroupDeal.query.filter(
-                GroupDeal.id == order.group_deal_id,
-                GroupDeal.deleted_at.is_(None)
-            ).first()
-            if group_deal:
-                # Auto-confirm order if past order_end_date but still submitted
-                now = utc_now()
-                if order.status == OrderStatus.SUBMITTED.value and group_deal.order_end_date < now:
-                    order.status = OrderStatus.CONFIRMED.value
-                    db.session.commit()
-                    current_app.logger.info(f'Auto-confirmed order {order.id} after order_end_date')
-                
-                order_dict['group_deal'] = {
-                    'id': group_deal.id,
-                    'title': group_deal.title,
-                    'description': group_deal.description,
-                    'pickup_date': group_deal.pickup_date.isoformat() if group_deal.pickup_date else None,
-                    'order_start_date': group_deal.order_start_date.isoformat() if group_deal.order_start_date else None,
-                    'order_end_date': group_deal.order_end_date.isoformat() if group_deal.order_end_date else None,
-                    'status': group_deal.status
-                }
-                # User can only edit/cancel when order status is 'submitted'
-                order_dict['is_editable'] = order.status == OrderStatus.SUBMITTED.value
-            
-            # Get order items with product details
-            items_data = []
-            for item in order.items:
-                item_dict = item.to_dict()
-                product = Product.query.get(item.product_id)
-                if product:
-                    item_dict['product'] = {
-                        'id': product.id,
-                        'name': product.name,
-                        'image': product.image,
-                        'pricing_type': product.pricing_type,
-                        'pricing_data': product.pricing_data
-                    }
-                items_data.append(item_dict)
-            
-            order_dict['items'] = items_data
-            
-            # Get address info if delivery order
-            if order.address_id:
-                address = Address.query.get(order.address_id)
-                if address:
-                    order_dict['address'] = address.to_dict()
-            
-            orders_data.append(order_dict)
+        if limit is None and not cursor:
+            # Order by creation date (newest first)
+            orders = query.order_by(Order.created_at.desc(), Order.id.desc()).all()
+            has_more = False
+        else:
+            limit = max(1, min(limit or ORDERS_PAGE_SIZE, ORDERS_MAX_PAGE_SIZE))
+            position = decode_cursor(cursor) if cursor else None
+            query = apply_keyset(query, Order.created_at, Order.id, position, descending=True)
+            orders, has_more = fetch_page(query, limit)
         
-        return jsonify({
+        # Load group deals, items, products and addresses for all orders at once
+        # Orders past order_end_date are reported as confirmed; the cron job persists it
+        hydrator = OrderHydrator(orders).load()
+        orders_data = [hydrator.serialize(order) for order in orders]
+        
+        response = {
             'orders': orders_data
-        }), 200
+        }
+        if limit is not None or cursor:
+            response['has_more'] = has_more
+            response['next_cursor'] = encode_cursor(orders[-1].created_at, orders[-1].id) if has_more else None
+        
+        return jsonify(response), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f'Error fetching user orders: {e}', exc_info=True)
         return jsonify({
@@ -154,6 +136,45 @@ def get_user_orders():
             'message': str(e)
         }), 500
 
+def _sync_user_orders(query, updated_since, limit):
+    """Return orders changed after updated_since, oldest change first, with tombstones
+    
+    Item edits always rewrite the order's totals, so Order.updated_at covers item changes.
+    
+    updated_at is stamped before commit, so a slow transaction can commit a row older
+    than one already handed out. While has_more, the sync_token is the exact position of
+    the last row; once caught up it is rewound to ORDERS_SYNC_OVERLAP before now, so the
+    next sync re-reads that window (at-least-once).
+    """
+    position = parse_since(updated_since)
+    limit = max(1, min(limit or ORDERS_SYNC_PAGE_SIZE, ORDERS_MAX_SYNC_PAGE_SIZE))
+    query = apply_keyset(query, Order.updated_at, Order.id, position, descending=False)
+    changed, has_more = fetch_page(query, limit)
+    
+    live_orders = [order for order in changed if order.deleted_at is None]
+    hydrator = OrderHydrator(live_orders).load()
+    
+    deleted = [{
+        'id': order.id,
+        'order_number': order.order_number,
+        'deleted_at': order.deleted_at.isoformat()
+    } for order in changed if order.deleted_at is not None]
+    
+    # Continue after the last row sent, or stay put when nothing changed
+    last_position = (changed[-1].updated_at, changed[-1].id) if changed else position
+    if not has_more:
+        overlap_start = utc_now() - ORDERS_SYNC_OVERLAP
+        if last_position[0] > overlap_start:
+            last_position = (overlap_start, 0)
+    sync_token = encode_cursor(*last_position)
+    
+    return jsonify({
+        'orders': [hydrator.serialize(order) for order in live_orders],
+        'deleted': deleted,
+        'sync_token': sync_token,
+        'has_more': has_more
+    }), 200
+
 @orders_bp.route('/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
     """Get a single order by ID (must belong to current user or user must be admin)"""
@@ -173,50 +194,8 @@ def get_order(order_id):
         if not can_access_order(user_id, order):
             return jsonify({'error': 'Access denied'}), 403
         
-        order_dict = order.to_dict()
-        
-        # Get group deal info (excluding soft-deleted)
-        group_deal = GroupDeal.query.filter(
-            GroupDeal.id == order.group_deal_id,
-            GroupDeal.deleted_at.is_(None)
-        ).first()
-        if group_deal:
-            # Auto-confirm order if past order_end_date but still submitted
-            now = utc_now()
-            if order.status == OrderStatus.SUBMITTED.value and group_deal.order_end_date < now:
-                order.status = OrderStatus.CONFIRMED.value
-                db.session.commit()
-                current_app.logger.info(f'Auto-confirmed order {order.id} after order_end_date')
-            
-            order_dict['group_deal'] = {
-                'id': group_deal.id,
-                'title': group_deal.title,
-                'description': group_deal.description,
-                'pickup_date': group_deal.pickup_date.isoformat() if group_deal.pickup_date else None,
-                'order_start_date': group_deal.order_start_date.isoformat() if group_deal.order_start_date else None,
-                'order_end_date': group_deal.order_end_date.isoformat() if group_deal.order_end_date else None,
-                'status': group_deal.status
-            }
-            # User can only edit/cancel when order status is 'submitted'
-            order_dict['is_editable'] = order.status == OrderStatus.SUBMITTED.value
-        
-        # Get order items with product details
-        items_data = []
-        for item in order.items:
-            item_dict = item.to_dict()
-            product = Product.query.get(item.product_id)
-            if product:
-                item_dict['product'] = {
-                    'id': product.id,
-                    'name': product.name,
-                    'image': product.image,
-                    'pricing_type': product.pricing_type,
-                    'description': product.description,
-                    'pricing_data': product.pricing_data
-                }
-            items_data.append(item_dict)
-        
-        order_dict['items'] = items_data
+        # Orders past order_end_date are reported as confirmed; the cron job persists it
+        order_dict = OrderHydrator([order], include_product_description=True).serialize(order)
         
         return jsonify({
             'order': order_dict
@@ -235,6 +214,67 @@ def generate_order_number():
     random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
     return f'GSF-{timestamp}-{random_suffix}'
 
+@orders_bp.route('/orders/quote', methods=['POST'])
+def quote_order():
+    """
+    Price a cart without placing an order.
+    
+    Uses the same pricing engine, delivery fee tiers and free-shipping rules as
+    create_order, but takes no locks and writes nothing. The returned quote_hash
+    can be sent with POST /orders; the order is rejected with 409 if the price
+    changed in between.
+    """
+    user_id, error_response, status_code = require_auth()
+    if error_response:
+        return error_response, status_code
+    
+    try:
+        validated_data, error_response, status_code = validate_request(QuoteOrderSchema)
+        if error_response:
+            return error_response, status_code
+        
+        group_deal_id = validated_data['group_deal_id']
+        items = validated_data['items']
+        delivery_method = validated_data['delivery_method']
+        
+        product_ids = {item_data['product_id'] for item_data in items}
+        
+        # Visible deals are priced from their cached menu document; others from the database
+        products = get_deal_pricing(group_deal_id)
+        if products is None:
+            group_deal = GroupDeal.query.filter(
+                GroupDeal.id == group_deal_id,
+                GroupDeal.deleted_at.is_(None)
+            ).first()
+            if not group_deal:
+                return jsonify({'error': 'Group deal not found'}), 404
+            
+            products = {
+                product.id: product
+                for product in Product.query.join(
+                    GroupDealProduct, GroupDealProduct.product_id == Product.id
+                ).filter(
+                    GroupDealProduct.group_deal_id == group_deal_id,
+                    Product.id.in_(product_ids)
+                ).all()
+            }
+        
+        missing_ids = sorted(product_ids - set(products))
+        if missing_ids:
+            return jsonify({'error': f'Product {missing_ids[0]} not found in this group deal'}), 400
+        
+        quote = build_quote(group_deal_id, items, products, delivery_method)
+        
+        return jsonify({'quote': quote}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error quoting order: {e}', exc_info=True)
+        return jsonify({
+            'error': 'Failed to quote order',
+            'message': str(e)
+        }), 500
+
 @orders_bp.route('/orders', methods=['POST'])
 def create_order():
     """Create a new order or update existing order for the same group deal"""
@@ -256,6 +296,11 @@ def create_order():
         payment_method = validated_data['payment_method']
         notes = validated_data.get('notes')  # User custom notes
         
+        # Reject carts this worker already knows are sold out before opening a transaction
+        admitted, error_msg = check_stock_gate(group_deal_id, items)
+        if not admitted:
+            return jsonify({'error': error_msg}), 400
+        
         # Validate group deal exists and is active (excluding soft-deleted)
         group_deal = GroupDeal.query.filter(
             GroupDeal.id == group_deal_id,
@@ -271,12 +316,23 @@ def create_order():
         
         # Allow multiple orders per group deal - users can place multiple orders
         
+        # Load every cart product in one query; reused for pricing, shipping and the response
+        product_ids = {item_data['product_id'] for item_data in items}
+        products = {
+            product.id: product
+            for product in Product.query.filter(Product.id.in_(product_ids)).all()
+        }
+        for item_data in items:
+            if item_data['product_id'] not in products:
+                return jsonify({'error': f'Product {item_data["product_id"]} not found'}), 404
+        
         # Check and reserve stock (with row-level locking for concurrency safety)
         stock_available, error_msg = check_and_reserve_stock(group_deal_id, items)
         if not stock_available:
             return jsonify({'error': error_msg}), 400
         
         # Verify address belongs to user if delivery method is selected
+        address = None
         if delivery_method == DeliveryMethod.DELIVERY.value:
             address = Address.query.filter_by(id=address_id, user_id=user_id).first()
             if not address:
@@ -285,131 +341,32 @@ def create_order():
             if payment_method == PaymentMethod.CASH.value:
                 return jsonify({'error': '配送订单必须使用电子转账支付'}), 400
         
-        # Calculate order totals
-        subtotal = Decimal('0')
-        order_items = []
-        
-        for item_data in items:
-            product_id = item_data['product_id']
-            quantity = item_data['quantity']
-            pricing_type = item_data.get('pricing_type', 'per_item')
-            
-            # Get product
-            product = Product.query.get(product_id)
-            if not product:
-                return jsonify({'error': f'Product {product_id} not found'}), 404
-            
-            # ============================================================================
-            # CRITICAL: Calculate item price based on pricing type
-            # ============================================================================
-            # This logic MUST handle ALL pricing types correctly, especially when
-            # final_weight is provided. DO NOT REMOVE OR SIMPLIFY WITHOUT TESTING!
-            #
-            # Pricing types:
-            # 1. per_item: Fixed price per item
-            # 2. weight_range: Price based on weight ranges (use lowest for estimation)
-            # 3. unit_weight: Price = weight × price_per_unit
-            # 4. bundled_weight: Price = final_weight × price_per_unit (e.g., 3.77 lb × $6.99/lb)
-            #
-            # REGRESSION WARNING: bundled_weight MUST calculate using final_weight when provided!
-            # Bug example: User enters final_weight = 3.77 lb for $6.99/lb product
-            # - Expected: $26.35 (3.77 × 6.99)
-            # - Bug: $38.45 (using estimated mid-weight instead of actual weight)
-            # ============================================================================
-            
-            # Calculate item price based on pricing type
-            if pricing_type == 'per_item':
-                # Use product's default price
-                unit_price = product.get_display_price() or 0
-                total_price = unit_price * quantity
-            elif pricing_type == 'weight_range':
-                # For estimation without final_weight, use first range (lowest weight)
-                ranges = product.pricing_data.get('ranges', []) if product.pricing_data else []
-                if ranges:
-                    unit_price = float(ranges[0].get('price', 0))
-                else:
-                    unit_price = 0
-                total_price = unit_price * quantity
-            elif pricing_type == 'unit_weight':
-                # unit_weight: price_per_unit is price per unit weight
-                # unit_price = price_per_unit (the rate)
-                # total_price = price_per_unit * final_weight (or estimated weight)
-                # Quantity is always 1 for weight-based products (they're weighed individually, not stacked)
-                price_per_unit = float(product.pricing_data.get('price_per_unit', 0) if product.pricing_data else 0)
-                final_weight = item_data.get('final_weight')
-                
-                unit_price = price_per_unit  # Unit price is the rate itself
-                
-                if final_weight is not None:
-                    try:
-                        final_weight_float = float(final_weight)
-                        if final_weight_float > 0 and price_per_unit > 0:
-                            total_price = price_per_unit * final_weight_float
-                        else:
-                            # Invalid weight, use estimated weight
-                            estimated_weight = 1  # Minimum 1 unit for estimation
-                            total_price = price_per_unit * estimated_weight
-                    except (ValueError, TypeError):
-                        # Invalid weight, use estimated weight
-                        estimated_weight = 1  # Minimum 1 unit for estimation
-                        total_price = price_per_unit * estimated_weight
-                else:
-                    # No final_weight, use estimated weight
-                    estimated_weight = 1  # Minimum 1 unit for estimation
-                    total_price = price_per_unit * estimated_weight
-            elif pricing_type == 'bundled_weight':
-                # Bundled weight: products are weighed individually, not stacked
-                # unit_price = price_per_unit (the rate)
-                # total_price = price_per_unit * final_weight (or estimated weight)
-                # Quantity is always 1 for weight-based products (they're weighed individually, not stacked)
-                price_per_unit = float(product.pricing_data.get('price_per_unit', 0) if product.pricing_data else 0)
-                final_weight = item_data.get('final_weight')
-                
-                unit_price = price_per_unit  # Unit price is the rate itself
-                
-                # Convert final_weight to float if provided and valid
-                if final_weight is not None:
-                    try:
-                        final_weight_float = float(final_weight)
-                        if final_weight_float > 0 and price_per_unit > 0:
-                            total_price = price_per_unit * final_weight_float
-                        else:
-                            final_weight = None  # Invalid weight or no price_per_unit, use estimation
-                    except (ValueError, TypeError):
-                        final_weight = None  # Invalid weight, use estimation
-                
-                # Use estimation if no valid final_weight or price_per_unit is 0
-                if final_weight is None:
-                    if price_per_unit > 0:
-                        # Use min-weight for conservative estimation
-                        min_weight = float(product.pricing_data.get('min_weight', 7) if product.pricing_data else 7)
-                        total_price = price_per_unit * min_weight
-                    else:
-                        # price_per_unit is 0 or missing - unit_price stays as price_per_unit (0)
-                        # No fallback - unit_price should always be price_per_unit from DB
-                        total_price = 0
-            else:
-                unit_price = product.get_display_price() or 0
-                total_price = unit_price * quantity
-            
-            subtotal += Decimal(str(total_price))
-            
-            order_items.append({
-                'product_id': product_id,
-                'product': product,  # Include product object for shipping calculation
-                'quantity': quantity,
-                'unit_price': unit_price,
-                'total_price': total_price,
-                'final_weight': item_data.get('final_weight')  # Include weight for bundled_weight products
-            })
-        
-        # Calculate shipping fee
-        address = None
-        if delivery_method == DeliveryMethod.DELIVERY.value and address_id:
-            address = Address.query.get(address_id)
-        
+        # Price the whole cart with the shared pricing engine (see utils/pricing.py)
+        priced_lines, subtotal = price_cart(items, products, use_requested_type=True)
+        order_items = [{
+            'product_id': line.product_id,
+            'product': line.product,  # Include product object for shipping calculation
+            'quantity': line.quantity,
+            'unit_price': line.unit_price,
+            'total_price': line.total_price,
+            'final_weight': line.final_weight  # Include weight for bundled_weight products
+        } for line in priced_lines]
+        
+        # Calculate shipping fee (address was loaded above for delivery orders)
         shipping_fee = calculate_shipping_fee(subtotal, delivery_method, address, order_items)
         
+        # If the client priced the cart with POST /orders/quote, refuse to charge a different amount
+        quote_hash = validated_data.get('quote_hash')
+        if quote_hash and quote_hash != compute_quote_hash(
+            group_deal_id, delivery_method, priced_lines, subtotal, shipping_fee
+        ):
+            db.session.rollback()  # Release the stock reserved above
+            return jsonify({
+                'error': 'Quote expired',
+                'message': '价格已变更，请重新确认订单',
+                'quote': build_quote(group_deal_id, items, products, delivery_method)
+            }), 409
+        
         # Calculate tax (0% for now, can be configured later)
         tax = Decimal('0')
         total = subtotal + tax + shipping_fee
@@ -447,66 +404,31 @@ def create_order():
         db.session.add(order)
         db.session.flush()  # Get order ID
         
-        # Create order items
-        for item_data in order_items:
-            # Get final_weight, convert to float if provided, otherwise None
-            final_weight = item_data.get('final_weight')
-            if final_weight is not None:
-                try:
-                    final_weight = float(final_weight)
-                    # Only save if weight is positive
-                    if final_weight <= 0:
-                        final_weight = None
-                except (ValueError, TypeError):
-                    final_weight = None
-            
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item_data['product_id'],
-                quantity=item_data['quantity'],
-                unit_price=item_data['unit_price'],
-                total_price=item_data['total_price'],
-                final_weight=final_weight  # Save weight for bundled_weight products
-            )
-            db.session.add(order_item)
+        # Create order items with a single multi-row INSERT
+        item_rows = [{
+            'order_id': order.id,
+            'product_id': item_data['product_id'],
+            'quantity': item_data['quantity'],
+            'unit_price': item_data['unit_price'],
+            'total_price': item_data['total_price'],
+            'final_weight': item_data['final_weight']  # Save weight for bundled_weight products
+        } for item_data in order_items]
+        db.session.execute(insert(OrderItem), item_rows)
+        
+        # Build the response from rows already in memory (only the new items are read back)
+        order_dict = OrderHydrator(
+            [order],
+            group_deals={group_deal.id: group_deal},
+            products=products,
+            addresses={address.id: address} if address else None
+        ).serialize(order)
+        
+        # Sales stats are written by the background aggregator once this commits
+        record_order_sales(order, item_rows)
         
         # Commit transaction
         db.session.commit()
         
-        # Update product sales stats
-        try:
-            update_product_sales_stats(order)
-        except Exception as e:
-            current_app.logger.warning(f'Failed to update sales stats: {e}')
-        
-        # Return created order
-        order_dict = order.to_dict()
-        
-        # Get group deal info
-        order_dict['group_deal'] = {
-            'id': group_deal.id,
-            'title': group_deal.title,
-            'description': group_deal.description,
-            'pickup_date': group_deal.pickup_date.isoformat() if group_deal.pickup_date else None
-        }
-        
-        # Get order items with product details
-        items_data = []
-        for item in order.items:
-            item_dict = item.to_dict()
-            product = Product.query.get(item.product_id)
-            if product:
-                item_dict['product'] = {
-                    'id': product.id,
-                    'name': product.name,
-                    'image': product.image,
-                    'pricing_type': product.pricing_type,
-                    'pricing_data': product.pricing_data
-                }
-            items_data.append(item_dict)
-        
-        order_dict['items'] = items_data
-        
         return jsonify({
             'order': order_dict,
             'message': 'Order created successfully',
@@ -543,11 +465,7 @@ def cancel_order(order_id):
         if order.status == OrderStatus.CANCELLED.value:
             return jsonify({'error': '订单已取消'}), 400
         
-        # User can only cancel if order status is 'submitted'
-        if order.status != 'submitted':
-            return jsonify({'error': '订单已确认，无法取消'}), 400
-        
-        # Get group deal for response (excluding soft-deleted)
+        # Get group deal (excluding soft-deleted)
         group_deal = GroupDeal.query.filter(
             GroupDeal.id == order.group_deal_id,
             GroupDeal.deleted_at.is_(None)
@@ -555,6 +473,11 @@ def cancel_order(order_id):
         if not group_deal:
             return jsonify({'error': 'Group deal not found'}), 404
         
+        # User can only cancel if order status is 'submitted'
+        # (orders past order_end_date count as confirmed even before the cron job runs)
+        if get_effective_order_status(order, group_deal) != OrderStatus.SUBMITTED.value:
+            return jsonify({'error': '订单已确认，无法取消'}), 400
+        
         # Restore stock for cancelled order
         items_to_restore = [{'product_id': item.product_id, 'quantity': item.quantity} for item in order.items]
         try:
@@ -566,42 +489,16 @@ def cancel_order(order_id):
         # Cancel the order
         order.status = OrderStatus.CANCELLED.value
         order.updated_at = utc_now()
+        record_order_sales(order, items_to_restore, sign=-1)
         
         db.session.commit()
         
         current_app.logger.info(f'Order {order_id} cancelled by user {user_id}')
         
         # Return updated order
-        order_dict = order.to_dict()
-        
-        # Get group deal info
-        order_dict['group_deal'] = {
-            'id': group_deal.id,
-            'title': group_deal.title,
-            'description': group_deal.description,
-            'pickup_date': group_deal.pickup_date.isoformat() if group_deal.pickup_date else None,
-            'order_start_date': group_deal.order_start_date.isoformat() if group_deal.order_start_date else None,
-            'order_end_date': group_deal.order_end_date.isoformat() if group_deal.order_end_date else None
-        }
+        order_dict = OrderHydrator([order]).serialize(order)
         order_dict['is_editable'] = False  # Cancelled orders are not editable
         
-        # Get order items with product details
-        items_data = []
-        for item in order.items:
-            item_dict = item.to_dict()
-            product = Product.query.get(item.product_id)
-            if product:
-                item_dict['product'] = {
-                    'id': product.id,
-                    'name': product.name,
-                    'image': product.image,
-                    'pricing_type': product.pricing_type,
-                    'pricing_data': product.pricing_data
-                }
-            items_data.append(item_dict)
-        
-        order_dict['items'] = items_data
-        
         return jsonify({
             'order': order_dict,
             'message': 'Order cancelled successfully'
@@ -655,6 +552,9 @@ def reactivate_order(order_id):
         
         # Check and reserve stock again (with row-level locking for concurrency safety)
         items_to_reserve = [{'product_id': item.product_id, 'quantity': item.quantity} for item in order.items]
+        admitted, error_msg = check_stock_gate(order.group_deal_id, items_to_reserve)
+        if not admitted:
+            return jsonify({'error': error_msg}), 400
         stock_available, error_msg = check_and_reserve_stock(order.group_deal_id, items_to_reserve)
         if not stock_available:
             return jsonify({'error': error_msg}), 400
@@ -662,43 +562,16 @@ def reactivate_order(order_id):
         # Reactivate the order
         order.status = OrderStatus.SUBMITTED.value
         order.updated_at = utc_now()
+        record_order_sales(order, items_to_reserve)
         
         db.session.commit()
         
         current_app.logger.info(f'Order {order_id} reactivated by user {user_id}')
         
         # Return updated order
-        order_dict = order.to_dict()
-        
-        # Get group deal info
-        order_dict['group_deal'] = {
-            'id': group_deal.id,
-            'title': group_deal.title,
-            'description': group_deal.description,
-            'pickup_date': group_deal.pickup_date.isoformat() if group_deal.pickup_date else None,
-            'order_start_date': group_deal.order_start_date.isoformat() if group_deal.order_start_date else None,
-            'order_end_date': group_deal.order_end_date.isoformat() if group_deal.order_end_date else None,
-            'status': group_deal.status
-        }
+        order_dict = OrderHydrator([order]).serialize(order)
         order_dict['is_editable'] = True  # Reactivated orders are editable
         
-        # Get order items with product details
-        items_data = []
-        for item in order.items:
-            item_dict = item.to_dict()
-            product = Product.query.get(item.product_id)
-            if product:
-                item_dict['product'] = {
-                    'id': product.id,
-                    'name': product.name,
-                    'image': product.image,
-                    'pricing_type': product.pricing_type,
-                    'pricing_data': product.pricing_data
-                }
-            items_data.append(item_dict)
-        
-        order_dict['items'] = items_data
-        
         return jsonify({
             'order': order_dict,
             'message': '订单已重新激活'
@@ -755,6 +628,16 @@ def update_order(order_id):
         new_items = {(item_data['product_id'], item_data['quantity']) for item_data in items}
         items_changed = existing_items != new_items
         
+        # Load every cart product in one query; reused for pricing, shipping and the response
+        product_ids = {item_data['product_id'] for item_data in items}
+        products = {
+            product.id: product
+            for product in Product.query.filter(Product.id.in_(product_ids)).all()
+        }
+        for item_data in items:
+            if item_data['product_id'] not in products:
+                return jsonify({'error': f'Product {item_data["product_id"]} not found'}), 404
+        
         # If items are being changed, we need to update stock
         if items_changed:
             # Prepare items lists for stock management
@@ -776,7 +659,7 @@ def update_order(order_id):
         if items_changed:
             # User can only edit items if order status is 'submitted'
             # Confirmed orders (including when group deal is closed) cannot edit products
-            if order.status != 'submitted':
+            if get_effective_order_status(order, group_deal) != OrderStatus.SUBMITTED.value:
                 return jsonify({'error': '订单已确认，不可修改商品'}), 400
             
             # Check if still within order window
@@ -795,6 +678,7 @@ def update_order(order_id):
             # Allow delivery/payment method update even after order_end_date or for confirmed orders
         
         # Verify address belongs to user if delivery method is selected
+        address = None
         if delivery_method == DeliveryMethod.DELIVERY.value:
             address = Address.query.filter_by(id=address_id, user_id=user_id).first()
             if not address:
@@ -803,158 +687,18 @@ def update_order(order_id):
             if payment_method == PaymentMethod.CASH.value:
                 return jsonify({'error': '配送订单必须使用电子转账支付'}), 400
         
-        # Calculate new order totals
-        subtotal = Decimal('0')
-        new_order_items = []
-        
-        for item_data in items:
-            product_id = item_data['product_id']
-            quantity = item_data['quantity']
-            pricing_type = item_data.get('pricing_type', 'per_item')
-            
-            # Get product
-            product = Product.query.get(product_id)
-            if not product:
-                return jsonify({'error': f'Product {product_id} not found'}), 404
-            
-            # ============================================================================
-            # CRITICAL: Calculate item price based on pricing type
-            # ============================================================================
-            # This logic MUST handle ALL pricing types correctly, especially when
-            # final_weight is provided. DO NOT REMOVE OR SIMPLIFY WITHOUT TESTING!
-            #
-            # Pricing types:
-            # 1. per_item: Fixed price per item
-            # 2. weight_range: Price based on weight ranges
-            # 3. unit_weight: Price = weight × price_per_unit
-            # 4. bundled_weight: Price = final_weight × price_per_unit (e.g., 3.77 lb × $6.99/lb)
-            #
-            # REGRESSION WARNING: bundled_weight MUST calculate using final_weight when provided!
-            # Bug example: User enters final_weight = 3.77 lb for $6.99/lb product
-            # - Expected: $26.35 (3.77 × 6.99)
-            # - Bug: $38.45 (using estimated mid-weight instead of actual weight)
-            # ============================================================================
-            
-            # Calculate item price based on pricing type
-            if pricing_type == 'per_item':
-                # Use product's default price
-                unit_price = product.get_display_price() or 0
-                total_price = unit_price * quantity
-            elif pricing_type == 'weight_range':
-                final_weight = item_data.get('final_weight')
-                ranges = product.pricing_data.get('ranges', []) if product.pricing_data else []
-                
-                if final_weight is not None and ranges:
-                    try:
-                        final_weight_float = float(final_weight)
-                        if final_weight_float > 0:
-                            # Find matching range based on final_weight
-                            matched_price = None
-                            for range_item in ranges:
-                                min_weight = range_item.get('min', 0)
-                                max_weight = range_item.get('max')
-                                if final_weight_float >= min_weight and (max_weight is None or final_weight_float < max_weight):
-                                    matched_price = float(range_item.get('price', 0))
-                                    break
-                            
-                            if matched_price is not None:
-                                # Use the matched range price (selected from DB based on weight)
-                                unit_price = matched_price
-                                total_price = unit_price * quantity
-                            else:
-                                # No matching range, use first range (lowest weight) for estimation
-                                unit_price = float(ranges[0].get('price', 0)) if ranges else 0
-                                total_price = unit_price * quantity
-                        else:
-                            # Invalid weight, use first range (lowest weight) for estimation
-                            unit_price = float(ranges[0].get('price', 0)) if ranges else 0
-                            total_price = unit_price * quantity
-                    except (ValueError, TypeError):
-                        # Invalid weight, use first range (lowest weight) for estimation
-                        unit_price = float(ranges[0].get('price', 0)) if ranges else 0
-                        total_price = unit_price * quantity
-                else:
-                    # No final_weight, use first range (lowest weight) for estimation
-                    unit_price = float(ranges[0].get('price', 0)) if ranges else 0
-                    total_price = unit_price * quantity
-            elif pricing_type == 'unit_weight':
-                # unit_weight: price_per_unit is price per unit weight
-                # unit_price = price_per_unit (the rate)
-                # total_price = price_per_unit * final_weight (or estimated weight)
-                # Quantity is always 1 for weight-based products (they're weighed individually, not stacked)
-                final_weight = item_data.get('final_weight')
-                price_per_unit = float(product.pricing_data.get('price_per_unit', 0) if product.pricing_data else 0)
-                
-                unit_price = price_per_unit  # Unit price is the rate itself
-                
-                if final_weight is not None:
-                    try:
-                        final_weight_float = float(final_weight)
-                        if final_weight_float > 0 and price_per_unit > 0:
-                            total_price = price_per_unit * final_weight_float
-                        else:
-                            # Invalid weight, use estimated weight
-                            estimated_weight = 1  # Minimum 1 unit for estimation
-                            total_price = price_per_unit * estimated_weight
-                    except (ValueError, TypeError):
-                        # Invalid weight, use estimated weight
-                        estimated_weight = 1  # Minimum 1 unit for estimation
-                        total_price = price_per_unit * estimated_weight
-                else:
-                    # No final_weight, use estimated weight
-                    estimated_weight = 1  # Minimum 1 unit for estimation
-                    total_price = price_per_unit * estimated_weight
-            elif pricing_type == 'bundled_weight':
-                # Bundled weight: products are weighed individually, not stacked
-                # unit_price = price_per_unit (the rate)
-                # total_price = price_per_unit * final_weight (or estimated weight)
-                # Quantity is always 1 for weight-based products (they're weighed individually, not stacked)
-                price_per_unit = float(product.pricing_data.get('price_per_unit', 0) if product.pricing_data else 0)
-                final_weight = item_data.get('final_weight')
-                
-                unit_price = price_per_unit  # Unit price is the rate itself
-                
-                # Convert final_weight to float if provided and valid
-                if final_weight is not None:
-                    try:
-                        final_weight_float = float(final_weight)
-                        if final_weight_float > 0 and price_per_unit > 0:
-                            total_price = price_per_unit * final_weight_float
-                        else:
-                            final_weight = None  # Invalid weight or no price_per_unit, use estimation
-                    except (ValueError, TypeError):
-                        final_weight = None  # Invalid weight, use estimation
-                
-                # Use estimation if no valid final_weight or price_per_unit is 0
-                if final_weight is None:
-                    if price_per_unit > 0:
-                        # Use min-weight for conservative estimation
-                        min_weight = float(product.pricing_data.get('min_weight', 7) if product.pricing_data else 7)
-                        total_price = price_per_unit * min_weight
-                    else:
-                        # price_per_unit is 0 or missing - unit_price stays as price_per_unit (0)
-                        # No fallback - unit_price should always be price_per_unit from DB
-                        total_price = 0
-            else:
-                unit_price = product.get_display_price() or 0
-                total_price = unit_price * quantity
-            
-            subtotal += Decimal(str(total_price))
-            
-            new_order_items.append({
-                'product_id': product_id,
-                'product': product,  # Include product object for shipping calculation
-                'quantity': quantity,
-                'unit_price': unit_price,
-                'total_price': total_price,
-                'final_weight': item_data.get('final_weight')  # Include weight for bundled_weight products
-            })
-        
-        # Calculate shipping fee
-        address = None
-        if delivery_method == DeliveryMethod.DELIVERY.value and address_id:
-            address = Address.query.get(address_id)
-        
+        # Price the whole cart with the shared pricing engine (see utils/pricing.py)
+        priced_lines, subtotal = price_cart(items, products, use_requested_type=True)
+        new_order_items = [{
+            'product_id': line.product_id,
+            'product': line.product,  # Include product object for shipping calculation
+            'quantity': line.quantity,
+            'unit_price': line.unit_price,
+            'total_price': line.total_price,
+            'final_weight': line.final_weight  # Include weight for bundled_weight products
+        } for line in priced_lines]
+        
+        # Calculate shipping fee (address was loaded above for delivery orders)
         shipping_fee = calculate_shipping_fee(subtotal, delivery_method, address, new_order_items)
         
         # Calculate tax (0% for now, can be configured later)
@@ -990,71 +734,27 @@ def update_order(order_id):
         
         # Create new order items
         for item_data in new_order_items:
-            # Get final_weight, convert to float if provided, otherwise None
-            final_weight = item_data.get('final_weight')
-            if final_weight is not None:
-                try:
-                    final_weight = float(final_weight)
-                    # Only save if weight is positive
-                    if final_weight <= 0:
-                        final_weight = None
-                except (ValueError, TypeError):
-                    final_weight = None
-            
             order_item = OrderItem(
                 order_id=order.id,
                 product_id=item_data['product_id'],
                 quantity=item_data['quantity'],
                 unit_price=item_data['unit_price'],
                 total_price=item_data['total_price'],
-                final_weight=final_weight  # Save weight for bundled_weight products
+                final_weight=item_data['final_weight']  # Save weight for bundled_weight products
             )
             db.session.add(order_item)
         
+        if items_changed:
+            record_order_sales_change(order, old_items_list, new_items_list)
+        
         # Commit transaction
         db.session.commit()
         
         # Refresh the order from database to ensure we have latest data
         db.session.refresh(order)
         
-        # Update product sales stats
-        try:
-            update_product_sales_stats(order)
-        except Exception as e:
-            current_app.logger.warning(f'Failed to update sales stats: {e}')
-        
         # Return updated order
-        order_dict = order.to_dict()
-        
-        # Get group deal info
-        order_dict['group_deal'] = {
-            'id': group_deal.id,
-            'title': group_deal.title,
-            'description': group_deal.description,
-            'pickup_date': group_deal.pickup_date.isoformat() if group_deal.pickup_date else None,
-            'order_start_date': group_deal.order_start_date.isoformat() if group_deal.order_start_date else None,
-            'order_end_date': group_deal.order_end_date.isoformat() if group_deal.order_end_date else None,
-            'status': group_deal.status
-        }
-        # User can only edit/cancel when order status is 'submitted'
-        order_dict['is_editable'] = order.status == OrderStatus.SUBMITTED.value
-        
-        # Get order items with product details
-        items_data = []
-        for item in order.items:
-            item_dict = item.to_dict()
-            product = Product.query.get(item.product_id)
-            if product:
-                item_dict['product'] = {
-                    'id': product.id,
-                    'name': product.name,
-                    'image': product.image,
-                    'pricing_type': product.pricing_type,
-                    'pricing_data': product.pricing_data
-                }
-            items_data.append(item_dict)
-        
-        order_dict['items'] = items_data
+        order_dict = OrderHydrator([order]).serialize(order)
         
         return jsonify({
             'order': order_dict,
@@ -1,58 +1,39 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, current_app, stream_with_context
 from models import db
 from models.product import Product
-from models.groupdeal import GroupDeal, GroupDealProduct
+from models.groupdeal import GroupDeal
 from models.product_sales_stats import ProductSalesStats
-from models.user import AuthToken, User
 from datetime import datetime, timezone, date, timedelta
 from models.base import utc_now
 from sqlalchemy import func, desc
+from sqlalchemy.orm import joinedload
+from config import Config
+from utils.auth import get_current_principal_optional
+from utils.catalog import SNAPSHOT_SORTS, get_catalog_snapshot
+from utils.deal_menu import get_deal_menus
+from utils.sales_stats import get_sales_totals
+from utils.stock_events import get_stock_snapshot, acquire_stream_slot, release_stream_slot, stream_stock_events
 
-def get_user_id_optional():
-    """Get user_id if authenticated, otherwise return None (optional auth for group deal endpoint)"""
-    auth_header = request.headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        token = auth_header.replace('Bearer ', '').strip()
-    else:
-        token = auth_header.strip()
-    
-    if not token:
-        return None  # Not authenticated, but that's OK for this endpoint
-    
-    auth_token = AuthToken.query.filter_by(token=token, is_revoked=False).first()
-    if not auth_token or not auth_token.is_valid():
-        return None  # Invalid/expired token, but that's OK for this endpoint
-    
-    # Get user
-    user = User.query.get(auth_token.user_id)
-    if not user or not user.is_active:
-        return None  # User not found or inactive
-    
-    return user.id
+products_bp = Blueprint('products', __name__)
 
-def get_current_user_optional():
-    """Get user object if authenticated, otherwise return None (optional auth for group deal endpoint)"""
-    auth_header = request.headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        token = auth_header.replace('Bearer ', '').strip()
-    else:
-        token = auth_header.strip()
-    
-    if not token:
-        return None  # Not authenticated, but that's OK for this endpoint
+def _snapshot_response(snapshot, show_all):
+    """Serve a catalog snapshot, honouring If-None-Match and gzip"""
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    etag = snapshot.gzip_etag if use_gzip else snapshot.etag
     
-    auth_token = AuthToken.query.filter_by(token=token, is_revoked=False).first()
-    if not auth_token or not auth_token.is_valid():
-        return None  # Invalid/expired token, but that's OK for this endpoint
-    
-    # Get user
-    user = User.query.get(auth_token.user_id)
-    if not user or not user.is_active:
-        return None  # User not found or inactive
+    if snapshot.matches(request.headers.get('If-None-Match')):
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.gzip_body if use_gzip else snapshot.body, status=200, mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
     
-    return user
+    response.headers['ETag'] = etag
+    response.headers['Vary'] = 'Accept-Encoding, Authorization'
+    # Clients may keep the body but must revalidate; admin variant is not shared
+    response.headers['Cache-Control'] = 'private, no-cache' if show_all else 'public, no-cache'
+    return response
 
-products_bp = Blueprint('products', __name__)
 
 @products_bp.route('/products', methods=['GET'])
 def get_products():
@@ -69,14 +50,19 @@ def get_products():
         # Get query parameters
         sort_by = request.args.get('sort', 'custom')
         days = request.args.get('days', 30, type=int)
+        include_stats = request.args.get('include_stats', 'false').lower() == 'true'
+        
+        # Catalog-only variants are served from a pre-serialized snapshot with an ETag
+        if sort_by in SNAPSHOT_SORTS and not include_stats:
+            return _snapshot_response(get_catalog_snapshot(sort_by, show_all), show_all)
         
         # Build base query
         if show_all:
             # Admin: show all products
-            query = Product.query
+            query = Product.query.options(joinedload(Product.supplier))
         else:
             # Public: show only active products
-            query = Product.query.filter_by(is_active=True)
+            query = Product.query.options(joinedload(Product.supplier)).filter_by(is_active=True)
         
         # Apply sorting
         if sort_by == 'popularity':
@@ -107,28 +93,18 @@ def get_products():
         products = query.all()
         
         # For public API, optionally include sales stats if requested
-        include_stats = request.args.get('include_stats', 'false').lower() == 'true'
         products_data = []
         
         if include_stats:
-            start_date = date.today() - timedelta(days=days)
+            # All products' totals for the window in one GROUP BY (cached per days/date)
+            sales_totals = get_sales_totals(days)
             for product in products:
                 product_dict = product.to_dict()
-                
-                # Get sales stats
-                stats_query = db.session.query(
-                    func.sum(ProductSalesStats.quantity_sold).label('total_sold'),
-                    func.sum(ProductSalesStats.order_count).label('total_orders')
-                ).filter(
-                    ProductSalesStats.product_id == product.id,
-                    ProductSalesStats.sale_date >= start_date
-                ).first()
-                
+                total_sold, total_orders = sales_totals.get(product.id, (0, 0))
                 product_dict['sales_stats'] = {
-                    'total_sold': int(stats_query.total_sold) if stats_query.total_sold else 0,
-                    'total_orders': int(stats_query.total_orders) if stats_query.total_orders else 0
+                    'total_sold': total_sold,
+                    'total_orders': total_orders
                 }
-                
                 products_data.append(product_dict)
         else:
             products_data = [product.to_dict() for product in products]
@@ -165,7 +141,7 @@ def get_group_deals():
     """Get all group deals. Admin users can see draft deals, regular users cannot."""
     try:
         # Get current user to check if they're admin
-        current_user = get_current_user_optional()
+        current_user = get_current_principal_optional()
         is_admin = current_user and current_user.is_admin
         
         # Build query based on user role
@@ -182,28 +158,8 @@ def get_group_deals():
             GroupDeal.deleted_at.is_(None)
         ).order_by(GroupDeal.order_start_date.desc()).all()
         
-        # Include products for each deal
-        deals_data = []
-        for deal in deals:
-            deal_dict = deal.to_dict()
-            # Get products for this deal
-            deal_products = GroupDealProduct.query.filter_by(group_deal_id=deal.id).all()
-            products_data = []
-            for dp in deal_products:
-                product = Product.query.get(dp.product_id)
-                if product and product.is_active:
-                    product_dict = product.to_dict()
-                    product_dict['deal_stock_limit'] = dp.deal_stock_limit
-                    products_data.append(product_dict)
-            # Sort products by custom sort_order, then move out of stock items to bottom
-            # Out of stock = deal_stock_limit is 0 (not None, which means unlimited)
-            products_data.sort(key=lambda p: (
-                p.get('deal_stock_limit') == 0 if p.get('deal_stock_limit') is not None else False,
-                p.get('sort_order', 0),
-                p.get('id', 0)
-            ))
-            deal_dict['products'] = products_data
-            deals_data.append(deal_dict)
+        # Materialized menus with live stock limits overlaid (one stock query for all deals)
+        deals_data = get_deal_menus(deals, active_only=True)
         
         return jsonify({
             'deals': deals_data
@@ -222,27 +178,7 @@ def get_group_deal(deal_id):
             GroupDeal.id == deal_id,
             GroupDeal.deleted_at.is_(None)
         ).first_or_404()
-        deal_dict = deal.to_dict()
-        
-        # Get products for this deal
-        deal_products = GroupDealProduct.query.filter_by(group_deal_id=deal.id).all()
-        products_data = []
-        for dp in deal_products:
-            product = Product.query.get(dp.product_id)
-            if product:
-                product_dict = product.to_dict()
-                product_dict['deal_stock_limit'] = dp.deal_stock_limit
-                products_data.append(product_dict)
-        
-        # Sort products by custom sort_order, then move out of stock items to bottom
-        # Out of stock = deal_stock_limit is 0 (not None, which means unlimited)
-        products_data.sort(key=lambda p: (
-            p.get('deal_stock_limit') == 0 if p.get('deal_stock_limit') is not None else False,
-            p.get('sort_order', 0),
-            p.get('id', 0)
-        ))
-        
-        deal_dict['products'] = products_data
+        deal_dict = get_deal_menus([deal])[0]
         
         # Don't return order data - allow users to place multiple orders per group deal
         # Orders should be accessed via the /orders endpoint
@@ -258,3 +194,51 @@ def get_group_deal(deal_id):
             'message': str(e)
         }), 404
 
+@products_bp.route('/group-deals/<int:deal_id>/stock', methods=['GET'])
+def get_group_deal_stock(deal_id):
+    """Remaining deal_stock_limit per product (None = unlimited), for cheap sold-out polling"""
+    try:
+        stock = get_stock_snapshot(deal_id)
+        if stock is None:
+            return jsonify({
+                'error': 'Group deal not found'
+            }), 404
+        
+        response = jsonify({
+            'group_deal_id': deal_id,
+            'stock': stock
+        })
+        max_age = current_app.config.get('DEAL_STOCK_TTL_SECONDS', Config.DEAL_STOCK_TTL_SECONDS)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        return response, 200
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to fetch group deal stock',
+            'message': str(e)
+        }), 500
+
+@products_bp.route('/group-deals/<int:deal_id>/stock/stream', methods=['GET'])
+def stream_group_deal_stock(deal_id):
+    """Server-sent events: a stock snapshot, then per-product stock changes as they are committed"""
+    stock = get_stock_snapshot(deal_id)
+    if stock is None:
+        return jsonify({
+            'error': 'Group deal not found'
+        }), 404
+    
+    # Streams hold a worker thread; when they are all taken clients fall back to polling /stock
+    if not acquire_stream_slot():
+        response = jsonify({
+            'error': 'Too many stock streams',
+            'message': 'Poll /stock instead'
+        })
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    response = Response(stream_with_context(stream_stock_events(deal_id, stock)), mimetype='text/event-stream')
+    # Runs even if the client disconnects before the first event
+    response.call_on_close(release_stream_slot)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,6 +1,6 @@
 """Admin request/response schemas"""
-from marshmallow import Schema, fields, validate, EXCLUDE, ValidationError
-from constants.status_enums import OrderStatus, PaymentStatus
+from marshmallow import Schema, fields, validate, validates_schema, EXCLUDE, ValidationError
+from constants.status_enums import OrderStatus, PaymentStatus, UserStatus
 
 
 class CreateSupplierSchema(Schema):
@@ -120,3 +120,46 @@ class UpdateUserSchema(Schema):
     class Meta:
         unknown = EXCLUDE
 
+
+class UserFilterSchema(Schema):
+    """Filter selecting users for bulk changes (all given conditions must match)"""
+    status = fields.String(validate=validate.OneOf([s.value for s in UserStatus]))
+    user_source = fields.String(validate=validate.Length(min=1, max=50))
+    role = fields.String(validate=validate.OneOf(['admin', 'user']))
+    search = fields.String(validate=validate.Length(min=1))
+    
+    class Meta:
+        unknown = EXCLUDE
+
+
+class BulkUserTargetSchema(Schema):
+    """Users for a bulk change: explicit user_ids or a filter, not both"""
+    user_ids = fields.List(fields.Integer(), validate=validate.Length(min=1))
+    filter = fields.Nested(UserFilterSchema)
+    
+    @validates_schema
+    def validate_target(self, data, **kwargs):
+        """Require exactly one of user_ids or a non-empty filter"""
+        has_ids = bool(data.get('user_ids'))
+        has_filter = bool(data.get('filter'))
+        if has_ids == has_filter:
+            raise ValidationError({'user_ids': ['Provide either user_ids or a non-empty filter']})
+    
+    class Meta:
+        unknown = EXCLUDE
+
+
+class BulkUserSourceSchema(BulkUserTargetSchema):
+    """Schema for bulk assigning a user source"""
+    user_source = fields.String(required=True, validate=validate.OneOf(['花泽', 'default']))
+
+
+class BulkUserStatusSchema(BulkUserTargetSchema):
+    """Schema for bulk banning / unbanning users"""
+    status = fields.String(required=True, validate=validate.OneOf([s.value for s in UserStatus]))
+
+
+class BulkUserRoleSchema(BulkUserTargetSchema):
+    """Schema for bulk assigning or removing a role"""
+    role = fields.String(required=True, validate=validate.OneOf(['admin', 'user']))
+    action = fields.String(required=True, validate=validate.OneOf(['assign', 'remove']))
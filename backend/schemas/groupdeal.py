@@ -1,7 +1,7 @@
 """Group Deal request/response schemas"""
 from marshmallow import Schema, fields, validate, validates_schema, ValidationError, EXCLUDE
 from datetime import datetime
-from constants.status_enums import GroupDealStatus
+from constants.status_enums import GroupDealStatus, StockMode
 
 
 class DateOrDateTimeField(fields.Field):
@@ -37,6 +37,7 @@ class GroupDealProductSchema(Schema):
     """Schema for product in a group deal"""
     product_id = fields.Integer(required=True, validate=validate.Range(min=1))
     deal_stock_limit = fields.Integer(allow_none=True, validate=validate.Range(min=0))
+    stock_mode = fields.String(allow_none=True, validate=validate.OneOf(StockMode.get_all_values()))
     
     class Meta:
         unknown = EXCLUDE
@@ -23,6 +23,7 @@ class CreateOrderSchema(Schema):
     pickup_location = fields.String(allow_none=True, validate=validate.Length(max=100))
     payment_method = fields.String(missing=PaymentMethod.CASH.value, validate=validate.OneOf(PaymentMethod.get_all_values()))
     notes = fields.String(allow_none=True, validate=validate.Length(max=1000))  # User custom notes
+    quote_hash = fields.String(allow_none=True, validate=validate.Length(max=128))  # From POST /orders/quote
     
     @validates('items')
     def validate_items(self, value):
@@ -41,6 +42,16 @@ class CreateOrderSchema(Schema):
         unknown = EXCLUDE
 
 
+class QuoteOrderSchema(Schema):
+    """Schema for pricing a cart without placing an order"""
+    group_deal_id = fields.Integer(required=True, validate=validate.Range(min=1))
+    items = fields.List(fields.Nested(OrderItemSchema), required=True, validate=validate.Length(min=1))
+    delivery_method = fields.String(missing=DeliveryMethod.PICKUP.value, validate=validate.OneOf(DeliveryMethod.get_all_values()))
+    
+    class Meta:
+        unknown = EXCLUDE
+
+
 class UpdateOrderSchema(Schema):
     """Schema for updating an existing order"""
     items = fields.List(fields.Nested(OrderItemSchema), required=True, validate=validate.Length(min=1))
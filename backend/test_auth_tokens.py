@@ -0,0 +1,245 @@
+"""
+Test script for stateless (JWT) access tokens.
+
+This script tests:
+1. An issued access token resolves to its user and embedded roles
+2. A revoked token is rejected once a worker reloads the denylist
+3. An expired token is rejected
+4. Removing a role revokes tokens that still embed it
+5. A token re-issued right after a user-wide revocation is accepted
+"""
+
+import sys
+import os
+import secrets
+from datetime import datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from models.user import User, UserRole, AuthToken, TokenRevocation
+from constants.status_enums import UserStatus
+import utils.auth as auth
+from utils.auth import JWT_AVAILABLE, issue_access_token, resolve_principal, revoke_access_token, revoke_user_tokens
+
+
+ADMIN_PHONE = '6666666601'
+TARGET_PHONE = '6666666602'
+
+
+def _get_or_create_user(phone, nickname):
+    user = User.query.filter_by(phone=phone).first()
+    if not user:
+        user = User(phone=phone, nickname=nickname, status=UserStatus.ACTIVE.value)
+        db.session.add(user)
+        db.session.flush()
+    user.status = UserStatus.ACTIVE.value
+    return user
+
+
+def _ensure_role(user_id, role):
+    if not UserRole.query.filter_by(user_id=user_id, role=role).first():
+        db.session.add(UserRole(user_id=user_id, role=role))
+
+
+def _simulate_other_worker():
+    """Drop this worker's in-memory denylist so only a database reload can reject a token"""
+    auth._denied_jtis.clear()
+    auth._denied_users.clear()
+    auth._refresh_denylist(force=True)
+
+
+def setup_test_data(app):
+    """Create an admin with an opaque token and a target user with the admin role."""
+    with app.app_context():
+        admin = _get_or_create_user(ADMIN_PHONE, 'Test Admin Auth Tokens')
+        target = _get_or_create_user(TARGET_PHONE, 'Test User Auth Tokens')
+        _ensure_role(admin.id, 'admin')
+        _ensure_role(target.id, 'admin')
+
+        # Revocations from previous runs would reject every new token
+        TokenRevocation.query.filter(TokenRevocation.user_id == target.id).delete()
+
+        admin_token = secrets.token_urlsafe(32)
+        db.session.add(AuthToken(
+            user_id=admin.id,
+            token=admin_token,
+            expires_at=datetime.utcnow() + timedelta(days=1)
+        ))
+        db.session.commit()
+        _simulate_other_worker()
+
+        return {'admin_id': admin.id, 'target_id': target.id, 'admin_token': admin_token}
+
+
+def test_issue_and_resolve(app, test_data):
+    """Test 1: An issued token resolves without an AuthToken row."""
+    with app.app_context():
+        print("\n=== Test 1: Issue and Resolve ===")
+
+        token, expires_at = issue_access_token(test_data['target_id'], ['admin'])
+        principal = resolve_principal(token)
+        if not principal:
+            print("✗ Freshly issued token did not resolve")
+            return False
+        print(f"Principal: user {principal.user_id}, roles {principal.roles}, expires {expires_at}")
+
+        if principal.user_id != test_data['target_id'] or not principal.is_admin or principal.token_type != 'jwt':
+            print("✗ Principal does not match the issued claims")
+            return False
+        if AuthToken.query.filter_by(token=token).first():
+            print("✗ An AuthToken row was written for a stateless token")
+            return False
+
+        print("✓ Access token resolves to its user and roles")
+        return True
+
+
+def test_revoke_after_refresh(app, test_data):
+    """Test 2: Logout writes a revocation that other workers pick up on refresh."""
+    with app.app_context():
+        print("\n=== Test 2: Revoke After Denylist Refresh ===")
+
+        token, _ = issue_access_token(test_data['target_id'], ['admin'])
+        other_token, _ = issue_access_token(test_data['target_id'], ['admin'])
+
+        if not revoke_access_token(token):
+            print("✗ revoke_access_token rejected a valid token")
+            return False
+
+        _simulate_other_worker()
+        if resolve_principal(token) is not None:
+            print("✗ Revoked token still resolves after the denylist refresh")
+            return False
+        if resolve_principal(other_token) is None:
+            print("✗ Revoking one token rejected another token of the same user")
+            return False
+
+        print("✓ Revoked token is rejected; other tokens keep working")
+        return True
+
+
+def test_expired_token(app, test_data):
+    """Test 3: A token past its exp claim is rejected."""
+    with app.app_context():
+        print("\n=== Test 3: Expired Token ===")
+
+        ttl = app.config.get('JWT_ACCESS_TOKEN_TTL_SECONDS')
+        app.config['JWT_ACCESS_TOKEN_TTL_SECONDS'] = -60
+        try:
+            token, expires_at = issue_access_token(test_data['target_id'], ['admin'])
+        finally:
+            app.config['JWT_ACCESS_TOKEN_TTL_SECONDS'] = ttl
+
+        print(f"Token expired at {expires_at}")
+        if resolve_principal(token) is not None:
+            print("✗ Expired token still resolves")
+            return False
+
+        print("✓ Expired token is rejected")
+        return True
+
+
+def test_role_change_revokes(app, test_data):
+    """Test 4: Removing a role cuts off tokens that embed it."""
+    with app.app_context():
+        print("\n=== Test 4: Role Change Revokes Tokens ===")
+
+        token, _ = issue_access_token(test_data['target_id'], ['admin'])
+        principal = resolve_principal(token)
+        if not principal or not principal.is_admin:
+            print("✗ Token with the admin role did not resolve")
+            return False
+
+        client = app.test_client()
+        response = client.delete(
+            f"/api/admin/users/{test_data['target_id']}/roles/admin",
+            headers={'Authorization': f'Bearer {test_data["admin_token"]}'}
+        )
+        print(f"DELETE role: {response.status_code}")
+        if response.status_code != 200:
+            print(f"✗ Role removal failed: {response.get_json()}")
+            return False
+
+        if resolve_principal(token) is not None:
+            print("✗ Token still resolves with the removed role on this worker")
+            return False
+        _simulate_other_worker()
+        if resolve_principal(token) is not None:
+            print("✗ Token still resolves with the removed role after the denylist refresh")
+            return False
+
+        print("✓ Tokens embedding a removed role are revoked")
+        return True
+
+
+def test_reissue_after_revoke(app, test_data):
+    """Test 5: A user-wide revocation rejects earlier tokens but not one issued right after it."""
+    with app.app_context():
+        print("\n=== Test 5: Re-issue After Revoke ===")
+
+        old_token, _ = issue_access_token(test_data['target_id'], ['user'])
+        revoke_user_tokens(test_data['target_id'])
+        # Usually within the same second as the revocation
+        new_token, _ = issue_access_token(test_data['target_id'], ['user'])
+
+        for label in ('this worker', 'after the denylist refresh'):
+            if label != 'this worker':
+                _simulate_other_worker()
+            if resolve_principal(old_token) is not None:
+                print(f"✗ Token issued before the revocation still resolves ({label})")
+                return False
+            if resolve_principal(new_token) is None:
+                print(f"✗ Token issued after the revocation was rejected ({label})")
+                return False
+
+        print("✓ Revocation cut-off separates tokens issued just before and just after it")
+        return True
+
+
+def main():
+    """Run all access token tests."""
+    app = create_app()
+
+    print("=" * 60)
+    print("Access Token Test Suite")
+    print("=" * 60)
+
+    if not JWT_AVAILABLE:
+        print("⚠ PyJWT is not installed, skipping")
+        return True
+
+    print("\nSetting up test data...")
+    test_data = setup_test_data(app)
+    print("Test data created successfully!")
+
+    results = {
+        'Issue and Resolve': test_issue_and_resolve(app, test_data),
+        'Revoke After Refresh': test_revoke_after_refresh(app, test_data),
+        'Expired Token': test_expired_token(app, test_data),
+        'Role Change Revokes': test_role_change_revokes(app, test_data),
+        'Re-issue After Revoke': test_reissue_after_revoke(app, test_data)
+    }
+
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    passed = sum(1 for result in results.values() if result)
+    total = len(results)
+
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name}: {status}")
+
+    print(f"\nTotal: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
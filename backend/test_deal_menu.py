@@ -0,0 +1,198 @@
+"""
+Test script for the group deal menu loader.
+
+This script tests:
+1. GET /api/group-deals issues the same number of queries for 1 and 3 deals
+2. Deal menus hide inactive products and move sold out products to the bottom
+3. Materialized menus pick up stock limit changes with a single query
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from models.product import Product
+from models.groupdeal import GroupDeal, GroupDealProduct
+from utils.deal_menu import load_deal_menus, get_deal_menus
+from utils.order_hydration import count_queries
+
+
+DEAL_COUNT = 3
+
+
+def setup_test_data(app):
+    """Create several deals sharing an active, an inactive and a sold out product."""
+    with app.app_context():
+        products = {}
+        for key, is_active in (('active', True), ('inactive', False), ('sold_out', True)):
+            name = f'Test Product - Deal Menu {key}'
+            product = Product.query.filter_by(name=name).first()
+            if not product:
+                product = Product(
+                    name=name,
+                    pricing_type='per_item',
+                    pricing_data={'price': 2.00},
+                    is_active=is_active
+                )
+                db.session.add(product)
+                db.session.flush()
+            products[key] = product
+
+        now = datetime.utcnow()
+        deal_ids = []
+        for i in range(DEAL_COUNT):
+            title = f'Test Deal - Deal Menu {i}'
+            deal = GroupDeal.query.filter_by(title=title).first()
+            if not deal:
+                deal = GroupDeal(
+                    title=title,
+                    description='Test deal for menu loader',
+                    order_start_date=now - timedelta(days=1),
+                    order_end_date=now + timedelta(days=7),
+                    pickup_date=now + timedelta(days=10),
+                    status='active'
+                )
+                db.session.add(deal)
+                db.session.flush()
+            deal_ids.append(deal.id)
+
+            for key, product in products.items():
+                if not GroupDealProduct.query.filter_by(group_deal_id=deal.id, product_id=product.id).first():
+                    db.session.add(GroupDealProduct(
+                        group_deal_id=deal.id,
+                        product_id=product.id,
+                        deal_stock_limit=0 if key == 'sold_out' else None
+                    ))
+
+        db.session.commit()
+
+        return {
+            'deal_ids': deal_ids,
+            'product_ids': {key: product.id for key, product in products.items()}
+        }
+
+
+def test_query_budget(app, test_data):
+    """Test 1: Query count does not grow with the number of deals."""
+    with app.app_context():
+        print("\n=== Test 1: Deal Menu Query Budget ===")
+
+        deals = GroupDeal.query.filter(GroupDeal.id.in_(test_data['deal_ids'])).all()
+
+        with count_queries() as single:
+            load_deal_menus(deals[:1], active_only=True)
+        with count_queries() as many:
+            load_deal_menus(deals, active_only=True)
+
+        print(f"Queries for 1 deal: {single['count']}")
+        print(f"Queries for {len(deals)} deals: {many['count']}")
+
+        if many['count'] == single['count']:
+            print("✓ Query count is independent of the number of deals")
+            return True
+        print("✗ Query count grows with the number of deals")
+        return False
+
+
+def test_menu_contents(app, test_data):
+    """Test 2: Inactive products are hidden and sold out products sort last."""
+    with app.app_context():
+        print("\n=== Test 2: Deal Menu Contents ===")
+
+        deal = GroupDeal.query.get(test_data['deal_ids'][0])
+        menu = load_deal_menus([deal], active_only=True)[deal.id]
+        product_ids = test_data['product_ids']
+
+        menu_ids = [p['id'] for p in menu]
+        if product_ids['inactive'] in menu_ids:
+            print("✗ Inactive product is listed")
+            return False
+        if menu_ids.index(product_ids['sold_out']) < menu_ids.index(product_ids['active']):
+            print("✗ Sold out product is listed before an available one")
+            return False
+
+        print("✓ Menu hides inactive products and lists sold out products last")
+        return True
+
+
+def test_materialized_stock_overlay(app, test_data):
+    """Test 3: A cached menu reflects a new stock limit with one query."""
+    with app.app_context():
+        print("\n=== Test 3: Materialized Menu Stock Overlay ===")
+
+        deal = GroupDeal.query.get(test_data['deal_ids'][0])
+        active_id = test_data['product_ids']['active']
+
+        # Build the document
+        get_deal_menus([deal], active_only=True)
+
+        deal_product = GroupDealProduct.query.filter_by(group_deal_id=deal.id, product_id=active_id).first()
+        deal_product.deal_stock_limit = 5
+        db.session.commit()
+        # Reload outside the measured block (commit expires the instance)
+        deal = GroupDeal.query.get(deal.id)
+
+        try:
+            with count_queries() as served:
+                deal_dict = get_deal_menus([deal], active_only=True)[0]
+        finally:
+            deal_product.deal_stock_limit = None
+            db.session.commit()
+
+        limits = {p['id']: p['deal_stock_limit'] for p in deal_dict['products']}
+        print(f"Queries for cached menu: {served['count']}")
+
+        if limits.get(active_id) != 5:
+            print(f"✗ Stale stock limit served: {limits.get(active_id)}")
+            return False
+        if served['count'] > 1:
+            print("✗ Cached menu issued more than the stock query")
+            return False
+
+        print("✓ Cached menu overlays live stock with one query")
+        return True
+
+
+def main():
+    """Run all deal menu tests."""
+    app = create_app()
+
+    print("=" * 60)
+    print("Deal Menu Test Suite")
+    print("=" * 60)
+
+    print("\nSetting up test data...")
+    test_data = setup_test_data(app)
+    print("Test data created successfully!")
+
+    results = {
+        'Query Budget': test_query_budget(app, test_data),
+        'Menu Contents': test_menu_contents(app, test_data),
+        'Materialized Stock Overlay': test_materialized_stock_overlay(app, test_data)
+    }
+
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    passed = sum(1 for result in results.values() if result)
+    total = len(results)
+
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name}: {status}")
+
+    print(f"\nTotal: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,277 @@
+"""
+Test script for order creation query budget.
+
+This script tests:
+1. POST /api/orders issues the same number of queries for 1-line and 5-line carts
+2. The created order response includes every item with its product
+3. PUT /api/orders/<id> edits a pickup order and switches it to delivery
+"""
+
+import sys
+import os
+import secrets
+from datetime import datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from models.product import Product
+from models.groupdeal import GroupDeal, GroupDealProduct
+from models.order import Order, OrderItem
+from models.user import User, AuthToken
+from models.address import Address
+from utils.order_hydration import count_queries
+
+
+PRODUCT_COUNT = 5
+
+
+def setup_test_data(app):
+    """Create a user with a bearer token and a deal with several unlimited products."""
+    with app.app_context():
+        test_user = User.query.filter_by(phone='7777777777').first()
+        if not test_user:
+            from constants.status_enums import UserStatus
+            test_user = User(
+                phone='7777777777',
+                nickname='Test User Order Creation',
+                status=UserStatus.ACTIVE.value
+            )
+            db.session.add(test_user)
+            db.session.flush()
+
+        # Clean up orders from previous runs
+        test_orders = Order.query.filter_by(user_id=test_user.id).all()
+        for order in test_orders:
+            OrderItem.query.filter_by(order_id=order.id).delete()
+        Order.query.filter_by(user_id=test_user.id).delete()
+
+        token = secrets.token_urlsafe(32)
+        db.session.add(AuthToken(
+            user_id=test_user.id,
+            token=token,
+            expires_at=datetime.utcnow() + timedelta(days=1)
+        ))
+
+        products = []
+        for i in range(PRODUCT_COUNT):
+            name = f'Test Product - Order Creation {i}'
+            product = Product.query.filter_by(name=name).first()
+            if not product:
+                product = Product(
+                    name=name,
+                    pricing_type='per_item',
+                    pricing_data={'price': 3.00},
+                    is_active=True
+                )
+                db.session.add(product)
+                db.session.flush()
+            products.append(product)
+
+        now = datetime.utcnow()
+        test_deal = GroupDeal.query.filter_by(title='Test Deal - Order Creation').first()
+        if not test_deal:
+            test_deal = GroupDeal(
+                title='Test Deal - Order Creation',
+                description='Test deal for order creation query budget',
+                order_start_date=now - timedelta(days=1),
+                order_end_date=now + timedelta(days=7),
+                pickup_date=now + timedelta(days=10),
+                status='active'
+            )
+            db.session.add(test_deal)
+            db.session.flush()
+        else:
+            test_deal.order_end_date = now + timedelta(days=7)
+
+        for product in products:
+            if not GroupDealProduct.query.filter_by(group_deal_id=test_deal.id, product_id=product.id).first():
+                db.session.add(GroupDealProduct(
+                    group_deal_id=test_deal.id,
+                    product_id=product.id,
+                    deal_stock_limit=None  # Unlimited
+                ))
+
+        address = Address.query.filter_by(user_id=test_user.id).first()
+        if not address:
+            address = Address(
+                user_id=test_user.id,
+                recipient_name='Test User Order Creation',
+                phone='7777777777',
+                address_line1='1 Test Street',
+                city='Toronto',
+                postal_code='M5V 1A1'
+            )
+            db.session.add(address)
+
+        db.session.commit()
+
+        return {
+            'token': token,
+            'deal_id': test_deal.id,
+            'product_ids': [product.id for product in products],
+            'address_id': address.id
+        }
+
+
+def _post_order(client, test_data, product_ids):
+    return client.post(
+        '/api/orders',
+        json={
+            'group_deal_id': test_data['deal_id'],
+            'items': [{'product_id': product_id, 'quantity': 1} for product_id in product_ids],
+            'delivery_method': 'pickup',
+            'payment_method': 'cash'
+        },
+        headers={'Authorization': f'Bearer {test_data["token"]}'}
+    )
+
+
+def test_query_budget(app, test_data):
+    """Test 1: Query count does not grow with the number of cart lines."""
+    with app.app_context():
+        print("\n=== Test 1: Order Creation Query Budget ===")
+
+        client = app.test_client()
+        product_ids = test_data['product_ids']
+
+        # Warm up: resolves the token and creates today's sales stats rows
+        response = _post_order(client, test_data, product_ids)
+        if response.status_code != 201:
+            print(f"✗ Warm-up order failed: {response.status_code} {response.get_json()}")
+            return False
+
+        with count_queries() as single:
+            response = _post_order(client, test_data, product_ids[:1])
+        if response.status_code != 201:
+            print(f"✗ Single-line order failed: {response.get_json()}")
+            return False
+
+        with count_queries() as many:
+            response = _post_order(client, test_data, product_ids)
+        if response.status_code != 201:
+            print(f"✗ Multi-line order failed: {response.get_json()}")
+            return False
+
+        print(f"Queries for 1 line: {single['count']}")
+        print(f"Queries for {len(product_ids)} lines: {many['count']}")
+
+        if many['count'] == single['count']:
+            print("✓ Query count is independent of cart size")
+            return True
+        print("✗ Query count grows with cart size")
+        return False
+
+
+def test_response_shape(app, test_data):
+    """Test 2: Created order response includes every item and product."""
+    with app.app_context():
+        print("\n=== Test 2: Created Order Response ===")
+
+        client = app.test_client()
+        product_ids = test_data['product_ids']
+        response = _post_order(client, test_data, product_ids)
+        order_dict = (response.get_json() or {}).get('order', {})
+
+        item_products = {item.get('product', {}).get('id') for item in order_dict.get('items', [])}
+        if response.status_code == 201 and item_products == set(product_ids) and order_dict.get('group_deal'):
+            print("✓ Response includes items, products and group deal")
+            return True
+        print(f"✗ Unexpected order payload: {order_dict}")
+        return False
+
+
+def _put_order(client, test_data, order_id, product_ids, quantity, **fields):
+    return client.put(
+        f'/api/orders/{order_id}',
+        json={
+            'items': [{'product_id': product_id, 'quantity': quantity} for product_id in product_ids],
+            **fields
+        },
+        headers={'Authorization': f'Bearer {test_data["token"]}'}
+    )
+
+
+def test_update_order(app, test_data):
+    """Test 3: Editing a pickup order and a delivery order reprices the cart."""
+    with app.app_context():
+        print("\n=== Test 3: Order Edits ===")
+
+        client = app.test_client()
+        product_ids = test_data['product_ids']
+        response = _post_order(client, test_data, product_ids[:1])
+        if response.status_code != 201:
+            print(f"✗ Order creation failed: {response.get_json()}")
+            return False
+        order_id = response.get_json()['order']['id']
+
+        # Pickup edit: more lines and a higher quantity
+        response = _put_order(client, test_data, order_id, product_ids[:2], 2,
+                              delivery_method='pickup', payment_method='cash')
+        order_dict = (response.get_json() or {}).get('order', {})
+        if response.status_code != 200 or len(order_dict.get('items', [])) != 2 or order_dict.get('subtotal') != 12.0:
+            print(f"✗ Pickup edit failed: {response.status_code} {response.get_json()}")
+            return False
+        print(f"✓ Pickup edit: subtotal {order_dict['subtotal']}")
+
+        # Delivery edit: same cart, delivered to the user's address
+        response = _put_order(client, test_data, order_id, product_ids[:2], 2, delivery_method='delivery',
+                              address_id=test_data['address_id'], payment_method='etransfer')
+        order_dict = (response.get_json() or {}).get('order', {})
+        if (response.status_code != 200 or order_dict.get('delivery_method') != 'delivery'
+                or order_dict.get('address_id') != test_data['address_id']):
+            print(f"✗ Delivery edit failed: {response.status_code} {response.get_json()}")
+            return False
+        print(f"✓ Delivery edit: shipping fee {order_dict.get('shipping_fee')}, total {order_dict.get('total')}")
+
+        # Unknown products are rejected instead of failing the request
+        response = _put_order(client, test_data, order_id, [max(product_ids) + 100000], 1,
+                              delivery_method='pickup', payment_method='cash')
+        if response.status_code != 404:
+            print(f"✗ Unknown product returned {response.status_code}")
+            return False
+
+        print("✓ Order edits reprice pickup and delivery carts")
+        return True
+
+
+def main():
+    """Run all order creation tests."""
+    app = create_app()
+
+    print("=" * 60)
+    print("Order Creation Test Suite")
+    print("=" * 60)
+
+    print("\nSetting up test data...")
+    test_data = setup_test_data(app)
+    print("Test data created successfully!")
+
+    results = {
+        'Query Budget': test_query_budget(app, test_data),
+        'Response Shape': test_response_shape(app, test_data),
+        'Order Edits': test_update_order(app, test_data)
+    }
+
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    passed = sum(1 for result in results.values() if result)
+    total = len(results)
+
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name}: {status}")
+
+    print(f"\nTotal: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
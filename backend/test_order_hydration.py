@@ -0,0 +1,218 @@
+"""
+Test script for batched order hydration.
+
+This script tests:
+1. OrderHydrator issues a constant number of queries regardless of order count
+2. Serialized orders include group deal, item products and address
+3. The duplicate order report uses a fixed number of queries and batches without splitting sets
+"""
+
+import sys
+import os
+from decimal import Decimal
+from datetime import datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from models.product import Product
+from models.groupdeal import GroupDeal
+from models.order import Order, OrderItem
+from models.user import User
+from utils.order_hydration import OrderHydrator, count_queries
+from utils.duplicate_orders import find_duplicate_sets, batch_duplicate_sets, hydrate_duplicate_sets
+
+
+def setup_test_data(app, order_count=20):
+    """Create a user with many small orders across two products."""
+    with app.app_context():
+        # Clean up existing test data
+        test_orders = Order.query.filter(Order.order_number.like('TEST-HYD-%')).all()
+        for order in test_orders:
+            OrderItem.query.filter_by(order_id=order.id).delete()
+        Order.query.filter(Order.order_number.like('TEST-HYD-%')).delete()
+
+        test_user = User.query.filter_by(phone='8888888888').first()
+        if not test_user:
+            from constants.status_enums import UserStatus
+            test_user = User(
+                phone='8888888888',
+                nickname='Test User Hydration',
+                status=UserStatus.ACTIVE.value
+            )
+            db.session.add(test_user)
+            db.session.flush()
+
+        products = []
+        for name in ('Test Product - Hydration A', 'Test Product - Hydration B'):
+            product = Product.query.filter_by(name=name).first()
+            if not product:
+                product = Product(
+                    name=name,
+                    pricing_type='per_item',
+                    pricing_data={'price': 5.00},
+                    is_active=True
+                )
+                db.session.add(product)
+                db.session.flush()
+            products.append(product)
+
+        now = datetime.utcnow()
+        test_deal = GroupDeal.query.filter_by(title='Test Deal - Hydration').first()
+        if not test_deal:
+            test_deal = GroupDeal(
+                title='Test Deal - Hydration',
+                description='Test deal for order hydration',
+                order_start_date=now - timedelta(days=1),
+                order_end_date=now + timedelta(days=7),
+                pickup_date=now + timedelta(days=10),
+                status='active'
+            )
+            db.session.add(test_deal)
+            db.session.flush()
+
+        for i in range(order_count):
+            order = Order(
+                user_id=test_user.id,
+                group_deal_id=test_deal.id,
+                order_number=f'TEST-HYD-{i:04d}',
+                subtotal=Decimal('10.00'),
+                tax=Decimal('0'),
+                shipping_fee=Decimal('0'),
+                total=Decimal('10.00'),
+                status='submitted'
+            )
+            db.session.add(order)
+            db.session.flush()
+            for product in products:
+                db.session.add(OrderItem(
+                    order_id=order.id,
+                    product_id=product.id,
+                    quantity=1,
+                    unit_price=Decimal('5.00'),
+                    total_price=Decimal('5.00')
+                ))
+
+        db.session.commit()
+
+        return {
+            'user_id': test_user.id,
+            'deal_id': test_deal.id
+        }
+
+
+def test_constant_query_count(app, test_data):
+    """Test 1: Query count does not grow with the number of orders."""
+    with app.app_context():
+        print("\n=== Test 1: Constant Query Count ===")
+
+        orders = Order.query.filter(Order.order_number.like('TEST-HYD-%')).order_by(Order.id).all()
+
+        single = OrderHydrator(orders[:1], count_queries=True).load()
+        [single.serialize(order) for order in orders[:1]]
+        db.session.expire_all()
+
+        orders = Order.query.filter(Order.order_number.like('TEST-HYD-%')).order_by(Order.id).all()
+        many = OrderHydrator(orders, count_queries=True).load()
+        [many.serialize(order) for order in orders]
+
+        print(f"Queries for 1 order: {single.query_count}")
+        print(f"Queries for {len(orders)} orders: {many.query_count}")
+
+        if many.query_count == single.query_count and many.query_count <= 4:
+            print("✓ Query count is constant")
+            return True
+        print("✗ Query count grows with order count")
+        return False
+
+
+def test_serialized_shape(app, test_data):
+    """Test 2: Serialized orders include group deal and item products."""
+    with app.app_context():
+        print("\n=== Test 2: Serialized Shape ===")
+
+        orders = Order.query.filter(Order.order_number.like('TEST-HYD-%')).order_by(Order.id).all()
+        hydrator = OrderHydrator(orders, include_product_description=True)
+        order_dict = hydrator.serialize(orders[0])
+
+        has_deal = order_dict.get('group_deal', {}).get('id') == test_data['deal_id']
+        has_products = len(order_dict['items']) == 2 and all(
+            'product' in item and 'description' in item['product'] for item in order_dict['items']
+        )
+
+        if has_deal and has_products:
+            print("✓ Group deal and products included")
+            return True
+        print(f"✗ Unexpected order payload: {order_dict}")
+        return False
+
+
+def test_duplicate_report(app, test_data):
+    """Test 3: Duplicate report finds the set with constant queries; batches keep sets whole."""
+    with app.app_context():
+        print("\n=== Test 3: Duplicate Order Report ===")
+
+        with count_queries() as counter:
+            sets = find_duplicate_sets(test_data['deal_id'])
+            report = hydrate_duplicate_sets(sets)
+        print(f"{len(report)} set(s), {counter['count']} queries")
+
+        test_set = next((dup for dup in report if dup['user'] and dup['user']['id'] == test_data['user_id']), None)
+        if test_set is None or test_set['order_count'] < 20 or counter['count'] > 8:
+            print("✗ Duplicate set missing or query count too high")
+            return False
+
+        created = [order['created_at'] for order in test_set['orders']]
+        if created != sorted(created) or not all(len(order['items']) == 2 for order in test_set['orders']):
+            print("✗ Orders not oldest first or items missing")
+            return False
+
+        batches = list(batch_duplicate_sets(sets, 5))
+        if [dup for batch in batches for dup in batch] != sets:
+            print("✗ Batching changed the sets")
+            return False
+
+        print("✓ Duplicate report is batched and constant-query")
+        return True
+
+
+def main():
+    """Run all order hydration tests."""
+    app = create_app()
+
+    print("=" * 60)
+    print("Order Hydration Test Suite")
+    print("=" * 60)
+
+    print("\nSetting up test data...")
+    test_data = setup_test_data(app)
+    print("Test data created successfully!")
+
+    results = {
+        'Constant Query Count': test_constant_query_count(app, test_data),
+        'Serialized Shape': test_serialized_shape(app, test_data),
+        'Duplicate Report': test_duplicate_report(app, test_data)
+    }
+
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    passed = sum(1 for result in results.values() if result)
+    total = len(results)
+
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name}: {status}")
+
+    print(f"\nTotal: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
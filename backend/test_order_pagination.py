@@ -0,0 +1,327 @@
+"""
+Test script for keyset pagination and incremental sync of order lists.
+
+This script tests:
+1. GET /api/orders cursor pages cover every order once, created_at ties broken by id
+2. GET /api/admin/orders cursor pages round-trip, ties broken by id, with cached totals
+3. GET /api/orders?updated_since pages through changes, re-sends late commits
+   within the overlap window and reports soft-deleted orders as tombstones
+"""
+
+import sys
+import os
+import secrets
+from datetime import datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from models.base import utc_now
+from models.order import Order, OrderItem
+from models.groupdeal import GroupDeal
+from models.user import User, AuthToken, UserRole
+from constants.status_enums import UserStatus
+
+
+TEST_PHONE = '5555555501'
+ORDER_COUNT = 6
+
+
+def setup_test_data(app):
+    """Create a user with ORDER_COUNT orders, two of them sharing a created_at."""
+    with app.app_context():
+        test_user = User.query.filter_by(phone=TEST_PHONE).first()
+        if not test_user:
+            test_user = User(
+                phone=TEST_PHONE,
+                nickname='Test User Order Pagination',
+                status=UserStatus.ACTIVE.value
+            )
+            db.session.add(test_user)
+            db.session.flush()
+
+        # Clean up orders from previous runs
+        old_ids = [order.id for order in Order.query.filter_by(user_id=test_user.id).all()]
+        if old_ids:
+            OrderItem.query.filter(OrderItem.order_id.in_(old_ids)).delete(synchronize_session=False)
+            Order.query.filter(Order.id.in_(old_ids)).delete(synchronize_session=False)
+
+        now = datetime.utcnow()
+        test_deal = GroupDeal.query.filter_by(title='Test Deal - Order Pagination').first()
+        if not test_deal:
+            test_deal = GroupDeal(
+                title='Test Deal - Order Pagination',
+                description='Test deal for order list pagination',
+                order_start_date=now - timedelta(days=1),
+                order_end_date=now + timedelta(days=7),
+                pickup_date=now + timedelta(days=10),
+                status='active'
+            )
+            db.session.add(test_deal)
+            db.session.flush()
+
+        base = utc_now().replace(microsecond=0) - timedelta(hours=1)
+        # The last two orders share created_at, so only the id orders them
+        created = [base - timedelta(minutes=i) for i in range(ORDER_COUNT - 1)] + [base - timedelta(minutes=ORDER_COUNT - 2)]
+        order_ids = []
+        for i, created_at in enumerate(created):
+            order = Order(
+                user_id=test_user.id,
+                group_deal_id=test_deal.id,
+                order_number=f'GSF-20260101120000-P{secrets.token_hex(2).upper()}{i}',
+                subtotal=10,
+                total=10,
+                created_at=created_at,
+                updated_at=created_at
+            )
+            db.session.add(order)
+            db.session.flush()
+            order_ids.append(order.id)
+
+        # Admin role for the admin order list test
+        if not UserRole.query.filter_by(user_id=test_user.id, role='admin').first():
+            db.session.add(UserRole(user_id=test_user.id, role='admin'))
+
+        token = secrets.token_urlsafe(32)
+        db.session.add(AuthToken(
+            user_id=test_user.id,
+            token=token,
+            expires_at=now + timedelta(days=1)
+        ))
+        db.session.commit()
+
+        return {'user_id': test_user.id, 'token': token, 'deal_id': test_deal.id, 'order_ids': order_ids}
+
+
+def _get(client, test_data, path, **params):
+    response = client.get(path, query_string=params, headers={'Authorization': f'Bearer {test_data["token"]}'})
+    return response.status_code, response.get_json()
+
+
+def _set_updated_at(order_ids, updated_at, **values):
+    Order.query.filter(Order.id.in_(order_ids)).update(
+        {Order.updated_at: updated_at, **{getattr(Order, name): value for name, value in values.items()}},
+        synchronize_session=False
+    )
+    db.session.commit()
+
+
+def test_user_order_pages(app, test_data):
+    """Test 1: Cursor pages return every order once, newest first, ties broken by id."""
+    with app.app_context():
+        print("\n=== Test 1: User Order Pages ===")
+        client = app.test_client()
+
+        expected = [order.id for order in Order.query.filter(
+            Order.id.in_(test_data['order_ids'])
+        ).order_by(Order.created_at.desc(), Order.id.desc()).all()]
+
+        seen = []
+        cursor = None
+        for _ in range(ORDER_COUNT):
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            status, data = _get(client, test_data, '/api/orders', **params)
+            if status != 200:
+                print(f"✗ Page request returned {status}: {data}")
+                return False
+            seen.extend(order['id'] for order in data['orders'])
+            cursor = data['next_cursor']
+            if not data['has_more']:
+                break
+        print(f"Paged ids: {seen}")
+
+        if seen != expected:
+            print(f"✗ Expected {expected}")
+            return False
+        if cursor is not None:
+            print("✗ Last page still returned a next_cursor")
+            return False
+
+        status, data = _get(client, test_data, '/api/orders')
+        if status != 200 or [order['id'] for order in data['orders']] != expected or 'next_cursor' in data:
+            print("✗ Unpaged request no longer returns the full history")
+            return False
+
+        status, _ = _get(client, test_data, '/api/orders', cursor='not-a-cursor')
+        if status != 400:
+            print(f"✗ Invalid cursor returned {status}, expected 400")
+            return False
+
+        print("✓ Cursor pages cover every order once")
+        return True
+
+
+def test_admin_order_pages(app, test_data):
+    """Test 2: Admin cursor pages round-trip with ties broken by id; totals are cached across pages."""
+    with app.app_context():
+        print("\n=== Test 2: Admin Order Pages ===")
+        client = app.test_client()
+
+        expected = [order.id for order in Order.query.filter(
+            Order.id.in_(test_data['order_ids'])
+        ).order_by(Order.created_at.desc(), Order.id.desc()).all()]
+
+        seen = []
+        cursor = ''
+        pages = []
+        while cursor is not None and len(pages) < ORDER_COUNT:
+            status, data = _get(client, test_data, '/api/admin/orders',
+                                cursor=cursor, per_page=2, group_deal_id=test_data['deal_id'])
+            if status != 200:
+                print(f"✗ Page request returned {status}: {data}")
+                return False
+            pages.append(data['pagination'])
+            seen.extend(order['id'] for order in data['orders'])
+            cursor = data['pagination']['next_cursor']
+        print(f"Paged ids: {seen}")
+
+        if seen != expected:
+            print(f"✗ Expected {expected}")
+            return False
+
+        # The first cursor page counts; later pages reuse the count
+        totals = [(page['total'], page['total_is_estimate']) for page in pages]
+        print(f"Totals: {totals}")
+        if totals[0] != (len(expected), False) or any(total != (len(expected), True) for total in totals[1:]):
+            print("✗ Cursor pages did not reuse the cached total")
+            return False
+
+        # A new order is not reflected in the cached total until it expires, but is in an exact one
+        extra = Order(
+            user_id=test_data['user_id'],
+            group_deal_id=test_data['deal_id'],
+            order_number=f'GSF-20260101120000-P{secrets.token_hex(3).upper()}',
+            subtotal=10,
+            total=10
+        )
+        db.session.add(extra)
+        db.session.commit()
+        try:
+            _, cached = _get(client, test_data, '/api/admin/orders',
+                             cursor='', per_page=2, group_deal_id=test_data['deal_id'])
+            _, exact = _get(client, test_data, '/api/admin/orders',
+                            cursor='', per_page=2, group_deal_id=test_data['deal_id'], total='exact')
+        finally:
+            db.session.delete(extra)
+            db.session.commit()
+        if cached['pagination']['total'] != len(expected) or exact['pagination']['total'] != len(expected) + 1:
+            print(f"✗ cached total {cached['pagination']['total']}, exact total {exact['pagination']['total']}")
+            return False
+
+        status, _ = _get(client, test_data, '/api/admin/orders', cursor='not-a-cursor')
+        if status != 400:
+            print(f"✗ Invalid cursor returned {status}, expected 400")
+            return False
+
+        print("✓ Admin cursor pages cover every order once with a cached total")
+        return True
+
+
+def test_user_order_sync(app, test_data):
+    """Test 3: updated_since pages through changes, overlaps the recent window and sends tombstones."""
+    with app.app_context():
+        print("\n=== Test 3: User Order Sync ===")
+        client = app.test_client()
+        order_ids = test_data['order_ids']
+
+        old = utc_now().replace(microsecond=0) - timedelta(hours=1)
+        _set_updated_at(order_ids, old)
+
+        # Initial sync from a plain datetime, two pages
+        synced = []
+        token = (old - timedelta(minutes=1)).isoformat()
+        for _ in range(ORDER_COUNT):
+            status, data = _get(client, test_data, '/api/orders', updated_since=token, limit=4)
+            if status != 200:
+                print(f"✗ Sync returned {status}: {data}")
+                return False
+            synced.extend(order['id'] for order in data['orders'])
+            token = data['sync_token']
+            if not data['has_more']:
+                break
+        print(f"Initial sync: {synced}")
+        if sorted(synced) != sorted(order_ids) or len(synced) != len(set(synced)):
+            print("✗ Initial sync did not return every order exactly once")
+            return False
+
+        status, data = _get(client, test_data, '/api/orders', updated_since=token)
+        if data['orders'] or data['deleted']:
+            print("✗ Caught-up sync returned old orders again")
+            return False
+
+        # A change now, then a transaction that commits later with an earlier updated_at
+        now = utc_now()
+        _set_updated_at([order_ids[0]], now)
+        status, data = _get(client, test_data, '/api/orders', updated_since=token)
+        token = data['sync_token']
+        if [order['id'] for order in data['orders']] != [order_ids[0]]:
+            print(f"✗ Changed order not synced: {data['orders']}")
+            return False
+
+        _set_updated_at([order_ids[1]], now - timedelta(seconds=2))
+        status, data = _get(client, test_data, '/api/orders', updated_since=token)
+        late_ids = [order['id'] for order in data['orders']]
+        print(f"After late commit: {late_ids}")
+        if order_ids[1] not in late_ids:
+            print("✗ Order committed late inside the overlap window was missed")
+            return False
+
+        # Soft delete shows up as a tombstone only
+        _set_updated_at([order_ids[2]], utc_now(), deleted_at=utc_now())
+        status, data = _get(client, test_data, '/api/orders', updated_since=data['sync_token'])
+        deleted_ids = [order['id'] for order in data['deleted']]
+        if order_ids[2] not in deleted_ids or order_ids[2] in [order['id'] for order in data['orders']]:
+            print(f"✗ Deleted order not reported as a tombstone: {data}")
+            return False
+
+        status, _ = _get(client, test_data, '/api/orders', updated_since='not-a-date')
+        if status != 400:
+            print(f"✗ Invalid updated_since returned {status}, expected 400")
+            return False
+
+        print("✓ Incremental sync is complete and at-least-once")
+        return True
+
+
+def main():
+    """Run all order pagination tests."""
+    app = create_app()
+
+    print("=" * 60)
+    print("Order Pagination Test Suite")
+    print("=" * 60)
+
+    print("\nSetting up test data...")
+    test_data = setup_test_data(app)
+    print("Test data created successfully!")
+
+    results = {
+        'User Order Pages': test_user_order_pages(app, test_data),
+        'Admin Order Pages': test_admin_order_pages(app, test_data),
+        'User Order Sync': test_user_order_sync(app, test_data)
+    }
+
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    passed = sum(1 for result in results.values() if result)
+    total = len(results)
+
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name}: {status}")
+
+    print(f"\nTotal: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
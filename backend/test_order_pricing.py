@@ -13,10 +13,14 @@ Tests cover:
 - Deal price vs product price
 - Unit price vs total price consistency
 - Order creation and update scenarios
+- The shared pricing engine (utils/pricing.py) used by every order route
+- Order edits (PUT /api/orders/<id>) pricing a cart exactly like create_order
+- Quotes (POST /api/orders/quote) priced from the cached deal menu, matching create_order
 """
 
 import sys
 import os
+import secrets
 from decimal import Decimal
 from datetime import datetime, timedelta
 
@@ -30,6 +34,10 @@ from models.groupdeal import GroupDeal, GroupDealProduct
 from models.order import Order, OrderItem
 from models.user import User, AuthToken
 from constants.status_enums import DeliveryMethod, PaymentMethod, OrderStatus
+from utils.pricing import price_cart, price_line, get_compiled_pricing, total_from_rate
+from utils.deal_menu import PricingProduct, get_deal_pricing
+from utils.catalog import bump_catalog_version
+from utils.order_hydration import count_queries
 
 
 def setup_test_data(app):
@@ -151,13 +159,22 @@ def setup_test_data(app):
                 db.session.add(deal_product)
             deal_products[pricing_type] = deal_product
         
+        # Bearer token for the order endpoint tests
+        token = secrets.token_urlsafe(32)
+        db.session.add(AuthToken(
+            user_id=test_user.id,
+            token=token,
+            expires_at=now + timedelta(days=1)
+        ))
+        
         db.session.commit()
         
         return {
             'user_id': test_user.id,
             'products': products,
             'deal_id': test_deal.id,
-            'deal_products': deal_products
+            'deal_products': deal_products,
+            'token': token
         }
 
 
@@ -567,6 +584,223 @@ def test_edge_cases(app, test_data):
         return True
 
 
+def test_pricing_engine(app, test_data):
+    """Test the shared pricing engine against the documented rules."""
+    print("\n=== Test: Pricing Engine ===")
+    
+    with app.app_context():
+        per_item = Product(name='Engine per_item', pricing_type='per_item', pricing_data={'price': 10.00})
+        weight_range = Product(name='Engine weight_range', pricing_type='weight_range', pricing_data={
+            'ranges': [
+                {'min': 0, 'max': 2, 'price': 10.00},
+                {'min': 2, 'max': 5, 'price': 8.00},
+                {'min': 5, 'max': None, 'price': 6.00}
+            ]
+        })
+        unit_weight = Product(name='Engine unit_weight', pricing_type='unit_weight', pricing_data={'price_per_unit': 5.00})
+        bundled = Product(name='Engine bundled_weight', pricing_type='bundled_weight', pricing_data={
+            'price_per_unit': 6.99, 'min_weight': 7, 'max_weight': 15
+        })
+        
+        cases = [
+            ('per_item x3', price_line(per_item, 3), (Decimal('10.00'), Decimal('30.00'))),
+            ('weight_range estimate', price_line(weight_range, 2), (Decimal('10.00'), Decimal('20.00'))),
+            ('weight_range 3 lb', price_line(weight_range, 1, 3), (Decimal('8.00'), Decimal('8.00'))),
+            ('weight_range 5 lb boundary', price_line(weight_range, 1, 5), (Decimal('6.00'), Decimal('6.00'))),
+            ('unit_weight 2.5 lb', price_line(unit_weight, 1, 2.5), (Decimal('5.00'), Decimal('12.50'))),
+            ('unit_weight invalid weight', price_line(unit_weight, 1, -1), (Decimal('5.00'), Decimal('5.00'))),
+            ('bundled 3.77 lb', price_line(bundled, 1, 3.77), (Decimal('6.99'), Decimal('26.35'))),
+            ('bundled estimate', price_line(bundled, 1), (Decimal('6.99'), Decimal('48.93'))),
+        ]
+        for name, actual, expected in cases:
+            assert actual == expected, f"{name}: {actual} != {expected}"
+            print(f"    ✓ PASSED: {name} -> unit={actual[0]}, total={actual[1]}")
+        
+        # Weighing only re-prices weight-based lines with a usable weight
+        assert get_compiled_pricing(per_item).price_weighed(1, 2) is None, "per_item must not be re-priced by weight"
+        assert get_compiled_pricing(bundled).price_weighed(1, 3.77) == (Decimal('6.99'), Decimal('26.35'))
+        print("    ✓ PASSED: Weighing re-prices weight-based lines only")
+        
+        # Subtotal is the sum of the rounded line totals
+        lines = [
+            {'product_id': 1, 'quantity': 2},
+            {'product_id': 2, 'quantity': 1, 'final_weight': 3},
+            {'product_id': 3, 'quantity': 1, 'final_weight': 2.5},
+            {'product_id': 4, 'quantity': 1, 'final_weight': 3.77}
+        ]
+        products = {1: per_item, 2: weight_range, 3: unit_weight, 4: bundled}
+        priced_lines, subtotal = price_cart(lines, products)
+        assert subtotal == sum(line.total_price for line in priced_lines), "Subtotal must equal sum of line totals"
+        assert subtotal == Decimal('66.85'), f"Cart subtotal mismatch: {subtotal}"
+        print(f"    ✓ PASSED: Cart subtotal={subtotal}")
+        
+        # Merging keeps the agreed rate and re-applies it to the merged weight
+        assert total_from_rate('bundled_weight', Decimal('6.99'), 2, 7.54) == Decimal('52.70')
+        assert total_from_rate('per_item', Decimal('10.00'), 3) == Decimal('30.00')
+        print("    ✓ PASSED: Merged line totals follow the agreed rate")
+        
+        return True
+
+
+def _endpoint_cart(test_data):
+    """A mixed cart for the order endpoint tests"""
+    products = test_data['products']
+    return [
+        {'product_id': products['per_item'].id, 'quantity': 2},
+        {'product_id': products['weight_range'].id, 'quantity': 1, 'pricing_type': 'weight_range', 'final_weight': 3},
+        {'product_id': products['bundled_weight'].id, 'quantity': 1, 'pricing_type': 'bundled_weight'}
+    ]
+
+
+def _auth_headers(test_data):
+    return {'Authorization': f'Bearer {test_data["token"]}'}
+
+
+def _delete_orders(order_ids):
+    """Remove orders created by the endpoint tests"""
+    OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _line_prices(order_dict):
+    return sorted(
+        (item['product_id'], item['quantity'], item['unit_price'], item['total_price'])
+        for item in order_dict['items']
+    )
+
+
+def test_order_edit_pricing(app, test_data):
+    """Editing an order to a cart prices it exactly like creating an order with that cart."""
+    print("\n=== Test: Order Edit Pricing ===")
+    
+    with app.app_context():
+        client = app.test_client()
+        cart = _endpoint_cart(test_data)
+        created_ids = []
+        try:
+            response = client.post('/api/orders', json={
+                'group_deal_id': test_data['deal_id'], 'items': cart,
+                'delivery_method': 'pickup', 'payment_method': 'cash'
+            }, headers=_auth_headers(test_data))
+            if response.status_code != 201:
+                print(f"    ✗ FAILED: create_order returned {response.status_code} {response.get_json()}")
+                return False
+            created = response.get_json()['order']
+            created_ids.append(created['id'])
+            
+            # A different cart, then edited to the same cart as above
+            response = client.post('/api/orders', json={
+                'group_deal_id': test_data['deal_id'], 'items': cart[:1],
+                'delivery_method': 'pickup', 'payment_method': 'cash'
+            }, headers=_auth_headers(test_data))
+            if response.status_code != 201:
+                print(f"    ✗ FAILED: create_order returned {response.status_code} {response.get_json()}")
+                return False
+            created_ids.append(response.get_json()['order']['id'])
+            
+            response = client.put(f'/api/orders/{created_ids[-1]}', json={
+                'items': cart, 'delivery_method': 'pickup', 'payment_method': 'cash'
+            }, headers=_auth_headers(test_data))
+            if response.status_code != 200:
+                print(f"    ✗ FAILED: update_order returned {response.status_code} {response.get_json()}")
+                return False
+            edited = response.get_json()['order']
+            
+            for field in ('subtotal', 'shipping_fee', 'total', 'points_earned'):
+                if edited[field] != created[field]:
+                    print(f"    ✗ FAILED: {field} edited={edited[field]} created={created[field]}")
+                    return False
+            if _line_prices(edited) != _line_prices(created):
+                print(f"    ✗ FAILED: line prices differ: {_line_prices(edited)} vs {_line_prices(created)}")
+                return False
+            
+            print(f"    ✓ PASSED: Edited order total {edited['total']} matches create_order")
+            return True
+        finally:
+            _delete_orders(created_ids)
+
+
+def test_quote_pricing(app, test_data):
+    """A quote is served from the deal menu cache and its hash is honoured (or rejected) by create_order."""
+    print("\n=== Test: Quote Pricing ===")
+    
+    with app.app_context():
+        client = app.test_client()
+        cart = _endpoint_cart(test_data)
+        per_item = test_data['products']['per_item']
+        created_ids = []
+        original_pricing = dict(per_item.pricing_data)
+        
+        def quote():
+            response = client.post('/api/orders/quote', json={
+                'group_deal_id': test_data['deal_id'], 'items': cart, 'delivery_method': 'pickup'
+            }, headers=_auth_headers(test_data))
+            return response.status_code, response.get_json()
+        
+        try:
+            # Warm the document, then price from memory
+            get_deal_pricing(test_data['deal_id'])
+            with count_queries() as counter:
+                pricing = get_deal_pricing(test_data['deal_id'])
+            if not isinstance(pricing.get(per_item.id), PricingProduct) or counter['count']:
+                print(f"    ✗ FAILED: deal pricing not served from cache ({counter['count']} queries)")
+                return False
+            
+            status, data = quote()
+            if status != 200:
+                print(f"    ✗ FAILED: quote returned {status} {data}")
+                return False
+            quoted = data['quote']
+            
+            # Same cart and hash: the order is charged exactly the quoted amounts
+            response = client.post('/api/orders', json={
+                'group_deal_id': test_data['deal_id'], 'items': cart,
+                'delivery_method': 'pickup', 'payment_method': 'cash', 'quote_hash': quoted['quote_hash']
+            }, headers=_auth_headers(test_data))
+            if response.status_code != 201:
+                print(f"    ✗ FAILED: create_order with quote_hash returned {response.status_code} {response.get_json()}")
+                return False
+            created = response.get_json()['order']
+            created_ids.append(created['id'])
+            for field in ('subtotal', 'shipping_fee', 'total', 'points_earned'):
+                if created[field] != quoted[field]:
+                    print(f"    ✗ FAILED: {field} created={created[field]} quoted={quoted[field]}")
+                    return False
+            print(f"    ✓ Quote total {quoted['total']} matches create_order")
+            
+            # A price change after quoting makes the hash stale
+            status, data = quote()
+            stale_hash = data['quote']['quote_hash']
+            per_item.pricing_data = {**original_pricing, 'price': float(original_pricing['price']) + 1}
+            db.session.commit()
+            bump_catalog_version()
+            
+            response = client.post('/api/orders', json={
+                'group_deal_id': test_data['deal_id'], 'items': cart,
+                'delivery_method': 'pickup', 'payment_method': 'cash', 'quote_hash': stale_hash
+            }, headers=_auth_headers(test_data))
+            if response.status_code != 409:
+                if response.status_code == 201:
+                    created_ids.append(response.get_json()['order']['id'])
+                print(f"    ✗ FAILED: stale quote_hash returned {response.status_code}, expected 409")
+                return False
+            fresh = response.get_json()['quote']
+            
+            status, data = quote()
+            if status != 200 or data['quote']['total'] != fresh['total'] or fresh['total'] == quoted['total']:
+                print(f"    ✗ FAILED: re-quote {data} does not reflect the new price {fresh['total']}")
+                return False
+            
+            print(f"    ✓ PASSED: Stale hash rejected; re-quote reflects the new total {fresh['total']}")
+            return True
+        finally:
+            per_item.pricing_data = original_pricing
+            db.session.commit()
+            bump_catalog_version()
+            _delete_orders(created_ids)
+
+
 def main():
     """Run all pricing tests."""
     app = create_app()
@@ -587,7 +821,10 @@ def main():
         'unit_weight Pricing': test_unit_weight_pricing(app, test_data),
         'bundled_weight Pricing': test_bundled_weight_pricing(app, test_data),
         'Mixed Pricing Types': test_mixed_pricing_types(app, test_data),
-        'Edge Cases': test_edge_cases(app, test_data)
+        'Edge Cases': test_edge_cases(app, test_data),
+        'Pricing Engine': test_pricing_engine(app, test_data),
+        'Order Edit Pricing': test_order_edit_pricing(app, test_data),
+        'Quote Pricing': test_quote_pricing(app, test_data)
     }
     
     # Print summary
@@ -0,0 +1,273 @@
+"""
+Test script for running-total sales statistics.
+
+This script tests:
+1. Range totals from running totals match summing the daily rows, including back-dated orders
+2. Weekly and monthly series buckets add up to the range total
+3. Queued changes are coalesced, applied on flush (including cancels) and dropped on rollback
+4. A past-day change committed by one worker while another inserts today's first row is not lost
+"""
+
+import sys
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from models.product import Product
+from models.product_sales_stats import ProductSalesStats
+from utils.sales_stats import (
+    update_product_sales_stats,
+    get_range_totals,
+    get_product_sales_by_date_range,
+    get_sales_time_series,
+    record_order_sales,
+    flush_sales_stats,
+    sales_stats_lock,
+    _apply_sales_deltas
+)
+
+
+# (days ago, quantity); the back-dated entries land before rows that already exist
+SALES = [(40, 2), (20, 3), (5, 1), (1, 4), (30, 5), (20, 1)]
+
+
+def _fake_order(product_id, days_ago, quantity):
+    """Minimal stand-in for an Order: update_product_sales_stats reads created_at and items"""
+    return SimpleNamespace(
+        created_at=datetime.combine(date.today() - timedelta(days=days_ago), datetime.min.time()),
+        items=[SimpleNamespace(product_id=product_id, quantity=quantity)]
+    )
+
+
+def setup_test_data(app):
+    """Create a product with sales spread over several weeks."""
+    with app.app_context():
+        product = Product.query.filter_by(name='Test Product - Sales Stats').first()
+        if not product:
+            product = Product(
+                name='Test Product - Sales Stats',
+                pricing_type='per_item',
+                pricing_data={'price': 1.00},
+                is_active=True
+            )
+            db.session.add(product)
+            db.session.commit()
+
+        ProductSalesStats.query.filter_by(product_id=product.id).delete()
+        db.session.commit()
+
+        for days_ago, quantity in SALES:
+            update_product_sales_stats(_fake_order(product.id, days_ago, quantity))
+
+        return {'product_id': product.id}
+
+
+def _naive_total(product_id, start_date, end_date):
+    rows = ProductSalesStats.query.filter(
+        ProductSalesStats.product_id == product_id,
+        ProductSalesStats.sale_date >= start_date,
+        ProductSalesStats.sale_date <= end_date
+    ).all()
+    return sum(row.quantity_sold for row in rows)
+
+
+def test_range_totals(app, test_data):
+    """Test 1: Running-total range sums match the daily rows."""
+    with app.app_context():
+        print("\n=== Test 1: Range Totals ===")
+
+        product_id = test_data['product_id']
+        today = date.today()
+        ranges = [(today - timedelta(days=60), today), (today - timedelta(days=25), today - timedelta(days=2)),
+                  (today - timedelta(days=20), today - timedelta(days=20))]
+
+        for start_date, end_date in ranges:
+            expected = _naive_total(product_id, start_date, end_date)
+            totals = get_range_totals(start_date, end_date, product_ids=[product_id])
+            from_totals = totals.get(product_id, (0, 0))[0]
+            from_breakdown = get_product_sales_by_date_range(product_id, start_date, end_date)['total_quantity_sold']
+            print(f"{start_date} → {end_date}: expected {expected}, totals {from_totals}, breakdown {from_breakdown}")
+            if not (expected == from_totals == from_breakdown):
+                print("✗ Running totals disagree with daily rows")
+                return False
+
+        print("✓ Running totals match daily rows")
+        return True
+
+
+def test_time_series(app, test_data):
+    """Test 2: Series buckets add up to the range total."""
+    with app.app_context():
+        print("\n=== Test 2: Time Series ===")
+
+        product_id = test_data['product_id']
+        end_date = date.today()
+        start_date = end_date - timedelta(days=60)
+        expected = _naive_total(product_id, start_date, end_date)
+
+        for granularity in ('day', 'week', 'month'):
+            series = get_sales_time_series(product_id, start_date, end_date, granularity)
+            bucket_sum = sum(bucket['quantity_sold'] for bucket in series)
+            print(f"{granularity}: {len(series)} buckets, total {bucket_sum}")
+            if bucket_sum != expected or series[0]['period_start'] != start_date.isoformat():
+                print(f"✗ {granularity} buckets do not add up to {expected}")
+                return False
+
+        print("✓ Series buckets add up to the range total")
+        return True
+
+
+def test_queued_changes(app, test_data):
+    """Test 3: Queued order/cancel changes land after commit and flush; rolled back ones never do."""
+    with app.test_request_context():
+        print("\n=== Test 3: Queued Sales Changes ===")
+
+        product_id = test_data['product_id']
+        today = date.today()
+        before = get_range_totals(today, today, product_ids=[product_id]).get(product_id, (0, 0))
+
+        order = _fake_order(product_id, 0, 0)
+        items = [{'product_id': product_id, 'quantity': 3}]
+
+        # Two orders and one cancellation in committed transactions
+        record_order_sales(order, items)
+        db.session.commit()
+        record_order_sales(order, items)
+        db.session.commit()
+        record_order_sales(order, items, sign=-1)
+        db.session.commit()
+
+        # A change from a transaction that rolls back
+        record_order_sales(order, items)
+        db.session.rollback()
+
+        # The worker's flusher thread may already have written the queue
+        flush_sales_stats()
+        after = get_range_totals(today, today, product_ids=[product_id]).get(product_id, (0, 0))
+        print(f"Today before {before}, after {after}")
+
+        if after == (before[0] + 3, before[1] + 1):
+            print("✓ Queue coalesces committed changes and drops rolled back ones")
+            return True
+        print("✗ Queued changes were not applied as expected")
+        return False
+
+
+def test_concurrent_flushes(app, test_data):
+    """Test 4: A first-of-day insert waits for a concurrent past-day carry-forward."""
+    print("\n=== Test 4: Concurrent Flushes ===")
+
+    with app.app_context():
+        product = Product.query.filter_by(name='Test Product - Sales Stats Race').first()
+        if not product:
+            product = Product(
+                name='Test Product - Sales Stats Race',
+                pricing_type='per_item',
+                pricing_data={'price': 1.00},
+                is_active=True
+            )
+            db.session.add(product)
+            db.session.commit()
+        product_id = product.id
+        ProductSalesStats.query.filter_by(product_id=product_id).delete()
+        db.session.commit()
+        update_product_sales_stats(_fake_order(product_id, 10, 2))
+
+    today = date.today()
+    past = today - timedelta(days=10)
+    past_applied = threading.Event()
+    errors = []
+
+    def past_day_cancel():
+        # Worker A: cancel a past-day order and hold the transaction open for a moment
+        with app.app_context():
+            try:
+                with sales_stats_lock():
+                    _apply_sales_deltas(past, {product_id: (-1, -1)})
+                    past_applied.set()
+                    time.sleep(1)
+                    db.session.commit()
+            except Exception as e:
+                errors.append(e)
+                past_applied.set()
+
+    def first_of_day_insert():
+        # Worker B: today's first order for the product, flushed while A is still open
+        with app.app_context():
+            try:
+                past_applied.wait()
+                with sales_stats_lock():
+                    _apply_sales_deltas(today, {product_id: (3, 1)})
+                    db.session.commit()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=past_day_cancel), threading.Thread(target=first_of_day_insert)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        if errors:
+            print(f"✗ Flush failed: {errors[0]}")
+            return False
+        row = ProductSalesStats.query.filter_by(product_id=product_id, sale_date=today).first()
+        cumulative = (row.cumulative_quantity_sold, row.cumulative_order_count) if row else None
+        totals = get_range_totals(past, today, product_ids=[product_id]).get(product_id)
+        print(f"Today's running total {cumulative}, range total {totals}")
+
+        # 2 sold 10 days ago, 1 of them cancelled, 3 sold today
+        if cumulative == (4, 1) and totals == (4, 1):
+            print("✓ Today's running total includes the concurrent past-day change")
+            return True
+        print("✗ Today's running total missed the concurrent past-day change")
+        return False
+
+
+def main():
+    """Run all sales stats tests."""
+    app = create_app()
+
+    print("=" * 60)
+    print("Sales Stats Test Suite")
+    print("=" * 60)
+
+    print("\nSetting up test data...")
+    test_data = setup_test_data(app)
+    print("Test data created successfully!")
+
+    results = {
+        'Range Totals': test_range_totals(app, test_data),
+        'Time Series': test_time_series(app, test_data),
+        'Queued Changes': test_queued_changes(app, test_data),
+        'Concurrent Flushes': test_concurrent_flushes(app, test_data)
+    }
+
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    passed = sum(1 for result in results.values() if result)
+    total = len(results)
+
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name}: {status}")
+
+    print(f"\nTotal: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,161 @@
+"""
+Test script for indexed admin search.
+
+This script tests:
+1. User tokens are kept in sync on write and find CJK/email substrings and phone prefixes/suffixes
+2. Pickup codes and order searches resolve through the stored columns; LIKE wildcards match literally
+"""
+
+import sys
+import os
+import secrets
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from models.user import User, UserSearchToken
+from models.order import Order
+from models.groupdeal import GroupDeal
+from utils.search import search_user_ids, order_search_clause
+
+
+TEST_PHONE = '+14165550199'
+
+
+def setup_test_data(app):
+    """Create a user with a CJK nickname and an order for them."""
+    with app.app_context():
+        user = User.query.filter_by(phone=TEST_PHONE).first()
+        if not user:
+            user = User(phone=TEST_PHONE, nickname='测试小王', email='search.test@example.com', wechat='wx_search_test')
+            db.session.add(user)
+            db.session.commit()
+
+        group_deal = GroupDeal.query.filter(GroupDeal.deleted_at.is_(None)).first()
+        order = None
+        if group_deal:
+            order = Order.query.filter_by(user_id=user.id).first()
+            if not order:
+                order = Order(
+                    user_id=user.id,
+                    group_deal_id=group_deal.id,
+                    order_number=f'GSF-20260101120000-{secrets.token_hex(3).upper()}',
+                    subtotal=0,
+                    total=0
+                )
+                db.session.add(order)
+                db.session.commit()
+
+        return {'user_id': user.id, 'order_id': order.id if order else None}
+
+
+def test_user_search(app, test_data):
+    """Test 1: Token index follows writes; substring and phone searches find the user."""
+    with app.app_context():
+        print("\n=== Test 1: User Search ===")
+
+        user = db.session.get(User, test_data['user_id'])
+        user.nickname = '测试小王'
+        db.session.commit()
+
+        checks = ['小王', '测试小王', 'search.test', 'wx_search', '4165550199', '0199', '416']
+        for term in checks:
+            found = test_data['user_id'] in search_user_ids(term)
+            print(f"{'✓' if found else '✗'} '{term}'")
+            if not found:
+                return False
+
+        # Renaming drops the old grams
+        user.nickname = '新名字'
+        db.session.commit()
+        stale = test_data['user_id'] in search_user_ids('小王')
+        fresh = test_data['user_id'] in search_user_ids('新名')
+        tokens = UserSearchToken.query.filter_by(user_id=test_data['user_id']).count()
+        print(f"After rename: old match {stale}, new match {fresh}, {tokens} tokens")
+        if stale or not fresh:
+            print("✗ Tokens were not rewritten on update")
+            return False
+
+        print("✓ User search uses the maintained token index")
+        return True
+
+
+def test_order_search(app, test_data):
+    """Test 2: Pickup code, order number prefix and phone find the order."""
+    with app.app_context():
+        print("\n=== Test 2: Order Search ===")
+
+        if not test_data['order_id']:
+            print("⚠ No group deal available, skipping")
+            return True
+
+        order = db.session.get(Order, test_data['order_id'])
+        if order.pickup_code != order.order_number.rsplit('-', 1)[-1]:
+            print(f"✗ pickup_code {order.pickup_code} does not match {order.order_number}")
+            return False
+
+        for term in [order.pickup_code.lower(), order.order_number, '20260101', '0199']:
+            ids = [row.id for row in Order.query.filter(order_search_clause(term)).all()]
+            found = order.id in ids
+            print(f"{'✓' if found else '✗'} '{term}'")
+            if not found:
+                return False
+
+        # Short digit runs skip the phone branch; longer ones use a subquery, not an id list
+        if 'user_id' in str(order_search_clause('416')):
+            print("✗ A 3-digit term still searched customer phones")
+            return False
+        if 'SELECT' not in str(order_search_clause('0199')):
+            print("✗ Phone matches were not a subquery")
+            return False
+
+        # '%' and '_' are literal characters, not wildcards matching every order
+        for term in ['_', '%', 'GSF%']:
+            ids = [row.id for row in Order.query.filter(order_search_clause(term)).all()]
+            if order.id in ids:
+                print(f"✗ '{term}' matched as a wildcard")
+                return False
+
+        print("✓ Order search resolves through stored columns")
+        return True
+
+
+def main():
+    """Run all search tests."""
+    app = create_app()
+
+    print("=" * 60)
+    print("Search Test Suite")
+    print("=" * 60)
+
+    print("\nSetting up test data...")
+    test_data = setup_test_data(app)
+    print("Test data created successfully!")
+
+    results = {
+        'User Search': test_user_search(app, test_data),
+        'Order Search': test_order_search(app, test_data)
+    }
+
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    passed = sum(1 for result in results.values() if result)
+    total = len(results)
+
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name}: {status}")
+
+    print(f"\nTotal: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
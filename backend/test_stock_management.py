@@ -7,6 +7,10 @@ This script tests:
 3. Stock restoration on order cancellation
 4. Stock updates on order modification
 5. Concurrent order handling (simulated)
+6. Multi-line carts reserved as a single batch
+7. Atomic (lock-free) stock mode never oversells
+8. Sold-out gate rejects known-short carts and reopens on restore
+9. Live stock snapshot follows committed (not rolled back) reservations
 """
 
 import sys
@@ -23,12 +27,15 @@ from models.groupdeal import GroupDeal, GroupDealProduct
 from models.order import Order, OrderItem
 from models.user import User, AuthToken
 from datetime import datetime, timedelta
+from constants.status_enums import StockMode
 from utils.stock_management import (
     check_and_reserve_stock,
     restore_stock,
+    check_stock_gate,
     get_available_stock,
     update_stock_after_order_modification
 )
+from utils.stock_events import get_stock_snapshot
 
 def setup_test_data(app):
     """Set up test data for stock management tests."""
@@ -300,6 +307,175 @@ def test_concurrent_orders(app, test_data):
             print(f"✗ Expected {expected_successes} successes with 4 remaining stock")
             return False
 
+def test_batched_cart(app, test_data):
+    """Test 6: Multi-line cart is validated as a whole before any stock changes."""
+    with app.app_context():
+        print("\n=== Test 6: Batched Cart Reservation ===")
+        
+        product1_id = test_data['product1_id']
+        product2_id = test_data['product2_id']
+        deal_id = test_data['deal_id']
+        
+        deal_product = GroupDealProduct.query.filter_by(
+            group_deal_id=deal_id,
+            product_id=product1_id
+        ).first()
+        deal_product.deal_stock_limit = 10
+        db.session.commit()
+        
+        # Duplicate lines for the same product are summed (3 + 2 = 5)
+        items = [
+            {'product_id': product1_id, 'quantity': 3},
+            {'product_id': product2_id, 'quantity': 50},
+            {'product_id': product1_id, 'quantity': 2}
+        ]
+        success, error = check_and_reserve_stock(deal_id, items)
+        if not success:
+            print(f"✗ Failed to reserve cart: {error}")
+            db.session.rollback()
+            return False
+        db.session.commit()
+        after_first = get_available_stock(deal_id, product1_id)
+        print(f"Stock after reserving 5 units across two lines: {after_first}")
+        
+        # Second cart fails on product1; nothing in it may be applied
+        items = [
+            {'product_id': product2_id, 'quantity': 1},
+            {'product_id': product1_id, 'quantity': 6}
+        ]
+        success, error = check_and_reserve_stock(deal_id, items)
+        db.session.rollback()
+        after_second = get_available_stock(deal_id, product1_id)
+        print(f"Oversized cart rejected: {not success} ({error}), stock now: {after_second}")
+        
+        restore_stock(deal_id, [{'product_id': product1_id, 'quantity': 5}])
+        db.session.commit()
+        
+        if after_first == 5 and not success and after_second == 5:
+            print("✓ Cart reserved atomically")
+            return True
+        print("✗ Expected stock 5 after first cart and unchanged after rejected cart")
+        return False
+
+def test_atomic_stock_mode(app, test_data):
+    """Test 7: Atomic-mode products reserve with a conditional decrement and never go negative."""
+    with app.app_context():
+        print("\n=== Test 7: Atomic Stock Mode ===")
+        
+        product1_id = test_data['product1_id']
+        product2_id = test_data['product2_id']
+        deal_id = test_data['deal_id']
+        
+        deal_product = GroupDealProduct.query.filter_by(
+            group_deal_id=deal_id,
+            product_id=product1_id
+        ).first()
+        deal_product.deal_stock_limit = 3
+        deal_product.stock_mode = StockMode.ATOMIC.value
+        db.session.commit()
+        
+        successes = 0
+        for _ in range(5):
+            success, error = check_and_reserve_stock(deal_id, [{'product_id': product1_id, 'quantity': 1}])
+            if success:
+                successes += 1
+                db.session.commit()
+            else:
+                db.session.rollback()
+        after_reserve = get_available_stock(deal_id, product1_id)
+        print(f"Successful single-unit reservations: {successes}, stock now: {after_reserve}")
+        
+        # Mixed cart: locked product2 succeeds, atomic product1 fails -> nothing applied
+        stock2_before = get_available_stock(deal_id, product2_id)
+        success, error = check_and_reserve_stock(deal_id, [
+            {'product_id': product2_id, 'quantity': 1},
+            {'product_id': product1_id, 'quantity': 1}
+        ])
+        db.session.rollback()
+        stock2_after = get_available_stock(deal_id, product2_id)
+        print(f"Mixed cart rejected: {not success} ({error}), product2 stock {stock2_before} -> {stock2_after}")
+        
+        restore_stock(deal_id, [{'product_id': product1_id, 'quantity': 3}])
+        db.session.commit()
+        after_restore = get_available_stock(deal_id, product1_id)
+        
+        deal_product = GroupDealProduct.query.filter_by(
+            group_deal_id=deal_id,
+            product_id=product1_id
+        ).first()
+        deal_product.stock_mode = StockMode.LOCKED.value
+        db.session.commit()
+        
+        if successes == 3 and after_reserve == 0 and not success and stock2_after == stock2_before and after_restore == 3:
+            print("✓ Atomic stock mode reserved without overselling")
+            return True
+        print("✗ Atomic stock mode oversold or left a partial reservation")
+        return False
+
+def test_sold_out_gate(app, test_data):
+    """Test 8: Sold-out products are rejected before a transaction and reopen on restore."""
+    with app.app_context():
+        print("\n=== Test 8: Sold-Out Gate ===")
+        
+        product1_id = test_data['product1_id']
+        deal_id = test_data['deal_id']
+        
+        deal_product = GroupDealProduct.query.filter_by(
+            group_deal_id=deal_id,
+            product_id=product1_id
+        ).first()
+        deal_product.deal_stock_limit = 2
+        db.session.commit()
+        
+        success, error = check_and_reserve_stock(deal_id, [{'product_id': product1_id, 'quantity': 2}])
+        db.session.commit()
+        admitted_after_sell_out, gate_error = check_stock_gate(deal_id, [{'product_id': product1_id, 'quantity': 1}])
+        print(f"Gate after sell-out admits: {admitted_after_sell_out} ({gate_error})")
+        
+        restore_stock(deal_id, [{'product_id': product1_id, 'quantity': 2}])
+        db.session.commit()
+        admitted_after_restore, _ = check_stock_gate(deal_id, [{'product_id': product1_id, 'quantity': 1}])
+        print(f"Gate after restore admits: {admitted_after_restore}")
+        
+        if success and not admitted_after_sell_out and admitted_after_restore:
+            print("✓ Sold-out gate rejects and reopens correctly")
+            return True
+        print("✗ Sold-out gate did not track stock correctly")
+        return False
+
+def test_live_stock_snapshot(app, test_data):
+    """Test 9: Committed reservations refresh the live stock snapshot; rolled back ones do not."""
+    with app.app_context():
+        print("\n=== Test 9: Live Stock Snapshot ===")
+        
+        product1_id = test_data['product1_id']
+        deal_id = test_data['deal_id']
+        
+        deal_product = GroupDealProduct.query.filter_by(
+            group_deal_id=deal_id,
+            product_id=product1_id
+        ).first()
+        deal_product.deal_stock_limit = 5
+        db.session.commit()
+        
+        before = get_stock_snapshot(deal_id, max_age=0).get(product1_id)
+        
+        check_and_reserve_stock(deal_id, [{'product_id': product1_id, 'quantity': 1}])
+        db.session.rollback()
+        after_rollback = get_stock_snapshot(deal_id).get(product1_id)
+        
+        check_and_reserve_stock(deal_id, [{'product_id': product1_id, 'quantity': 2}])
+        db.session.commit()
+        # Within the TTL: only the commit hook can have dropped the cached snapshot
+        after_commit = get_stock_snapshot(deal_id).get(product1_id)
+        print(f"Snapshot: before={before}, after rollback={after_rollback}, after commit={after_commit}")
+        
+        if before == 5 and after_rollback == 5 and after_commit == 3:
+            print("✓ Live stock snapshot follows committed changes")
+            return True
+        print("✗ Live stock snapshot is stale or includes rolled back changes")
+        return False
+
 def main():
     """Run all stock management tests."""
     # Safety check before running
@@ -323,7 +499,11 @@ def main():
         'Stock Validation': test_stock_validation(app, test_data),
         'Unlimited Stock': test_unlimited_stock(app, test_data),
         'Order Modification': test_order_modification(app, test_data),
-        'Concurrent Orders': test_concurrent_orders(app, test_data)
+        'Concurrent Orders': test_concurrent_orders(app, test_data),
+        'Batched Cart': test_batched_cart(app, test_data),
+        'Atomic Stock Mode': test_atomic_stock_mode(app, test_data),
+        'Sold-Out Gate': test_sold_out_gate(app, test_data),
+        'Live Stock Snapshot': test_live_stock_snapshot(app, test_data)
     }
     
     # Print summary
@@ -0,0 +1,360 @@
+"""
+Test script for set-based bulk user changes.
+
+This script tests:
+1. Targets must be either user_ids or a filter, never both or neither
+2. The acting admin is never banned or stripped of the admin role
+3. A filter-based ban only touches matching users and revokes their tokens
+4. Bulk role removal revokes tokens that embed the role; assignment restores it
+5. Chunked updates walk every matching user
+"""
+
+import sys
+import os
+import secrets
+from datetime import datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from models.user import User, UserRole, AuthToken, TokenRevocation
+from constants.status_enums import UserStatus
+import utils.auth as auth
+from utils.auth import JWT_AVAILABLE, issue_access_token, resolve_principal
+from utils.user_bulk import user_filters, bulk_set_user_fields
+
+
+ADMIN_PHONE = '6666666611'
+TARGET_PHONES = ['6666666612', '6666666613', '6666666614']
+OUTSIDER_PHONE = '6666666615'
+TARGET_NICKNAME = '批量测试用户'
+
+
+def _get_or_create_user(phone, nickname):
+    user = User.query.filter_by(phone=phone).first()
+    if not user:
+        user = User(phone=phone, nickname=nickname)
+        db.session.add(user)
+        db.session.flush()
+    user.nickname = nickname
+    user.status = UserStatus.ACTIVE.value
+    user.user_source = 'default'
+    return user
+
+
+def _ensure_role(user_id, role):
+    if not UserRole.query.filter_by(user_id=user_id, role=role).first():
+        db.session.add(UserRole(user_id=user_id, role=role))
+
+
+def _add_token(user_id):
+    token = secrets.token_urlsafe(32)
+    db.session.add(AuthToken(
+        user_id=user_id,
+        token=token,
+        expires_at=datetime.utcnow() + timedelta(days=1)
+    ))
+    return token
+
+
+def _post(app, test_data, path, payload):
+    client = app.test_client()
+    return client.post(
+        f'/api/admin/users/{path}',
+        json=payload,
+        headers={'Authorization': f'Bearer {test_data["admin_token"]}'}
+    )
+
+
+def _statuses(user_ids):
+    db.session.expire_all()
+    return {user.id: user.status for user in User.query.filter(User.id.in_(user_ids)).all()}
+
+
+def _reset_users(test_data):
+    """Reactivate everyone and give every target the admin role back"""
+    all_ids = [test_data['admin_id'], test_data['outsider_id']] + test_data['target_ids']
+    User.query.filter(User.id.in_(all_ids)).update(
+        {User.status: UserStatus.ACTIVE.value}, synchronize_session=False
+    )
+    for user_id in test_data['target_ids']:
+        _ensure_role(user_id, 'admin')
+    db.session.commit()
+    auth.evict_users(all_ids)
+
+
+def setup_test_data(app):
+    """Create an admin, three search-matching targets and one outsider."""
+    with app.app_context():
+        admin = _get_or_create_user(ADMIN_PHONE, 'Test Admin User Bulk')
+        targets = [
+            _get_or_create_user(phone, f'{TARGET_NICKNAME}{i}') for i, phone in enumerate(TARGET_PHONES)
+        ]
+        outsider = _get_or_create_user(OUTSIDER_PHONE, 'Test Outsider User Bulk')
+        _ensure_role(admin.id, 'admin')
+        for user in targets:
+            _ensure_role(user.id, 'admin')
+
+        target_ids = [user.id for user in targets]
+        # Revocations from previous runs would reject every new token
+        TokenRevocation.query.filter(TokenRevocation.user_id.in_(target_ids + [outsider.id])).delete(
+            synchronize_session=False
+        )
+
+        admin_token = _add_token(admin.id)
+        target_tokens = {user.id: _add_token(user.id) for user in targets}
+        outsider_token = _add_token(outsider.id)
+        db.session.commit()
+
+        auth._denied_users.clear()
+        auth._refresh_denylist(force=True)
+
+        return {
+            'admin_id': admin.id,
+            'admin_token': admin_token,
+            'target_ids': target_ids,
+            'target_tokens': target_tokens,
+            'outsider_id': outsider.id,
+            'outsider_token': outsider_token
+        }
+
+
+def test_target_validation(app, test_data):
+    """Test 1: user_ids and filter are mutually exclusive, and one is required."""
+    with app.app_context():
+        print("\n=== Test 1: Target Validation ===")
+
+        cases = {
+            'both': {'user_ids': test_data['target_ids'], 'filter': {'search': TARGET_NICKNAME}},
+            'neither': {},
+            'empty filter': {'filter': {}}
+        }
+        for name, target in cases.items():
+            response = _post(app, test_data, 'bulk-update-status', {'status': UserStatus.BANNED.value, **target})
+            print(f"{name}: {response.status_code}")
+            if response.status_code != 400:
+                print(f"✗ Expected 400 for {name}")
+                _reset_users(test_data)
+                return False
+
+        statuses = _statuses(test_data['target_ids'])
+        if any(status != UserStatus.ACTIVE.value for status in statuses.values()):
+            print("✗ A rejected request changed users")
+            _reset_users(test_data)
+            return False
+
+        print("✓ Invalid targets are rejected without touching users")
+        return True
+
+
+def test_acting_admin_excluded(app, test_data):
+    """Test 2: The acting admin is skipped by bulk ban and bulk admin-role removal."""
+    with app.app_context():
+        print("\n=== Test 2: Acting Admin Excluded ===")
+
+        user_ids = [test_data['admin_id'], test_data['target_ids'][0]]
+        response = _post(app, test_data, 'bulk-update-status', {
+            'status': UserStatus.BANNED.value, 'user_ids': user_ids
+        })
+        data = response.get_json()
+        print(f"Ban: {response.status_code}, {data.get('user_ids')}")
+        statuses = _statuses(user_ids)
+        if response.status_code != 200 or test_data['admin_id'] in data['user_ids']:
+            print("✗ Acting admin was included in the ban")
+            _reset_users(test_data)
+            return False
+        if statuses[test_data['admin_id']] != UserStatus.ACTIVE.value:
+            print("✗ Acting admin was banned")
+            _reset_users(test_data)
+            return False
+        if statuses[test_data['target_ids'][0]] != UserStatus.BANNED.value:
+            print("✗ Target was not banned")
+            _reset_users(test_data)
+            return False
+        _reset_users(test_data)
+
+        response = _post(app, test_data, 'bulk-roles', {
+            'role': 'admin', 'action': 'remove', 'user_ids': user_ids
+        })
+        data = response.get_json()
+        print(f"Remove admin role: {response.status_code}, {data.get('user_ids')}")
+        still_admin = UserRole.query.filter_by(user_id=test_data['admin_id'], role='admin').first()
+        _reset_users(test_data)
+        if response.status_code != 200 or test_data['admin_id'] in data['user_ids'] or not still_admin:
+            print("✗ Acting admin lost the admin role")
+            return False
+
+        print("✓ Acting admin is never banned or demoted")
+        return True
+
+
+def test_filter_ban(app, test_data):
+    """Test 3: A filter-based ban bans only matching users and cuts off their tokens."""
+    with app.app_context():
+        print("\n=== Test 3: Filter Ban ===")
+
+        # Warm the principal cache so eviction is exercised too
+        for token in list(test_data['target_tokens'].values()) + [test_data['outsider_token']]:
+            resolve_principal(token)
+        jwt_tokens = {}
+        if JWT_AVAILABLE:
+            jwt_tokens = {user_id: issue_access_token(user_id, ['admin'])[0] for user_id in test_data['target_ids']}
+            outsider_jwt = issue_access_token(test_data['outsider_id'], ['user'])[0]
+
+        response = _post(app, test_data, 'bulk-update-status', {
+            'status': UserStatus.BANNED.value, 'filter': {'search': TARGET_NICKNAME}
+        })
+        data = response.get_json()
+        print(f"Ban by filter: {response.status_code}, updated {data.get('updated_count')}")
+        if response.status_code != 200:
+            print(f"✗ Request failed: {data}")
+            _reset_users(test_data)
+            return False
+
+        statuses = _statuses(test_data['target_ids'] + [test_data['outsider_id']])
+        ok = True
+        if any(statuses[user_id] != UserStatus.BANNED.value for user_id in test_data['target_ids']):
+            print("✗ Not every matching user was banned")
+            ok = False
+        if statuses[test_data['outsider_id']] != UserStatus.ACTIVE.value or test_data['outsider_id'] in data['user_ids']:
+            print("✗ A user outside the filter was banned")
+            ok = False
+
+        for user_id, token in test_data['target_tokens'].items():
+            principal = resolve_principal(token)
+            if principal is not None and principal.is_active:
+                print(f"✗ Cached principal for banned user {user_id} is still active")
+                ok = False
+        for user_id, token in jwt_tokens.items():
+            if resolve_principal(token) is not None:
+                print(f"✗ Access token for banned user {user_id} still resolves")
+                ok = False
+        outsider = resolve_principal(test_data['outsider_token'])
+        if not outsider or not outsider.is_active or (JWT_AVAILABLE and resolve_principal(outsider_jwt) is None):
+            print("✗ Outsider's tokens were affected")
+            ok = False
+
+        _reset_users(test_data)
+        if ok:
+            print("✓ Filter ban is scoped to matching users and revokes their tokens")
+        return ok
+
+
+def test_bulk_roles(app, test_data):
+    """Test 4: Removing a role revokes embedded-role tokens; assigning restores the role."""
+    with app.app_context():
+        print("\n=== Test 4: Bulk Roles ===")
+
+        jwt_tokens = {}
+        if JWT_AVAILABLE:
+            jwt_tokens = {user_id: issue_access_token(user_id, ['admin'])[0] for user_id in test_data['target_ids']}
+
+        response = _post(app, test_data, 'bulk-roles', {
+            'role': 'admin', 'action': 'remove', 'filter': {'search': TARGET_NICKNAME, 'role': 'admin'}
+        })
+        data = response.get_json()
+        print(f"Remove: {response.status_code}, {data.get('user_ids')}")
+        remaining = UserRole.query.filter(
+            UserRole.user_id.in_(test_data['target_ids']), UserRole.role == 'admin'
+        ).count()
+        if response.status_code != 200 or remaining:
+            print(f"✗ {remaining} targets kept the admin role")
+            _reset_users(test_data)
+            return False
+        for user_id, token in jwt_tokens.items():
+            if resolve_principal(token) is not None:
+                print(f"✗ Access token embedding the removed role still resolves for user {user_id}")
+                _reset_users(test_data)
+                return False
+
+        response = _post(app, test_data, 'bulk-roles', {
+            'role': 'admin', 'action': 'assign', 'user_ids': test_data['target_ids']
+        })
+        data = response.get_json()
+        print(f"Assign: {response.status_code}, {data.get('user_ids')}")
+        assigned = UserRole.query.filter(
+            UserRole.user_id.in_(test_data['target_ids']), UserRole.role == 'admin'
+        ).count()
+        if response.status_code != 200 or assigned != len(test_data['target_ids']):
+            print("✗ Role was not assigned to every target")
+            _reset_users(test_data)
+            return False
+
+        # Assigning again is a no-op
+        response = _post(app, test_data, 'bulk-roles', {
+            'role': 'admin', 'action': 'assign', 'user_ids': test_data['target_ids']
+        })
+        if response.get_json().get('updated_count') != 0:
+            print("✗ Re-assigning an existing role reported changes")
+            _reset_users(test_data)
+            return False
+
+        print("✓ Bulk role changes apply and revoke tokens")
+        return True
+
+
+def test_chunked_update(app, test_data):
+    """Test 5: Chunks of one still reach every matching user, and unchanged users are skipped."""
+    with app.app_context():
+        print("\n=== Test 5: Chunked Update ===")
+
+        filters = user_filters(user_ids=test_data['target_ids'], exclude_user_id=test_data['target_ids'][0])
+        updated = bulk_set_user_fields(filters, {'user_source': '花泽'}, chunk_size=1)
+        again = bulk_set_user_fields(filters, {'user_source': '花泽'}, chunk_size=1)
+        print(f"Updated {updated}, then {again}")
+
+        User.query.filter(User.id.in_(test_data['target_ids'])).update(
+            {User.user_source: 'default'}, synchronize_session=False
+        )
+        db.session.commit()
+
+        if sorted(updated) != sorted(test_data['target_ids'][1:]) or again:
+            print("✗ Chunked update did not match the filter exactly once")
+            return False
+
+        print("✓ Chunked updates cover every matching user once")
+        return True
+
+
+def main():
+    """Run all bulk user tests."""
+    app = create_app()
+
+    print("=" * 60)
+    print("Bulk User Test Suite")
+    print("=" * 60)
+
+    print("\nSetting up test data...")
+    test_data = setup_test_data(app)
+    print("Test data created successfully!")
+
+    results = {
+        'Target Validation': test_target_validation(app, test_data),
+        'Acting Admin Excluded': test_acting_admin_excluded(app, test_data),
+        'Filter Ban': test_filter_ban(app, test_data),
+        'Bulk Roles': test_bulk_roles(app, test_data),
+        'Chunked Update': test_chunked_update(app, test_data)
+    }
+
+    print("\n" + "=" * 60)
+    print("Test Summary")
+    print("=" * 60)
+
+    passed = sum(1 for result in results.values() if result)
+    total = len(results)
+
+    for test_name, result in results.items():
+        status = "✓ PASSED" if result else "✗ FAILED"
+        print(f"{test_name}: {status}")
+
+    print(f"\nTotal: {passed}/{total} tests passed")
+    print("=" * 60)
+
+    return passed == total
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,526 @@
+"""
+Shared bearer token resolution for route auth helpers.
+
+Every authenticated request used to run an AuthToken query, a User query and a
+lazy load of User.roles before doing any real work. Tokens are now resolved to a
+small Principal and cached in-process for a short TTL, keyed by a SHA-256 hash of
+the token so raw tokens are never held as cache keys.
+
+Writes that change what a token resolves to (logout, ban/unban, role changes,
+impersonation) must call evict_token() or evict_user() after committing.
+
+When AUTH_TOKEN_MODE is 'jwt', logins issue short-lived signed access tokens
+carrying user_id and roles instead of AuthToken rows. Those verify without a
+database hit; revocations (logout, ban, role removal) are written to
+token_revocations and mirrored into an in-memory denylist that each worker
+reloads every AUTH_DENYLIST_REFRESH_SECONDS. Opaque AuthToken tokens keep
+working in either mode.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from flask import current_app, g, jsonify, request
+
+from config import Config
+
+# Optional import for stateless access tokens
+try:
+    import jwt
+    JWT_AVAILABLE = True
+except ImportError:
+    JWT_AVAILABLE = False
+    jwt = None
+
+# Naive datetimes in the database are Eastern time (see models.base.est_now)
+_DB_TZ = ZoneInfo('America/New_York')
+JWT_ALGORITHM = 'HS256'
+
+
+class Principal:
+    """Authenticated identity resolved from a bearer token"""
+
+    __slots__ = ('user_id', 'status', 'roles', 'token_id', 'token_type', 'expires_at')
+
+    def __init__(self, user_id, status, roles, token_id=None, token_type=None, expires_at=None):
+        self.user_id = user_id
+        self.status = status
+        self.roles = tuple(roles)
+        self.token_id = token_id
+        self.token_type = token_type
+        self.expires_at = expires_at
+
+    @property
+    def id(self):
+        """Alias so a Principal can stand in where a User id is read"""
+        return self.user_id
+
+    @property
+    def is_active(self):
+        from constants.status_enums import UserStatus
+        return self.status == UserStatus.ACTIVE.value
+
+    @property
+    def is_admin(self):
+        return 'admin' in self.roles
+
+    def has_role(self, role_name):
+        return role_name in self.roles
+
+    def is_expired(self, now=None):
+        """Check the cached token expiry without touching the database"""
+        if self.expires_at is None:
+            return False
+        if now is None:
+            from models.base import utc_now
+            now = utc_now()
+        return now >= self.expires_at
+
+
+# Sliding expiration window applied on use (tokens effectively never expire)
+TOKEN_LIFETIME = timedelta(days=36500)  # 100 years
+
+# token_hash -> (Principal, cached_at monotonic seconds); ordered for LRU eviction
+_cache = OrderedDict()
+# user_id -> set of token hashes, so user-level changes can evict every token
+_user_index = {}
+_lock = threading.Lock()
+
+
+def _setting(name, default):
+    try:
+        return current_app.config.get(name, default)
+    except RuntimeError:
+        return getattr(Config, name, default)
+
+
+def hash_token(token):
+    """Return the cache key for a raw bearer token"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def get_bearer_token():
+    """
+    Extract the bearer token from the Authorization header.
+
+    Returns:
+        str: Token string, or '' if the header is missing
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header.replace('Bearer ', '').strip()
+    return auth_header.strip()
+
+
+def _cache_get(key):
+    ttl = _setting('AUTH_CACHE_TTL_SECONDS', 60)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        principal, cached_at = entry
+        if time.monotonic() - cached_at > ttl:
+            _drop(key)
+            return None
+        _cache.move_to_end(key)
+        return principal
+
+
+def _cache_put(key, principal):
+    max_entries = _setting('AUTH_CACHE_MAX_ENTRIES', 10000)
+    with _lock:
+        _drop(key)
+        _cache[key] = (principal, time.monotonic())
+        _user_index.setdefault(principal.user_id, set()).add(key)
+        while len(_cache) > max_entries:
+            oldest_key = next(iter(_cache))
+            _drop(oldest_key)
+
+
+def _drop(key):
+    """Remove a cache entry. Caller must hold _lock."""
+    entry = _cache.pop(key, None)
+    if entry is None:
+        return
+    user_id = entry[0].user_id
+    keys = _user_index.get(user_id)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del _user_index[user_id]
+
+
+def _load_principal(token):
+    """Resolve a token against the database (cache miss path)"""
+    from models import db
+    from models.user import User, AuthToken, UserRole
+
+    row = db.session.query(AuthToken, User).join(
+        User, User.id == AuthToken.user_id
+    ).filter(
+        AuthToken.token == token,
+        AuthToken.is_revoked == False
+    ).first()
+    if not row:
+        return None
+
+    auth_token, user = row
+    if not auth_token.is_valid():
+        return None
+
+    roles = [role for (role,) in db.session.query(UserRole.role).filter(UserRole.user_id == user.id).all()]
+    return Principal(
+        user_id=user.id,
+        status=user.status,
+        roles=roles,
+        token_id=auth_token.id,
+        token_type=auth_token.token_type,
+        expires_at=auth_token.expires_at
+    )
+
+
+def _to_epoch(naive_dt):
+    return naive_dt.replace(tzinfo=_DB_TZ).timestamp()
+
+
+def _from_epoch(seconds):
+    return datetime.fromtimestamp(seconds, _DB_TZ).replace(tzinfo=None)
+
+
+def _jwt_secret():
+    return _setting('JWT_SECRET_KEY', None) or _setting('SECRET_KEY', None)
+
+
+def jwt_mode_enabled():
+    """Check whether logins should issue stateless access tokens"""
+    return _setting('AUTH_TOKEN_MODE', 'opaque') == 'jwt' and JWT_AVAILABLE
+
+
+def is_jwt_token(token):
+    """Opaque tokens are token_urlsafe() output and never contain dots"""
+    return bool(token) and token.count('.') == 2
+
+
+def issue_access_token(user_id, roles):
+    """
+    Issue a signed stateless access token.
+
+    Args:
+        user_id (int): User the token is issued to
+        roles (list): Role names embedded in the token
+
+    Returns:
+        tuple: (token string, naive expires_at datetime)
+    """
+    ttl = _setting('JWT_ACCESS_TOKEN_TTL_SECONDS', 86400)
+    issued_at_ms = int(time.time() * 1000)
+    issued_at = issued_at_ms // 1000
+    expires_epoch = issued_at + ttl
+    payload = {
+        'sub': str(user_id),
+        'roles': list(roles),
+        'iat': issued_at,
+        # iat is whole seconds; per-user revocation cut-offs are compared at millisecond precision
+        'iat_ms': issued_at_ms,
+        'exp': expires_epoch,
+        'jti': secrets.token_hex(16)
+    }
+    token = jwt.encode(payload, _jwt_secret(), algorithm=JWT_ALGORITHM)
+    return token, _from_epoch(expires_epoch)
+
+
+def _decode_access_token(token, verify_exp=True):
+    if not JWT_AVAILABLE:
+        return None
+    try:
+        return jwt.decode(
+            token,
+            _jwt_secret(),
+            algorithms=[JWT_ALGORITHM],
+            options={'verify_exp': verify_exp, 'require': ['sub', 'iat', 'exp', 'jti']}
+        )
+    except jwt.InvalidTokenError:
+        return None
+
+
+# Denylist for stateless tokens: jti -> expiry epoch, user_id -> revoked-before epoch
+_denied_jtis = {}
+_denied_users = {}
+_denylist_loaded_at = None
+_denylist_lock = threading.Lock()
+
+
+def _refresh_denylist(force=False):
+    """Reload unexpired revocations from the database every refresh interval
+
+    The new maps are built aside and swapped in by rebinding, so a concurrent
+    _is_denied() sees either the old or the new denylist, never an empty one.
+    """
+    global _denied_jtis, _denied_users, _denylist_loaded_at
+    interval = _setting('AUTH_DENYLIST_REFRESH_SECONDS', 30)
+    if not force and _denylist_loaded_at is not None and time.monotonic() - _denylist_loaded_at < interval:
+        return
+    if not _denylist_lock.acquire(blocking=_denylist_loaded_at is None):
+        # Another thread is already reloading; serve from the current copy
+        return
+    try:
+        from models.base import utc_now
+        from models.user import TokenRevocation
+
+        rows = TokenRevocation.query.filter(TokenRevocation.expires_at > utc_now()).all()
+        jtis = {}
+        users = {}
+        for row in rows:
+            if row.jti:
+                jtis[row.jti] = _to_epoch(row.expires_at)
+            if row.user_id and row.revoked_before:
+                cutoff = _to_epoch(row.revoked_before)
+                users[row.user_id] = max(users.get(row.user_id, 0), cutoff)
+        _denied_jtis = jtis
+        _denied_users = users
+        _denylist_loaded_at = time.monotonic()
+    finally:
+        _denylist_lock.release()
+
+
+def _is_denied(claims):
+    _refresh_denylist()
+    if claims['jti'] in _denied_jtis:
+        return True
+    cutoff = _denied_users.get(int(claims['sub']))
+    if cutoff is None:
+        return False
+    # Tokens from before iat_ms fall back to whole seconds (rejected if issued in the cut-off's second)
+    issued_at = claims['iat_ms'] / 1000 if 'iat_ms' in claims else claims['iat']
+    return issued_at <= cutoff
+
+
+def _principal_from_jwt(token):
+    claims = _decode_access_token(token)
+    if not claims or _is_denied(claims):
+        return None
+    from constants.status_enums import UserStatus
+    # Tokens are only issued to active users; bans revoke them via the denylist
+    return Principal(
+        user_id=int(claims['sub']),
+        status=UserStatus.ACTIVE.value,
+        roles=claims.get('roles', []),
+        token_type='jwt',
+        expires_at=_from_epoch(claims['exp'])
+    )
+
+
+def revoke_access_token(token):
+    """
+    Revoke a single stateless access token (logout) and commit.
+
+    Returns:
+        bool: True if the token was a valid access token and is now revoked
+    """
+    from models import db
+    from models.user import TokenRevocation
+
+    claims = _decode_access_token(token, verify_exp=False)
+    if not claims:
+        return False
+    db.session.add(TokenRevocation(
+        jti=claims['jti'],
+        user_id=int(claims['sub']),
+        expires_at=_from_epoch(claims['exp'])
+    ))
+    db.session.commit()
+    _denied_jtis[claims['jti']] = claims['exp']
+    return True
+
+
+def revoke_user_tokens(user_id):
+    """
+    Revoke every access token issued to a user so far and commit.
+
+    Used when a user is banned or loses a role: stateless tokens carry status
+    and roles, so they have to be cut off rather than re-read. Also evicts the
+    user's cached opaque-token principals.
+    """
+    revoke_users_tokens([user_id])
+
+
+def revoke_users_tokens(user_ids):
+    """revoke_user_tokens() for many users with one multi-row INSERT and one commit"""
+    from sqlalchemy import insert
+    from models import db
+    from models.base import utc_now
+    from models.user import TokenRevocation
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    now = utc_now()
+    ttl = _setting('JWT_ACCESS_TOKEN_TTL_SECONDS', 86400)
+    expires_at = now + timedelta(seconds=ttl)
+    db.session.execute(insert(TokenRevocation), [{
+        'user_id': user_id,
+        'revoked_before': now,
+        'expires_at': expires_at,
+        'created_at': now,
+        'updated_at': now
+    } for user_id in user_ids])
+    db.session.commit()
+    cutoff = _to_epoch(now)
+    for user_id in user_ids:
+        _denied_users[user_id] = max(_denied_users.get(user_id, 0), cutoff)
+    evict_users(user_ids)
+
+
+def resolve_principal(token):
+    """
+    Resolve a bearer token to a Principal, using the in-process cache.
+
+    Signed access tokens are verified locally against the denylist; opaque
+    tokens go through the TTL cache and fall back to the database.
+
+    Args:
+        token (str): Raw bearer token
+
+    Returns:
+        Principal: Resolved principal (may be inactive), or None if the token
+        is unknown, revoked or expired
+    """
+    if not token:
+        return None
+
+    if is_jwt_token(token):
+        return _principal_from_jwt(token)
+
+    key = hash_token(token)
+    principal = _cache_get(key)
+    if principal is not None:
+        if principal.is_expired():
+            evict_token(token)
+            return None
+        return principal
+
+    principal = _load_principal(token)
+    if principal is not None:
+        _cache_put(key, principal)
+    return principal
+
+
+def get_current_principal_optional():
+    """
+    Resolve the request's principal if it carries a valid token for an active user.
+
+    Returns:
+        Principal or None
+    """
+    principal = resolve_principal(get_bearer_token())
+    if not principal or not principal.is_active:
+        return None
+    g.principal = principal
+    return principal
+
+
+def require_auth():
+    """Check if user is authenticated and return user_id"""
+    token = get_bearer_token()
+    if not token:
+        return None, jsonify({'error': 'No token provided'}), 401
+
+    principal = resolve_principal(token)
+    if not principal:
+        return None, jsonify({'error': 'Invalid or expired token'}), 401
+
+    if not principal.is_active:
+        return None, jsonify({'error': 'User not found or inactive'}), 401
+
+    g.principal = principal
+    return principal.user_id, None, None
+
+
+def should_refresh_expiry(expires_at, now=None):
+    """
+    Check whether a token's sliding expiry is stale enough to be written back.
+
+    Refreshing pushes expires_at to now + TOKEN_LIFETIME, so the stored value
+    tells us when it was last written. Writes are skipped until
+    AUTH_TOKEN_REFRESH_INTERVAL_SECONDS have passed, which keeps read-only
+    requests from turning into write transactions.
+
+    Args:
+        expires_at (datetime): Currently stored expiry (naive)
+        now (datetime, optional): Current time, defaults to utc_now()
+
+    Returns:
+        bool: True if the expiry should be refreshed
+    """
+    if expires_at is None:
+        return True
+    if now is None:
+        from models.base import utc_now
+        now = utc_now()
+    interval = timedelta(seconds=_setting('AUTH_TOKEN_REFRESH_INTERVAL_SECONDS', 3600))
+    return (now + TOKEN_LIFETIME) - expires_at >= interval
+
+
+def refresh_token_expiry(principal):
+    """
+    Slide a token's expiry forward, at most once per refresh interval.
+
+    Args:
+        principal (Principal): Resolved principal for the request's token
+
+    Returns:
+        bool: True if an UPDATE was issued and committed
+    """
+    from models import db
+    from models.base import utc_now
+    from models.user import AuthToken
+
+    if principal.token_id is None:
+        return False
+
+    now = utc_now()
+    if not should_refresh_expiry(principal.expires_at, now):
+        return False
+
+    new_expires_at = now + TOKEN_LIFETIME
+    AuthToken.query.filter_by(id=principal.token_id).update(
+        {'expires_at': new_expires_at}, synchronize_session=False
+    )
+    db.session.commit()
+    # Cached principal is shared, so later requests see the new expiry without re-reading
+    principal.expires_at = new_expires_at
+    return True
+
+
+def evict_token(token):
+    """Drop a single token from the cache (e.g. on logout)"""
+    if not token:
+        return
+    with _lock:
+        _drop(hash_token(token))
+
+
+def evict_user(user_id):
+    """Drop every cached token for a user (status or role changes)"""
+    with _lock:
+        for key in list(_user_index.get(user_id, ())):
+            _drop(key)
+
+
+def evict_users(user_ids):
+    """evict_user() for many users under one lock"""
+    with _lock:
+        for user_id in user_ids:
+            for key in list(_user_index.get(user_id, ())):
+                _drop(key)
+
+
+def clear_auth_cache():
+    """Drop every cached principal"""
+    with _lock:
+        _cache.clear()
+        _user_index.clear()
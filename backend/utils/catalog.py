@@ -0,0 +1,160 @@
+"""
+Catalog snapshot cache for GET /api/products.
+
+The product list changes a few times a day but is the most requested public
+endpoint. Each (sort, visibility) variant is serialized once into a JSON body
+plus a gzip copy, both with strong ETags, and served from memory until the
+catalog version changes.
+
+The catalog version is bumped in-process by bump_catalog_version() (called by
+the admin product and supplier endpoints after commit). Other workers notice
+within CATALOG_VERSION_CHECK_SECONDS by comparing a cheap fingerprint of the
+products and suppliers tables (row count and latest updated_at).
+"""
+import gzip
+import hashlib
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func
+
+from config import Config
+from models import db
+
+
+# Sort orders whose output depends only on catalog rows (popularity and stats change per order)
+SNAPSHOT_SORTS = ('custom', 'name', 'created_at')
+
+_snapshots = {}
+_lock = threading.Lock()
+_local_version = 0
+_fingerprint = None
+_fingerprint_checked_at = 0.0
+
+
+class CatalogSnapshot:
+    """One pre-serialized product list response"""
+
+    __slots__ = ('version', 'body', 'gzip_body', 'etag', 'gzip_etag')
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        # Strong ETags must differ between content codings
+        self.gzip_etag = f'"{digest}-gz"'
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names this snapshot"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip() for tag in if_none_match.split(',')}
+        return self.etag in tags or self.gzip_etag in tags
+
+
+def _check_seconds():
+    try:
+        return current_app.config.get('CATALOG_VERSION_CHECK_SECONDS', Config.CATALOG_VERSION_CHECK_SECONDS)
+    except RuntimeError:
+        return Config.CATALOG_VERSION_CHECK_SECONDS
+
+
+def _read_fingerprint():
+    from models.product import Product
+    from models.supplier import Supplier
+
+    product_count, product_updated = db.session.query(
+        func.count(Product.id), func.max(Product.updated_at)
+    ).one()
+    supplier_count, supplier_updated = db.session.query(
+        func.count(Supplier.id), func.max(Supplier.updated_at)
+    ).one()
+    return (product_count, product_updated, supplier_count, supplier_updated)
+
+
+def get_catalog_version():
+    """
+    Current catalog version for this worker.
+
+    Re-reads the table fingerprint at most once per check interval; a changed
+    fingerprint drops every snapshot.
+
+    Returns:
+        tuple: (local bump counter, fingerprint)
+    """
+    global _fingerprint, _fingerprint_checked_at
+
+    now = time.monotonic()
+    if _fingerprint is None or now - _fingerprint_checked_at >= _check_seconds():
+        fingerprint = _read_fingerprint()
+        with _lock:
+            if fingerprint != _fingerprint:
+                _snapshots.clear()
+                _fingerprint = fingerprint
+            _fingerprint_checked_at = now
+    return (_local_version, _fingerprint)
+
+
+def bump_catalog_version():
+    """Invalidate every catalog snapshot in this worker (call after committing catalog changes)"""
+    global _local_version, _fingerprint
+    with _lock:
+        _local_version += 1
+        _fingerprint = None
+        _snapshots.clear()
+
+
+def _build_body(sort_by, show_all):
+    """Serialize the product list exactly as get_products() does without stats"""
+    from sqlalchemy.orm import joinedload
+    from models.product import Product
+
+    query = Product.query.options(joinedload(Product.supplier))
+    if not show_all:
+        query = query.filter_by(is_active=True)
+
+    if sort_by == 'name':
+        query = query.order_by(Product.name.asc())
+    elif sort_by == 'custom':
+        query = query.order_by(Product.sort_order.asc(), Product.created_at.desc())
+    else:
+        query = query.order_by(Product.created_at.desc())
+
+    products_data = [product.to_dict() for product in query.all()]
+
+    # Move out of stock items to the bottom (on top of existing sort)
+    # Out of stock = stock_limit is 0 (not None, which means unlimited)
+    products_data.sort(key=lambda p: (p.get('stock_limit') == 0 if p.get('stock_limit') is not None else False, 0))
+
+    return current_app.json.dumps({'products': products_data}).encode('utf-8')
+
+
+def get_catalog_snapshot(sort_by, show_all):
+    """
+    Get (building if needed) the snapshot for one product list variant.
+
+    Args:
+        sort_by (str): One of SNAPSHOT_SORTS
+        show_all (bool): Include inactive products (admin view)
+
+    Returns:
+        CatalogSnapshot
+    """
+    version = get_catalog_version()
+    key = (sort_by, show_all)
+
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    snapshot = CatalogSnapshot(version, _build_body(sort_by, show_all))
+    with _lock:
+        # Only publish if nothing invalidated the catalog while we were building
+        if version == (_local_version, _fingerprint):
+            _snapshots[key] = snapshot
+    return snapshot
@@ -0,0 +1,348 @@
+"""
+Batched group deal menu loader and materialized menu documents.
+
+The deal endpoints used to query each deal's products, then each product and
+its supplier one row at a time. load_deal_menus() fetches deal products and
+products (with suppliers joined) for any number of deals in two queries, so
+the query count no longer grows with deals × products.
+
+Once a deal is published its product list rarely changes; only the stock
+limits do. get_deal_menus() keeps a serialized menu document per visible deal
+in memory and overlays the live deal_stock_limit values with one small query
+per request. Documents are rebuilt by rebuild_deal_menu() (called by the admin
+deal endpoints after commit); other workers notice within
+DEAL_MENU_CHECK_SECONDS through a fingerprint of the group deal tables and the
+catalog version.
+
+Each document also keeps the pricing fields of its products, so cart quotes
+for visible deals are priced without loading Product rows
+(get_deal_pricing()).
+"""
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from config import Config
+from constants.status_enums import GroupDealStatus
+from models import db
+from models.base import utc_now
+from models.groupdeal import GroupDeal, GroupDealProduct
+from models.product import Product
+from utils.catalog import get_catalog_version
+
+
+# Deal statuses whose menus are materialized (the ones customers can see)
+MENU_STATUSES = (
+    GroupDealStatus.ACTIVE.value,
+    GroupDealStatus.UPCOMING.value,
+    GroupDealStatus.PREPARING.value,
+    GroupDealStatus.READY_FOR_PICKUP.value,
+)
+
+# The product fields utils/pricing.py reads; updated_at keys the compiled pricing cache
+PricingProduct = namedtuple('PricingProduct', [
+    'id', 'updated_at', 'pricing_type', 'pricing_data', 'counts_toward_free_shipping'
+])
+
+_documents = {}
+_lock = threading.Lock()
+_fingerprint = None
+_fingerprint_checked_at = 0.0
+
+
+def menu_sort_key(product_dict):
+    """Custom sort_order, with out of stock items (deal_stock_limit == 0, not None) moved to the bottom"""
+    return (
+        product_dict.get('deal_stock_limit') == 0 if product_dict.get('deal_stock_limit') is not None else False,
+        product_dict.get('sort_order', 0),
+        product_dict.get('id', 0)
+    )
+
+
+def load_deal_menus(deals, active_only=False, admin_view=False):
+    """
+    Build the product menu for each deal.
+
+    Args:
+        deals (list): GroupDeal instances
+        active_only (bool): Skip inactive products (customer view)
+        admin_view (bool): Add stock_mode and group_deal_product_id to each product
+            and keep deal product order instead of the customer menu sort
+
+    Returns:
+        dict: {deal_id: [product_dict, ...]}
+    """
+    menus = {deal.id: [] for deal in deals}
+    if not menus:
+        return menus
+
+    deal_products = GroupDealProduct.query.filter(
+        GroupDealProduct.group_deal_id.in_(list(menus))
+    ).order_by(GroupDealProduct.id.asc()).all()
+
+    product_ids = {dp.product_id for dp in deal_products}
+    products = {}
+    if product_ids:
+        products = {
+            product.id: product
+            for product in Product.query.options(joinedload(Product.supplier)).filter(
+                Product.id.in_(product_ids)
+            ).all()
+        }
+
+    # Serialize each product once even if it appears in several deals
+    serialized = {}
+    for dp in deal_products:
+        product = products.get(dp.product_id)
+        if not product or (active_only and not product.is_active):
+            continue
+        if product.id not in serialized:
+            serialized[product.id] = product.to_dict()
+
+        product_dict = dict(serialized[product.id])
+        product_dict['deal_stock_limit'] = dp.deal_stock_limit
+        if admin_view:
+            product_dict['stock_mode'] = dp.stock_mode
+            product_dict['group_deal_product_id'] = dp.id
+        menus[dp.group_deal_id].append(product_dict)
+
+    if not admin_view:
+        for products_data in menus.values():
+            products_data.sort(key=menu_sort_key)
+
+    return menus
+
+
+def serialize_deals(deals, active_only=False, admin_view=False):
+    """
+    Serialize deals with their product menus attached under 'products'.
+
+    Returns:
+        list: deal dicts in the order given
+    """
+    menus = load_deal_menus(deals, active_only=active_only, admin_view=admin_view)
+    deals_data = []
+    for deal in deals:
+        deal_dict = deal.to_dict()
+        deal_dict['products'] = menus[deal.id]
+        deals_data.append(deal_dict)
+    return deals_data
+
+
+class DealMenuDocument:
+    """Serialized deal and product menu, without live stock"""
+
+    __slots__ = ('version', 'deal', 'status', 'order_start_date', 'order_end_date', 'products', 'pricing')
+
+    def __init__(self, version, deal, products):
+        self.version = version
+        self.deal = deal.to_dict()
+        # is_active depends on the clock, so it is recomputed at serve time
+        self.status = deal.status
+        self.order_start_date = deal.order_start_date
+        self.order_end_date = deal.order_end_date
+        self.products = products
+        self.pricing = {
+            product_dict['id']: PricingProduct(
+                product_dict['id'],
+                product_dict['updated_at'],
+                product_dict['pricing_type'],
+                product_dict['pricing_data'],
+                product_dict['counts_toward_free_shipping']
+            )
+            for product_dict in products
+        }
+
+    def render(self, stock_limits, active_only, now):
+        """
+        Deal dict with products overlaid with live stock.
+
+        Args:
+            stock_limits (dict): {product_id: deal_stock_limit} for this deal
+            active_only (bool): Skip inactive products
+            now (datetime): Current time for is_active
+        """
+        deal_dict = dict(self.deal)
+        deal_dict['is_active'] = (
+            self.status == GroupDealStatus.ACTIVE.value and
+            self.order_start_date <= now <= self.order_end_date
+        )
+
+        products_data = []
+        for product_dict in self.products:
+            # Products removed from the deal since the document was built are dropped
+            if product_dict['id'] not in stock_limits:
+                continue
+            if active_only and not product_dict.get('is_active'):
+                continue
+            product_dict = dict(product_dict)
+            product_dict['deal_stock_limit'] = stock_limits[product_dict['id']]
+            products_data.append(product_dict)
+        products_data.sort(key=menu_sort_key)
+
+        deal_dict['products'] = products_data
+        return deal_dict
+
+
+def _check_seconds():
+    try:
+        return current_app.config.get('DEAL_MENU_CHECK_SECONDS', Config.DEAL_MENU_CHECK_SECONDS)
+    except RuntimeError:
+        return Config.DEAL_MENU_CHECK_SECONDS
+
+
+def _read_fingerprint():
+    deal_count, deal_updated = db.session.query(
+        func.count(GroupDeal.id), func.max(GroupDeal.updated_at)
+    ).one()
+    # Product set changes always insert rows (update_group_deal replaces them), so max(id) moves
+    row_count, row_max_id = db.session.query(
+        func.count(GroupDealProduct.id), func.max(GroupDealProduct.id)
+    ).one()
+    return (deal_count, deal_updated, row_count, row_max_id)
+
+
+def get_menu_version():
+    """
+    Current deal menu version for this worker.
+
+    Re-reads the group deal fingerprint at most once per check interval; a
+    changed fingerprint drops every document.
+
+    Returns:
+        tuple: (catalog version, group deal fingerprint)
+    """
+    global _fingerprint, _fingerprint_checked_at
+
+    catalog_version = get_catalog_version()
+    now = time.monotonic()
+    if _fingerprint is None or now - _fingerprint_checked_at >= _check_seconds():
+        fingerprint = _read_fingerprint()
+        with _lock:
+            if fingerprint != _fingerprint:
+                _documents.clear()
+                _fingerprint = fingerprint
+            _fingerprint_checked_at = now
+    return (catalog_version, _fingerprint)
+
+
+def _build_documents(deals, version):
+    menus = load_deal_menus(deals)
+    documents = {deal.id: DealMenuDocument(version, deal, menus[deal.id]) for deal in deals}
+    with _lock:
+        # Only publish if nothing invalidated the menus while we were building
+        if version[1] == _fingerprint:
+            _documents.update(documents)
+    return documents
+
+
+def _load_stock_limits(deal_ids):
+    stock_limits = {deal_id: {} for deal_id in deal_ids}
+    if not deal_ids:
+        return stock_limits
+    rows = db.session.query(
+        GroupDealProduct.group_deal_id, GroupDealProduct.product_id, GroupDealProduct.deal_stock_limit
+    ).filter(GroupDealProduct.group_deal_id.in_(list(deal_ids))).all()
+    for group_deal_id, product_id, deal_stock_limit in rows:
+        stock_limits[group_deal_id][product_id] = deal_stock_limit
+    return stock_limits
+
+
+def get_deal_menus(deals, active_only=False):
+    """
+    Serialize deals for the customer endpoints from materialized menu documents.
+
+    Deals in MENU_STATUSES are answered from memory plus one stock query;
+    other deals (drafts shown to admins) are loaded directly.
+
+    Args:
+        deals (list): GroupDeal instances
+        active_only (bool): Skip inactive products
+
+    Returns:
+        list: deal dicts in the order given, each with 'products'
+    """
+    materialized = [deal for deal in deals if deal.status in MENU_STATUSES]
+    documents = {}
+    if materialized:
+        version = get_menu_version()
+        missing = []
+        for deal in materialized:
+            document = _documents.get(deal.id)
+            if document is not None and document.version == version:
+                documents[deal.id] = document
+            else:
+                missing.append(deal)
+        if missing:
+            documents.update(_build_documents(missing, version))
+
+    others = [deal for deal in deals if deal.id not in documents]
+    other_menus = load_deal_menus(others, active_only=active_only)
+    stock_limits = _load_stock_limits(documents.keys())
+
+    now = utc_now()
+    deals_data = []
+    for deal in deals:
+        document = documents.get(deal.id)
+        if document is not None:
+            deals_data.append(document.render(stock_limits[deal.id], active_only, now))
+        else:
+            deal_dict = deal.to_dict()
+            deal_dict['products'] = other_menus[deal.id]
+            deals_data.append(deal_dict)
+    return deals_data
+
+
+def get_deal_pricing(group_deal_id):
+    """
+    Pricing fields of a visible deal's products, from its menu document.
+
+    Builds the document on a miss. A product edit made on another worker can
+    take up to the catalog check interval to show up here; create_order
+    re-prices from the database and rejects a quote_hash that no longer
+    matches, so a lagging quote is never charged.
+
+    Args:
+        group_deal_id (int): Group deal ID
+
+    Returns:
+        dict: {product_id: PricingProduct} for every product in the deal, or
+        None if the deal is missing or not in MENU_STATUSES
+    """
+    version = get_menu_version()
+    document = _documents.get(group_deal_id)
+    if document is None or document.version != version:
+        deal = GroupDeal.query.filter(
+            GroupDeal.id == group_deal_id,
+            GroupDeal.deleted_at.is_(None)
+        ).first()
+        if deal is None or deal.status not in MENU_STATUSES:
+            return None
+        document = _build_documents([deal], version)[deal.id]
+    return document.pricing
+
+
+def rebuild_deal_menu(deal_id):
+    """
+    Rebuild a deal's menu document in this worker (call after committing deal changes).
+
+    The commit changed the group deal fingerprint that every document's version
+    includes, so all of this worker's documents are dropped: this deal's is
+    rebuilt now, the others on their next request.
+    """
+    global _fingerprint
+    with _lock:
+        _documents.clear()
+        # Re-read the fingerprint on the next version check
+        _fingerprint = None
+
+    deal = GroupDeal.query.filter(
+        GroupDeal.id == deal_id,
+        GroupDeal.deleted_at.is_(None)
+    ).first()
+    if deal is not None and deal.status in MENU_STATUSES:
+        _build_documents([deal], get_menu_version())
@@ -0,0 +1,125 @@
+"""
+Duplicate order report: users with more than one live order in a group deal.
+
+One window-function query (COUNT(*) OVER (PARTITION BY user_id, group_deal_id))
+returns just the ids of orders in duplicate sets. Sets are then hydrated in
+batches with a fixed number of IN queries per batch (orders, users with roles,
+and OrderHydrator's items / deals / products / addresses), so the report costs
+the same handful of queries however large the deal is. The streaming mode
+hydrates and emits one batch at a time instead of building the whole report.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+
+from models import db
+from models.order import Order
+from models.user import User
+from constants.status_enums import OrderStatus
+from utils.order_hydration import OrderHydrator
+
+
+def find_duplicate_sets(group_deal_id=None):
+    """
+    Group the ids of duplicate orders by (user_id, group_deal_id).
+
+    Args:
+        group_deal_id (int, optional): Only look at this group deal
+
+    Returns:
+        list: [(user_id, group_deal_id, [order_id, ...]), ...], orders oldest first
+    """
+    filters = [Order.deleted_at.is_(None), Order.status != OrderStatus.CANCELLED.value]
+    if group_deal_id:
+        filters.append(Order.group_deal_id == group_deal_id)
+
+    ranked = select(
+        Order.id,
+        Order.user_id,
+        Order.group_deal_id,
+        Order.created_at,
+        func.count(Order.id).over(partition_by=(Order.user_id, Order.group_deal_id)).label('set_size')
+    ).where(*filters).subquery()
+
+    rows = db.session.execute(
+        select(ranked.c.id, ranked.c.user_id, ranked.c.group_deal_id)
+        .where(ranked.c.set_size > 1)
+        .order_by(ranked.c.group_deal_id, ranked.c.user_id, ranked.c.created_at, ranked.c.id)
+    ).all()
+
+    sets = []
+    for order_id, user_id, deal_id in rows:
+        if not sets or sets[-1][:2] != (user_id, deal_id):
+            sets.append((user_id, deal_id, []))
+        sets[-1][2].append(order_id)
+    return sets
+
+
+def batch_duplicate_sets(sets, max_orders):
+    """Split sets into consecutive batches of at most max_orders orders (a set is never split)"""
+    batch, batch_orders = [], 0
+    for duplicate_set in sets:
+        if batch and batch_orders + len(duplicate_set[2]) > max_orders:
+            yield batch
+            batch, batch_orders = [], 0
+        batch.append(duplicate_set)
+        batch_orders += len(duplicate_set[2])
+    if batch:
+        yield batch
+
+
+def hydrate_duplicate_sets(sets):
+    """
+    Serialize duplicate sets with batched loading.
+
+    Args:
+        sets (list): Output (or a batch) of find_duplicate_sets()
+
+    Returns:
+        list: [{'user', 'group_deal', 'orders', 'order_count'}, ...]
+    """
+    order_ids = [order_id for _, _, ids in sets for order_id in ids]
+    if not order_ids:
+        return []
+
+    orders = {order.id: order for order in Order.query.filter(Order.id.in_(order_ids)).all()}
+    users = {
+        user.id: user for user in User.query.options(selectinload(User.roles)).filter(
+            User.id.in_({user_id for user_id, _, _ in sets})
+        ).all()
+    }
+    hydrator = OrderHydrator(list(orders.values())).load()
+
+    duplicate_sets = []
+    for user_id, deal_id, ids in sets:
+        orders_data = []
+        for order_id in ids:
+            order = orders.get(order_id)
+            if order is None:
+                continue
+            order_dict = order.to_dict()
+
+            items_data = []
+            for item in hydrator.items_by_order.get(order.id, []):
+                item_dict = item.to_dict()
+                product = hydrator.products.get(item.product_id)
+                if product:
+                    item_dict['product'] = hydrator.serialize_product(product)
+                items_data.append(item_dict)
+            order_dict['items'] = items_data
+
+            if order.address_id:
+                address = hydrator.addresses.get(order.address_id)
+                if address:
+                    order_dict['address'] = address.to_dict()
+
+            orders_data.append(order_dict)
+
+        user = users.get(user_id)
+        group_deal = hydrator.group_deals.get(deal_id)
+        duplicate_sets.append({
+            'user': user.to_dict() if user else None,
+            'group_deal': group_deal.to_dict() if group_deal else None,
+            'orders': orders_data,
+            'order_count': len(ids)
+        })
+    return duplicate_sets
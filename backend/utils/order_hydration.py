@@ -0,0 +1,199 @@
+"""
+Batched order serialization helpers.
+
+Serializing orders one at a time costs a GroupDeal query per order, a Product
+query per item and an Address query per delivery order. OrderHydrator loads
+everything a page of orders needs up front in a fixed number of IN queries
+(items, deals, products, addresses) and then builds response dicts from memory.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db
+from models.base import est_now
+from constants.status_enums import OrderStatus
+from utils.order_lifecycle import get_effective_order_status
+
+
+@contextmanager
+def count_queries():
+    """
+    Count SQL statements issued by the current thread inside the block.
+
+    Adds and removes an engine-wide event listener, so it is for tests only;
+    never use it on a request path.
+
+    Yields:
+        dict: Counter dict; read counter['count'] after the block
+    """
+    counter = {'count': 0}
+    thread_id = threading.get_ident()
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread_id:
+            counter['count'] += 1
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+def serialize_group_deal_summary(group_deal):
+    """Group deal fields embedded in customer order responses"""
+    return {
+        'id': group_deal.id,
+        'title': group_deal.title,
+        'description': group_deal.description,
+        'pickup_date': group_deal.pickup_date.isoformat() if group_deal.pickup_date else None,
+        'order_start_date': group_deal.order_start_date.isoformat() if group_deal.order_start_date else None,
+        'order_end_date': group_deal.order_end_date.isoformat() if group_deal.order_end_date else None,
+        'status': group_deal.status
+    }
+
+
+class OrderHydrator:
+    """
+    Batch-load related rows for a list of orders and serialize them.
+
+    Usage:
+        hydrator = OrderHydrator(orders)
+        orders_data = [hydrator.serialize(order) for order in orders]
+
+    Loading is independent of the number of orders: at most four queries
+    (items, group deals, products, addresses). With count_queries=True (tests
+    only), query_count reports how many statements load() issued so tests can
+    assert it stays constant.
+
+    Callers that already hold the related rows (e.g. create_order) can pass
+    them in as {id: row} dicts; only ids missing from those dicts are queried.
+    """
+
+    def __init__(self, orders, include_product_description=False, include_address=True,
+                 group_deals=None, products=None, addresses=None, count_queries=False):
+        self.orders = [order for order in orders if order is not None]
+        self.include_product_description = include_product_description
+        self.include_address = include_address
+        self.items_by_order = {}
+        self.group_deals = dict(group_deals or {})
+        self.products = dict(products or {})
+        self.addresses = dict(addresses or {})
+        self.count_queries = count_queries
+        self.query_count = None
+        self.now = est_now()
+        self._loaded = False
+
+    def load(self):
+        """Load items, group deals, products and addresses for all orders"""
+        if self._loaded:
+            return self
+
+        from models.order import OrderItem
+        from models.groupdeal import GroupDeal
+        from models.product import Product
+        from models.address import Address
+
+        counting = count_queries() if self.count_queries else nullcontext({'count': None})
+        with counting as counter:
+            order_ids = [order.id for order in self.orders]
+
+            items_by_order = defaultdict(list)
+            if order_ids:
+                items = OrderItem.query.filter(
+                    OrderItem.order_id.in_(order_ids)
+                ).order_by(OrderItem.id).all()
+                for item in items:
+                    items_by_order[item.order_id].append(item)
+            for order in self.orders:
+                order_items = items_by_order.get(order.id, [])
+                # Populate the relationship so order.items does not lazy-load per order
+                set_committed_value(order, 'items', order_items)
+                self.items_by_order[order.id] = order_items
+
+            deal_ids = {order.group_deal_id for order in self.orders if order.group_deal_id} - set(self.group_deals)
+            if deal_ids:
+                deals = GroupDeal.query.filter(
+                    GroupDeal.id.in_(deal_ids),
+                    GroupDeal.deleted_at.is_(None)
+                ).all()
+                self.group_deals.update({deal.id: deal for deal in deals})
+            for order in self.orders:
+                # Order.to_dict reads order.group_deal; avoid a lazy load per order
+                set_committed_value(order, 'group_deal', self.group_deals.get(order.group_deal_id))
+
+            product_ids = {
+                item.product_id for items in self.items_by_order.values() for item in items
+            } - set(self.products)
+            if product_ids:
+                products = Product.query.filter(Product.id.in_(product_ids)).all()
+                self.products.update({product.id: product for product in products})
+
+            if self.include_address:
+                address_ids = {order.address_id for order in self.orders if order.address_id} - set(self.addresses)
+                if address_ids:
+                    addresses = Address.query.filter(Address.id.in_(address_ids)).all()
+                    self.addresses.update({address.id: address for address in addresses})
+
+        self.query_count = counter['count']
+        self._loaded = True
+        return self
+
+    def get_group_deal(self, order):
+        self.load()
+        return self.group_deals.get(order.group_deal_id)
+
+    def serialize_product(self, product):
+        data = {
+            'id': product.id,
+            'name': product.name,
+            'image': product.image,
+            'pricing_type': product.pricing_type,
+            'pricing_data': product.pricing_data
+        }
+        if self.include_product_description:
+            data['description'] = product.description
+        return data
+
+    def serialize(self, order):
+        """
+        Build the customer-facing order dict (group deal, items with products, address).
+
+        Args:
+            order (Order): One of the orders passed to the hydrator
+
+        Returns:
+            dict: Serialized order
+        """
+        self.load()
+        order_dict = order.to_dict()
+
+        group_deal = self.group_deals.get(order.group_deal_id)
+        if group_deal:
+            order_dict['group_deal'] = serialize_group_deal_summary(group_deal)
+            # Report the effective status instead of writing it during a read
+            effective_status = get_effective_order_status(order, group_deal, self.now)
+            order_dict['status'] = effective_status
+            # User can only edit/cancel when order status is 'submitted'
+            order_dict['is_editable'] = effective_status == OrderStatus.SUBMITTED.value
+
+        items_data = []
+        for item in self.items_by_order.get(order.id, []):
+            item_dict = item.to_dict()
+            product = self.products.get(item.product_id)
+            if product:
+                item_dict['product'] = self.serialize_product(product)
+            items_data.append(item_dict)
+        order_dict['items'] = items_data
+
+        if self.include_address and order.address_id:
+            address = self.addresses.get(order.address_id)
+            if address:
+                order_dict['address'] = address.to_dict()
+
+        return order_dict
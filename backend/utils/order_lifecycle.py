@@ -0,0 +1,226 @@
+"""
+Order status transitions driven by group deal lifecycle.
+
+Customer reads never write: a submitted order whose group deal has passed
+order_end_date is reported with an effective status of 'confirmed' and the
+stored row is moved by the cron job (or a deal status change) with one
+set-based UPDATE instead of per-order commits inside GET handlers.
+
+Admin bulk status changes run the same way in bounded chunks, and every
+admin status change is appended to order_status_logs.
+"""
+from models import db
+from models.base import est_now
+from constants.status_enums import OrderStatus, GroupDealStatus
+
+
+# Deal status -> (order statuses that move, target order status)
+DEAL_STATUS_ORDER_CASCADE = {
+    GroupDealStatus.CLOSED.value: (
+        [OrderStatus.SUBMITTED.value],
+        OrderStatus.CONFIRMED.value
+    ),
+    GroupDealStatus.PREPARING.value: (
+        [OrderStatus.SUBMITTED.value, OrderStatus.CONFIRMED.value],
+        OrderStatus.PREPARING.value
+    ),
+    GroupDealStatus.READY_FOR_PICKUP.value: (
+        [OrderStatus.SUBMITTED.value, OrderStatus.CONFIRMED.value, OrderStatus.PREPARING.value],
+        OrderStatus.READY_FOR_PICKUP.value
+    ),
+}
+
+
+def get_effective_order_status(order, group_deal, now=None):
+    """
+    Get the status an order should be shown with, without writing it.
+
+    Args:
+        order (Order): Order to evaluate
+        group_deal (GroupDeal): The order's group deal (may be None)
+        now (datetime, optional): Current time, defaults to est_now()
+
+    Returns:
+        str: Effective order status
+    """
+    if order.status != OrderStatus.SUBMITTED.value or group_deal is None:
+        return order.status
+    if now is None:
+        now = est_now()
+    if group_deal.order_end_date and group_deal.order_end_date < now:
+        return OrderStatus.CONFIRMED.value
+    return order.status
+
+
+def confirm_expired_orders(now=None):
+    """
+    Confirm every submitted order whose group deal has passed order_end_date.
+
+    Runs one SELECT for the affected rows (for reporting) and one set-based
+    UPDATE. Caller commits.
+
+    Args:
+        now (datetime, optional): Cut-off time, defaults to est_now()
+
+    Returns:
+        list: [{'order_id', 'order_number', 'user_id', 'group_deal_id'}, ...]
+    """
+    from models.order import Order
+    from models.groupdeal import GroupDeal
+
+    if now is None:
+        now = est_now()
+
+    expired_deal_ids = [
+        deal_id for (deal_id,) in db.session.query(GroupDeal.id).filter(
+            GroupDeal.order_end_date < now,
+            GroupDeal.deleted_at.is_(None)
+        ).all()
+    ]
+    if not expired_deal_ids:
+        return []
+
+    rows = db.session.query(
+        Order.id, Order.order_number, Order.user_id, Order.group_deal_id
+    ).filter(
+        Order.status == OrderStatus.SUBMITTED.value,
+        Order.group_deal_id.in_(expired_deal_ids)
+    ).all()
+    if not rows:
+        return []
+
+    order_ids = [row.id for row in rows]
+    Order.query.filter(
+        Order.id.in_(order_ids),
+        Order.status == OrderStatus.SUBMITTED.value
+    ).update({
+        Order.status: OrderStatus.CONFIRMED.value,
+        Order.updated_at: now
+    }, synchronize_session=False)
+
+    return [{
+        'order_id': row.id,
+        'order_number': row.order_number,
+        'user_id': row.user_id,
+        'group_deal_id': row.group_deal_id
+    } for row in rows]
+
+
+def cascade_group_deal_status(group_deal_id, deal_status, now=None):
+    """
+    Move a deal's orders along with a deal status change in one UPDATE.
+
+    Closing a deal confirms submitted orders; preparing / ready_for_pickup
+    advance earlier statuses. Other deal statuses do not touch orders.
+    Caller commits.
+
+    Args:
+        group_deal_id (int): Group deal ID
+        deal_status (str): New group deal status
+        now (datetime, optional): Timestamp for updated_at
+
+    Returns:
+        int: Number of orders updated
+    """
+    from models.order import Order
+
+    cascade = DEAL_STATUS_ORDER_CASCADE.get(deal_status)
+    if cascade is None:
+        return 0
+    from_statuses, to_status = cascade
+    if now is None:
+        now = est_now()
+
+    return Order.query.filter(
+        Order.group_deal_id == group_deal_id,
+        Order.status.in_(from_statuses)
+    ).update({
+        Order.status: to_status,
+        Order.updated_at: now
+    }, synchronize_session=False)
+
+
+def log_status_changes(changes, to_status, changed_by=None, source='admin', now=None):
+    """
+    Append status changes to order_status_logs with one multi-row INSERT.
+
+    Args:
+        changes (list): [(order_id, from_status), ...]
+        to_status (str): New order status
+        changed_by (int, optional): Admin user ID
+        source (str): 'admin' or 'bulk'
+        now (datetime, optional): Timestamp for the log rows
+    """
+    from sqlalchemy import insert
+    from models.order import OrderStatusLog
+
+    if not changes:
+        return
+    if now is None:
+        now = est_now()
+    db.session.execute(insert(OrderStatusLog), [{
+        'order_id': order_id,
+        'from_status': from_status,
+        'to_status': to_status,
+        'changed_by': changed_by,
+        'source': source,
+        'created_at': now,
+        'updated_at': now
+    } for order_id, from_status in changes])
+
+
+def bulk_set_order_status(filters, to_status, chunk_size, changed_by=None):
+    """
+    Move every order matching filters to to_status in chunks of set-based UPDATEs.
+
+    Each chunk is its own short transaction: lock up to chunk_size matching
+    rows in id order (SELECT ... FOR UPDATE on id/status only), UPDATE them
+    with one statement, log the changes, queue sales stats changes for orders
+    entering or leaving cancelled, and commit. Locks are held for one chunk,
+    never for the whole deal, and orders already in to_status are skipped.
+    Chunks committed before a failure stay committed.
+
+    Args:
+        filters (list): SQLAlchemy filter expressions on Order
+        to_status (str): New order status
+        chunk_size (int): Orders per transaction
+        changed_by (int, optional): Admin user ID for the status log
+
+    Returns:
+        list: IDs of the orders that changed status
+    """
+    from models.order import Order
+    from utils.sales_stats import record_orders_sales
+
+    updated_ids = []
+    last_id = 0
+    while True:
+        rows = db.session.query(Order.id, Order.status, Order.created_at).filter(
+            *filters,
+            Order.status != to_status,
+            Order.id > last_id
+        ).order_by(Order.id).limit(chunk_size).with_for_update().all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        order_ids = [row.id for row in rows]
+        now = est_now()
+
+        Order.query.filter(Order.id.in_(order_ids)).update({
+            Order.status: to_status,
+            Order.updated_at: now
+        }, synchronize_session=False)
+        log_status_changes([(row.id, row.status) for row in rows], to_status, changed_by, 'bulk', now)
+
+        # Cancelled orders stop counting toward sales stats (and count again when un-cancelled)
+        if to_status == OrderStatus.CANCELLED.value:
+            record_orders_sales(rows, sign=-1)
+        else:
+            record_orders_sales([row for row in rows if row.status == OrderStatus.CANCELLED.value])
+
+        db.session.commit()
+        updated_ids.extend(order_ids)
+        if len(rows) < chunk_size:
+            break
+
+    return updated_ids
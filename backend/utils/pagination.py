@@ -0,0 +1,148 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Offset pagination re-scans every skipped row and shifts when rows are inserted
+between requests. These helpers page on a (timestamp, id) pair instead, so
+each page is a bounded index range scan regardless of depth.
+
+cached_count() keeps list totals per filter set for a few seconds so paging
+does not re-run COUNT(*) on every request.
+"""
+import base64
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+
+# Upper bound on distinct filter sets remembered by cached_count()
+COUNT_CACHE_SIZE = 256
+
+# key -> (count, counted_at monotonic)
+_counts = {}
+_counts_lock = threading.Lock()
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client-supplied cursor cannot be decoded"""
+
+
+def encode_cursor(timestamp, row_id):
+    """
+    Encode a (timestamp, id) position as an opaque URL-safe cursor.
+
+    Args:
+        timestamp (datetime): Sort timestamp of the last row returned
+        row_id (int): ID of the last row returned
+
+    Returns:
+        str: Cursor string
+    """
+    raw = f'{timestamp.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Returns:
+        tuple: (datetime, int)
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise InvalidCursorError(f'Invalid cursor: {cursor}') from e
+
+
+def parse_since(value):
+    """
+    Parse an updated_since value: either a cursor or a plain ISO datetime.
+
+    Returns:
+        tuple: (datetime, int) position; a plain datetime maps to id 0
+
+    Raises:
+        InvalidCursorError: If the value is neither
+    """
+    try:
+        return datetime.fromisoformat(value), 0
+    except ValueError:
+        return decode_cursor(value)
+
+
+def apply_keyset(query, timestamp_column, id_column, position, descending=True):
+    """
+    Filter and order a query to continue after a (timestamp, id) position.
+
+    Args:
+        query: SQLAlchemy query
+        timestamp_column: Column sorted on first (e.g. Order.created_at)
+        id_column: Tie-breaker column (e.g. Order.id)
+        position (tuple): (datetime, int) from decode_cursor(), or None for the first page
+        descending (bool): Newest first if True
+
+    Returns:
+        Query with keyset filter and ORDER BY applied
+    """
+    if position is not None:
+        timestamp, row_id = position
+        if descending:
+            query = query.filter(or_(
+                timestamp_column < timestamp,
+                and_(timestamp_column == timestamp, id_column < row_id)
+            ))
+        else:
+            query = query.filter(or_(
+                timestamp_column > timestamp,
+                and_(timestamp_column == timestamp, id_column > row_id)
+            ))
+
+    if descending:
+        return query.order_by(timestamp_column.desc(), id_column.desc())
+    return query.order_by(timestamp_column.asc(), id_column.asc())
+
+
+def fetch_page(query, limit):
+    """
+    Fetch up to limit rows plus one to detect whether another page exists.
+
+    Returns:
+        tuple: (rows, has_more)
+    """
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    return rows[:limit], has_more
+
+
+def cached_count(key, query, id_column, max_age):
+    """
+    COUNT the rows of a query, reusing a recent result for the same key.
+
+    Args:
+        key: Hashable description of the filters (e.g. a tuple of request args)
+        query: Filtered query (ordering and eager loading are ignored)
+        id_column: Column to count (e.g. Order.id)
+        max_age (float): Seconds a previous count stays valid
+
+    Returns:
+        tuple: (count, is_fresh) where is_fresh is False when the value came from the cache
+    """
+    now = time.monotonic()
+    cached = _counts.get(key)
+    if cached is not None and now - cached[1] < max_age:
+        return cached[0], False
+
+    count = query.order_by(None).with_entities(func.count(id_column)).scalar() or 0
+    with _counts_lock:
+        if len(_counts) >= COUNT_CACHE_SIZE:
+            # Drop the oldest entry
+            del _counts[min(_counts, key=lambda k: _counts[k][1])]
+        _counts[key] = (count, now)
+    return count, True
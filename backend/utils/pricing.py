@@ -0,0 +1,404 @@
+"""
+Order pricing engine shared by every order-pricing path.
+
+Each product's pricing_data JSON is compiled once per product version
+(id, updated_at) into an immutable CompiledPricing: weight ranges become
+sorted boundary tuples searched with bisect and every number is a Decimal.
+price_cart() prices a whole cart in one pass; line totals are rounded to
+cents before they are summed, so the order subtotal always equals the sum
+of the stored item totals.
+
+Rules (customer checkout, customer edit, admin edit, weighing and merge):
+- per_item: unit_price = display price, total = unit_price × quantity
+- weight_range: unit_price = price of the range containing final_weight,
+  or of the first range when there is no usable weight; total = unit_price × quantity
+- unit_weight: unit_price = price_per_unit (the rate), total = rate × final_weight,
+  or rate × 1 when there is no usable weight
+- bundled_weight: unit_price = price_per_unit (the rate), total = rate × final_weight,
+  or rate × min_weight when there is no usable weight
+
+build_quote() prices a cart without side effects and signs the result with
+compute_quote_hash(); create_order recomputes the hash to detect price changes
+between quote and submission.
+"""
+import hashlib
+import hmac
+import json
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+
+WEIGHT_BASED_TYPES = ('weight_range', 'unit_weight', 'bundled_weight')
+
+# Default bundle weights used when pricing_data does not specify them
+DEFAULT_MIN_WEIGHT = Decimal('7')
+DEFAULT_MAX_WEIGHT = Decimal('15')
+
+# Compiled pricing per (product_id, updated_at); bounded LRU
+_MAX_COMPILED = 5000
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+PricedLine = namedtuple('PricedLine', [
+    'product_id', 'product', 'quantity', 'unit_price', 'total_price', 'final_weight'
+])
+
+
+def to_decimal(value, default=ZERO):
+    """Convert a JSON/DB number to Decimal without going through float arithmetic"""
+    if value is None:
+        return default
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError, TypeError):
+        return default
+
+
+def to_cents(value):
+    """Round a Decimal amount to cents (half up)"""
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def normalize_weight(final_weight):
+    """
+    Parse a final weight.
+
+    Returns:
+        Decimal or None: Positive weight, or None if missing/invalid/non-positive
+    """
+    if final_weight is None:
+        return None
+    weight = to_decimal(final_weight, default=None)
+    if weight is None or weight <= 0:
+        return None
+    return weight
+
+
+class CompiledPricing:
+    """Immutable, pre-parsed pricing rules for one product version"""
+
+    __slots__ = (
+        'pricing_type', 'display_price', 'price_per_unit', 'min_weight',
+        'first_range_price', 'range_mins', 'range_maxs', 'range_prices'
+    )
+
+    def __init__(self, pricing_type, pricing_data):
+        data = pricing_data if isinstance(pricing_data, dict) else {}
+        ranges = data.get('ranges') or []
+
+        price_per_unit = to_decimal(data.get('price_per_unit'))
+        min_weight = to_decimal(data.get('min_weight'), DEFAULT_MIN_WEIGHT)
+        max_weight = to_decimal(data.get('max_weight'), DEFAULT_MAX_WEIGHT)
+
+        # Mirrors Product.get_display_price()
+        display_price = None
+        if pricing_type == 'per_item' and 'price' in data:
+            display_price = to_decimal(data['price'])
+        elif pricing_type == 'weight_range' and ranges:
+            display_price = to_decimal(ranges[0].get('price'))
+        elif pricing_type == 'unit_weight' and 'price_per_unit' in data:
+            display_price = price_per_unit
+        elif pricing_type == 'bundled_weight' and 'price_per_unit' in data:
+            display_price = price_per_unit * (min_weight + max_weight) / 2
+
+        # Sorted by lower bound for bisect; stable so equal bounds keep stored order
+        bounds = sorted(
+            (
+                (to_decimal(r.get('min')), to_decimal(r.get('max'), default=None), to_decimal(r.get('price')))
+                for r in ranges
+            ),
+            key=lambda bound: bound[0]
+        )
+
+        set_ = object.__setattr__
+        set_(self, 'pricing_type', pricing_type)
+        set_(self, 'display_price', display_price)
+        set_(self, 'price_per_unit', price_per_unit)
+        set_(self, 'min_weight', min_weight)
+        set_(self, 'first_range_price', to_decimal(ranges[0].get('price')) if ranges else ZERO)
+        set_(self, 'range_mins', tuple(bound[0] for bound in bounds))
+        set_(self, 'range_maxs', tuple(bound[1] for bound in bounds))
+        set_(self, 'range_prices', tuple(bound[2] for bound in bounds))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledPricing is immutable')
+
+    def match_range(self, weight):
+        """Price of the weight range containing weight, or None"""
+        index = bisect_right(self.range_mins, weight) - 1
+        if index < 0:
+            return None
+        upper = self.range_maxs[index]
+        if upper is not None and weight >= upper:
+            return None
+        return self.range_prices[index]
+
+    def price(self, quantity, final_weight=None, pricing_type=None):
+        """
+        Price one line.
+
+        Args:
+            quantity (int): Quantity ordered
+            final_weight: Actual weight if known (invalid or non-positive values are ignored)
+            pricing_type (str, optional): Override the product's pricing type
+                (customer carts submit the type they were shown)
+
+        Returns:
+            tuple: (unit_price: Decimal, total_price: Decimal), both rounded to cents
+        """
+        pricing_type = pricing_type or self.pricing_type
+        quantity = Decimal(quantity)
+        weight = normalize_weight(final_weight)
+
+        if pricing_type == 'weight_range':
+            unit_price = None
+            if weight is not None:
+                unit_price = self.match_range(weight)
+            if unit_price is None:
+                unit_price = self.first_range_price
+            total_price = unit_price * quantity
+        elif pricing_type == 'unit_weight':
+            unit_price = self.price_per_unit
+            if weight is not None and unit_price > 0:
+                total_price = unit_price * weight
+            else:
+                total_price = unit_price  # Estimated weight of 1 unit
+        elif pricing_type == 'bundled_weight':
+            unit_price = self.price_per_unit
+            if weight is not None and unit_price > 0:
+                total_price = unit_price * weight
+            elif unit_price > 0:
+                total_price = unit_price * self.min_weight  # Conservative estimate
+            else:
+                total_price = ZERO
+        else:
+            # per_item and unknown types use the display price
+            unit_price = self.display_price if self.display_price is not None else ZERO
+            total_price = unit_price * quantity
+
+        return to_cents(unit_price), to_cents(total_price)
+
+    def price_weighed(self, quantity, final_weight):
+        """
+        Re-price a line after it has been weighed.
+
+        Returns:
+            tuple or None: (unit_price, total_price), or None if the weight does not
+            change the price (not weight-based, no matching range, or no rate)
+        """
+        weight = normalize_weight(final_weight)
+        if weight is None or self.pricing_type not in WEIGHT_BASED_TYPES:
+            return None
+        if self.pricing_type == 'weight_range':
+            if self.match_range(weight) is None:
+                return None
+        elif self.price_per_unit <= 0:
+            return None
+        return self.price(quantity, weight)
+
+
+def _compile(product):
+    return CompiledPricing(product.pricing_type, product.pricing_data)
+
+
+def get_compiled_pricing(product):
+    """
+    Get the compiled pricing for a product, compiling it once per product version.
+
+    Args:
+        product (Product): Product row
+
+    Returns:
+        CompiledPricing
+    """
+    if product.id is None or product.updated_at is None:
+        return _compile(product)
+
+    key = (product.id, product.updated_at)
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+
+    compiled = _compile(product)
+    with _compiled_lock:
+        _compiled[key] = compiled
+        while len(_compiled) > _MAX_COMPILED:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def clear_pricing_cache():
+    """Drop every compiled pricing entry (tests / bulk imports)"""
+    with _compiled_lock:
+        _compiled.clear()
+
+
+def price_line(product, quantity, final_weight=None, pricing_type=None):
+    """
+    Price one line for a product.
+
+    Returns:
+        tuple: (unit_price: Decimal, total_price: Decimal)
+    """
+    return get_compiled_pricing(product).price(quantity, final_weight, pricing_type)
+
+
+def price_cart(lines, products, use_requested_type=False):
+    """
+    Price a whole cart in one pass.
+
+    Args:
+        lines (list): Dicts with 'product_id', 'quantity' and optional
+            'final_weight' / 'pricing_type'
+        products (dict): {product_id: Product} for every line
+        use_requested_type (bool): Honour each line's 'pricing_type' instead of
+            the product's own (customer carts)
+
+    Returns:
+        tuple: (priced_lines: list of PricedLine, subtotal: Decimal)
+    """
+    priced_lines = []
+    subtotal = ZERO
+    for line in lines:
+        product_id = line['product_id']
+        product = products[product_id]
+        quantity = line['quantity']
+        final_weight = line.get('final_weight')
+        pricing_type = line.get('pricing_type') if use_requested_type else None
+
+        unit_price, total_price = price_line(product, quantity, final_weight, pricing_type)
+        weight = normalize_weight(final_weight)
+        priced_lines.append(PricedLine(
+            product_id=product_id,
+            product=product,
+            quantity=quantity,
+            unit_price=unit_price,
+            total_price=total_price,
+            final_weight=weight
+        ))
+        subtotal += total_price
+    return priced_lines, subtotal
+
+
+def total_from_rate(pricing_type, unit_price, quantity, final_weight=None, estimated_total=None):
+    """
+    Recompute a line total from an already-agreed unit price (e.g. when merging orders).
+
+    Weight-based rates are multiplied by the weight; other prices by quantity.
+    Weight-based lines without a weight keep estimated_total if given.
+
+    Returns:
+        Decimal: Line total rounded to cents
+    """
+    unit_price = to_decimal(unit_price)
+    weight = normalize_weight(final_weight)
+    if pricing_type in ('unit_weight', 'bundled_weight'):
+        if weight is not None:
+            return to_cents(unit_price * weight)
+        if estimated_total is not None:
+            return to_cents(to_decimal(estimated_total))
+    return to_cents(unit_price * Decimal(quantity))
+
+
+def compute_quote_hash(group_deal_id, delivery_method, priced_lines, subtotal, shipping_fee):
+    """
+    Sign the priced content of a cart.
+
+    The same inputs always produce the same hash, so a client can send the
+    quote_hash back with POST /api/orders and the server can tell whether the
+    price it is about to charge still matches what was shown.
+
+    Returns:
+        str: Hex HMAC-SHA256 digest
+    """
+    from flask import current_app
+
+    payload = json.dumps({
+        'group_deal_id': group_deal_id,
+        'delivery_method': delivery_method,
+        'lines': [
+            [
+                line.product_id,
+                line.quantity,
+                str(line.unit_price),
+                str(line.total_price),
+                str(line.final_weight) if line.final_weight is not None else None
+            ]
+            for line in priced_lines
+        ],
+        'subtotal': str(subtotal),
+        'shipping_fee': str(to_cents(to_decimal(shipping_fee)))
+    }, sort_keys=True, separators=(',', ':'))
+    secret = current_app.config['SECRET_KEY'].encode('utf-8')
+    return hmac.new(secret, payload.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def build_quote(group_deal_id, items, products, delivery_method):
+    """
+    Price a cart the way create_order would, without locks or writes.
+
+    Args:
+        group_deal_id (int): Group deal ID
+        items (list): Validated cart lines (OrderItemSchema)
+        products (dict): {product_id: Product} for every line
+        delivery_method (str): 'pickup' or 'delivery'
+
+    Returns:
+        dict: Serializable quote including quote_hash
+    """
+    from constants.status_enums import DeliveryMethod
+    from utils.shipping import calculate_shipping_fee, get_free_shipping_subtotal, get_delivery_fee_table
+
+    priced_lines, subtotal = price_cart(items, products, use_requested_type=True)
+    order_items = [{'product': line.product, 'total_price': line.total_price} for line in priced_lines]
+    shipping_fee = calculate_shipping_fee(subtotal, delivery_method, None, order_items)
+    tax = ZERO
+    total = subtotal + tax + shipping_fee
+
+    quote = {
+        'group_deal_id': group_deal_id,
+        'delivery_method': delivery_method,
+        'items': [{
+            'product_id': line.product_id,
+            'quantity': line.quantity,
+            'unit_price': float(line.unit_price),
+            'total_price': float(line.total_price),
+            'final_weight': float(line.final_weight) if line.final_weight is not None else None,
+            'counts_toward_free_shipping': bool(line.product.counts_toward_free_shipping)
+        } for line in priced_lines],
+        'subtotal': float(subtotal),
+        'tax': float(tax),
+        'shipping_fee': float(shipping_fee),
+        'total': float(total),
+        # 1 point per dollar, excluding shipping fee (same as create_order)
+        'points_earned': int(subtotal + tax),
+        'quote_hash': compute_quote_hash(group_deal_id, delivery_method, priced_lines, subtotal, shipping_fee)
+    }
+
+    if delivery_method == DeliveryMethod.DELIVERY.value:
+        table = get_delivery_fee_table()
+        free_shipping_subtotal = get_free_shipping_subtotal(subtotal, order_items)
+        next_tier = table.next_tier(free_shipping_subtotal)
+        free_threshold = table.free_shipping_threshold()
+        quote['shipping'] = {
+            'free_shipping_subtotal': float(free_shipping_subtotal),
+            'next_tier_threshold': float(next_tier[0]) if next_tier else None,
+            'next_tier_fee': float(next_tier[1]) if next_tier else None,
+            'next_tier_shortfall': float(next_tier[0] - free_shipping_subtotal) if next_tier else None,
+            'free_shipping_threshold': float(free_threshold) if free_threshold is not None else None,
+            'free_shipping_shortfall': (
+                float(max(free_threshold - free_shipping_subtotal, ZERO)) if free_threshold is not None else None
+            )
+        }
+
+    return quote
@@ -1,11 +1,211 @@
-"""Utility functions for updating product sales statistics"""
+"""Utility functions for updating product sales statistics
+
+Each daily ProductSalesStats row also stores the product's running totals up to
+and including that day, so any range total is the difference of two rows and
+dashboards never re-aggregate the raw daily history.
+
+Order handlers do not write stats themselves: they queue per-product deltas
+(record_order_sales / record_order_sales_change) which a background thread
+coalesces and writes with multi-row INSERT ... ON DUPLICATE KEY UPDATE.
+Every worker runs its own flusher, so writes are serialized across workers
+with a MySQL named lock (sales_stats_lock()).
+"""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import func, and_, case, event, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from config import Config
 from models import db
 from models.product_sales_stats import ProductSalesStats
 from models.order import Order, OrderItem
-from datetime import datetime, timezone, date
+from models.base import est_now
+from datetime import datetime, timezone, date, timedelta
+
+# (days, today) -> ({product_id: (total_sold, total_orders)}, loaded_at monotonic)
+_totals_cache = {}
+_totals_lock = threading.Lock()
+
+SERIES_GRANULARITIES = ('day', 'week', 'month')
+
+# MySQL named lock held while stats are written (see sales_stats_lock)
+SALES_STATS_LOCK_NAME = 'sales_stats_flush'
+
+@contextmanager
+def sales_stats_lock():
+    """Hold the cross-worker stats write lock for the block
+    
+    A new day row takes its running totals from the product's previous row,
+    read before the upsert. Without the lock, a past-day change carried forward
+    by another worker and committed after that read would be missing from the
+    new row and from every range total after it. The lock lives on its own
+    connection so it is still held when the caller commits; start the stats
+    transaction inside the block.
+    
+    Raises:
+        RuntimeError: If the lock is not acquired within SALES_STATS_LOCK_TIMEOUT_SECONDS
+    """
+    try:
+        timeout = current_app.config.get('SALES_STATS_LOCK_TIMEOUT_SECONDS', Config.SALES_STATS_LOCK_TIMEOUT_SECONDS)
+    except RuntimeError:
+        timeout = Config.SALES_STATS_LOCK_TIMEOUT_SECONDS
+    with db.engine.connect() as connection:
+        acquired = connection.execute(
+            text('SELECT GET_LOCK(:name, :timeout)'), {'name': SALES_STATS_LOCK_NAME, 'timeout': timeout}
+        ).scalar()
+        if acquired != 1:
+            raise RuntimeError(f'Timed out waiting for the {SALES_STATS_LOCK_NAME} lock')
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT RELEASE_LOCK(:name)'), {'name': SALES_STATS_LOCK_NAME})
+
+def _cumulative_at(cutoff, inclusive=True, product_ids=None):
+    """Running totals per product as of a date
+    
+    Reads the latest stats row on or before (or strictly before) the cutoff for
+    each product. The MAX(sale_date) per product is answered from the
+    (product_id, sale_date) index, so the cost does not grow with history.
+    
+    Args:
+        cutoff: date, or None for each product's latest row
+        inclusive: Include rows dated on the cutoff
+        product_ids: Optional iterable restricting the products
+    
+    Returns:
+        dict: {product_id: (cumulative_quantity_sold, cumulative_order_count)}
+    """
+    latest = db.session.query(
+        ProductSalesStats.product_id,
+        func.max(ProductSalesStats.sale_date).label('sale_date')
+    )
+    if cutoff is not None:
+        latest = latest.filter(
+            ProductSalesStats.sale_date <= cutoff if inclusive else ProductSalesStats.sale_date < cutoff
+        )
+    if product_ids is not None:
+        latest = latest.filter(ProductSalesStats.product_id.in_(list(product_ids)))
+    latest = latest.group_by(ProductSalesStats.product_id).subquery()
+    
+    rows = db.session.query(
+        ProductSalesStats.product_id,
+        ProductSalesStats.cumulative_quantity_sold,
+        ProductSalesStats.cumulative_order_count
+    ).join(
+        latest,
+        and_(
+            ProductSalesStats.product_id == latest.c.product_id,
+            ProductSalesStats.sale_date == latest.c.sale_date
+        )
+    ).all()
+    return {product_id: (quantity, orders) for product_id, quantity, orders in rows}
+
+def get_range_totals(start_date, end_date=None, product_ids=None):
+    """Sales per product between two dates (inclusive) from the running totals
+    
+    Args:
+        start_date: First day of the range
+        end_date: Last day of the range, or None for everything since start_date
+        product_ids: Optional iterable restricting the products
+    
+    Returns:
+        dict: {product_id: (total_sold, total_orders)}; products without sales in the range are absent
+    """
+    at_end = _cumulative_at(end_date, inclusive=True, product_ids=product_ids)
+    if not at_end:
+        return {}
+    before_start = _cumulative_at(start_date, inclusive=False, product_ids=product_ids)
+    
+    totals = {}
+    for product_id, (quantity, orders) in at_end.items():
+        base_quantity, base_orders = before_start.get(product_id, (0, 0))
+        if quantity != base_quantity or orders != base_orders:
+            totals[product_id] = (quantity - base_quantity, orders - base_orders)
+    return totals
+
+def _apply_sales_deltas(sale_date, deltas):
+    """Add (or subtract) one day's sales with a single multi-row upsert
+    
+    INSERT ... ON DUPLICATE KEY UPDATE on idx_product_date, so concurrent
+    writers for the same product and day add up instead of racing to insert
+    the row. New rows start from the product's previous running total; later
+    days carry the change forward. Callers hold sales_stats_lock() so that
+    previous total cannot change between the read and the commit.
+    
+    Args:
+        sale_date: Day the sales belong to
+        deltas: {product_id: (quantity_sold, order_count)}; negative values undo sales
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta != (0, 0)}
+    if not deltas:
+        return
+    
+    product_ids = sorted(deltas)
+    baselines = _cumulative_at(sale_date, inclusive=False, product_ids=product_ids)
+    now = est_now()
+    rows = []
+    for product_id in product_ids:
+        quantity, orders = deltas[product_id]
+        base_quantity, base_orders = baselines.get(product_id, (0, 0))
+        rows.append({
+            'product_id': product_id,
+            'sale_date': sale_date,
+            'quantity_sold': quantity,
+            'order_count': orders,
+            'cumulative_quantity_sold': base_quantity + quantity,
+            'cumulative_order_count': base_orders + orders,
+            'created_at': now,
+            'updated_at': now
+        })
+    
+    table = ProductSalesStats.__table__
+    stmt = mysql_insert(table).values(rows)
+    stmt = stmt.on_duplicate_key_update(
+        quantity_sold=table.c.quantity_sold + stmt.inserted.quantity_sold,
+        order_count=table.c.order_count + stmt.inserted.order_count,
+        cumulative_quantity_sold=table.c.cumulative_quantity_sold + stmt.inserted.quantity_sold,
+        cumulative_order_count=table.c.cumulative_order_count + stmt.inserted.order_count,
+        updated_at=stmt.inserted.updated_at
+    )
+    db.session.execute(stmt)
+    
+    # Later days (orders dated in the past) carry the change forward; usually matches no rows
+    db.session.query(ProductSalesStats).filter(
+        ProductSalesStats.product_id.in_(product_ids),
+        ProductSalesStats.sale_date > sale_date
+    ).update({
+        ProductSalesStats.cumulative_quantity_sold: ProductSalesStats.cumulative_quantity_sold + case(
+            {product_id: quantity for product_id, (quantity, _) in deltas.items()},
+            value=ProductSalesStats.product_id
+        ),
+        ProductSalesStats.cumulative_order_count: ProductSalesStats.cumulative_order_count + case(
+            {product_id: orders for product_id, (_, orders) in deltas.items()},
+            value=ProductSalesStats.product_id
+        )
+    }, synchronize_session=False)
+
+def _sale_date(order):
+    # Sales count on the day the order was placed, including later cancels and edits
+    return order.created_at.date() if order.created_at else date.today()
+
+def _order_deltas(items, sign=1):
+    """{product_id: (quantity, 1)} for an order's items; order count goes up once per product"""
+    deltas = {}
+    for item in items:
+        quantity, _ = deltas.get(item['product_id'], (0, 0))
+        deltas[item['product_id']] = (quantity + item['quantity'], 1)
+    return {product_id: (sign * quantity, sign * orders) for product_id, (quantity, orders) in deltas.items()}
 
 def update_product_sales_stats(order):
-    """Update product sales statistics when an order is created/confirmed
+    """Update product sales statistics for an order immediately and commit
+    
+    Request handlers queue changes with record_order_sales() instead; this is
+    for scripts and backfills.
     
     Args:
         order: Order instance with items relationship loaded
@@ -13,45 +213,195 @@ def update_product_sales_stats(order):
     if not order or not order.items:
         return
     
-    # Use order creation date for sale_date
-    sale_date = order.created_at.date() if order.created_at else date.today()
-    
-    # Track products in this order to avoid double-counting order_count
-    products_in_order = set()
-    
-    for item in order.items:
-        product_id = item.product_id
-        quantity = item.quantity
-        
-        # Get or create stats record for this product and date
-        stats = ProductSalesStats.query.filter_by(
-            product_id=product_id,
-            sale_date=sale_date
-        ).first()
-        
-        if not stats:
-            stats = ProductSalesStats(
-                product_id=product_id,
-                sale_date=sale_date,
-                quantity_sold=0,
-                order_count=0
-            )
-            db.session.add(stats)
-        
-        # Update quantity sold
-        stats.quantity_sold += quantity
-        
-        # Update order count (only once per product per order)
-        if product_id not in products_in_order:
-            stats.order_count += 1
-            products_in_order.add(product_id)
-    
-    # Commit changes
+    items = [{'product_id': item.product_id, 'quantity': item.quantity} for item in order.items]
+    
+    with sales_stats_lock():
+        try:
+            _apply_sales_deltas(_sale_date(order), _order_deltas(items))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+    invalidate_sales_totals()
+
+# Aggregation queue: request handlers note sales changes on their session, the
+# changes join the per-worker queue when that transaction commits, and a
+# background thread flushes the coalesced queue every SALES_STATS_FLUSH_SECONDS.
+
+_SESSION_KEY = 'pending_sales_stats'
+
+# (sale_date, product_id) -> [quantity_sold, order_count]
+_pending = {}
+_pending_lock = threading.Lock()
+_flusher = None
+
+def _queue_deltas(sale_date, deltas):
+    pending = db.session.info.setdefault(_SESSION_KEY, {})
+    for product_id, (quantity, orders) in deltas.items():
+        entry = pending.setdefault((sale_date, product_id), [0, 0])
+        entry[0] += quantity
+        entry[1] += orders
+    _ensure_flusher(current_app._get_current_object())
+
+def record_order_sales(order, items=None, sign=1):
+    """Queue an order's sales (sign=1) or their removal (sign=-1, cancel/delete)
+    
+    Applied by the background flusher once the current transaction commits;
+    dropped if it rolls back.
+    
+    Args:
+        order: Order instance (created_at decides the day)
+        items: Optional list of dicts with 'product_id' and 'quantity' (defaults to order.items)
+        sign: 1 to add the order's sales, -1 to remove them
+    """
+    if items is None:
+        items = [{'product_id': item.product_id, 'quantity': item.quantity} for item in order.items]
+    if items:
+        _queue_deltas(_sale_date(order), _order_deltas(items, sign))
+
+def record_orders_sales(orders, sign=1):
+    """record_order_sales() for many orders, loading their items with one query"""
+    orders = list(orders)
+    if not orders:
+        return
+    items_by_order = {}
+    rows = db.session.query(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity).filter(
+        OrderItem.order_id.in_([order.id for order in orders])
+    ).all()
+    for order_id, product_id, quantity in rows:
+        items_by_order.setdefault(order_id, []).append({'product_id': product_id, 'quantity': quantity})
+    for order in orders:
+        record_order_sales(order, items_by_order.get(order.id, []), sign)
+
+def record_order_sales_change(order, old_items, new_items):
+    """Queue the difference between an order's old and new items
+    
+    Args:
+        order: Order instance (created_at decides the day)
+        old_items / new_items: Lists of dicts with 'product_id' and 'quantity'
+    """
+    old = _order_deltas(old_items)
+    new = _order_deltas(new_items)
+    deltas = {}
+    for product_id in set(old) | set(new):
+        old_quantity, old_orders = old.get(product_id, (0, 0))
+        new_quantity, new_orders = new.get(product_id, (0, 0))
+        if (new_quantity, new_orders) != (old_quantity, old_orders):
+            deltas[product_id] = (new_quantity - old_quantity, new_orders - old_orders)
+    if deltas:
+        _queue_deltas(_sale_date(order), deltas)
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_on_commit(session):
+    pending = session.info.pop(_SESSION_KEY, None)
+    if pending:
+        _merge_pending(pending)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+def _merge_pending(pending):
+    with _pending_lock:
+        for key, (quantity, orders) in pending.items():
+            entry = _pending.setdefault(key, [0, 0])
+            entry[0] += quantity
+            entry[1] += orders
+
+def flush_sales_stats():
+    """Write every queued sales change in one transaction (one upsert per sale date)
+    
+    Returns:
+        int: Number of (day, product) rows written
+    """
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return 0
+    
+    by_date = {}
+    for (sale_date, product_id), (quantity, orders) in pending.items():
+        by_date.setdefault(sale_date, {})[product_id] = (quantity, orders)
+    
     try:
-        db.session.commit()
-    except Exception as e:
+        with sales_stats_lock():
+            for sale_date in sorted(by_date):
+                _apply_sales_deltas(sale_date, by_date[sale_date])
+            db.session.commit()
+    except Exception:
         db.session.rollback()
-        raise e
+        # Keep the changes for the next flush
+        _merge_pending(pending)
+        raise
+    invalidate_sales_totals()
+    return len(pending)
+
+def _flush_loop(app):
+    interval = app.config.get('SALES_STATS_FLUSH_SECONDS', Config.SALES_STATS_FLUSH_SECONDS)
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                flush_sales_stats()
+            except Exception as e:
+                app.logger.warning(f'Failed to flush sales stats: {e}', exc_info=True)
+
+def _flush_at_exit(app):
+    with app.app_context():
+        try:
+            flush_sales_stats()
+        except Exception as e:
+            app.logger.warning(f'Failed to flush sales stats at exit: {e}')
+
+def _ensure_flusher(app):
+    """Start this worker's flusher thread on first use (after any fork)"""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _pending_lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(target=_flush_loop, args=(app,), name='sales-stats-flusher', daemon=True)
+        _flusher.start()
+        atexit.register(_flush_at_exit, app)
+
+def invalidate_sales_totals():
+    """Drop cached per-product sales totals in this worker (call after committing stats changes)"""
+    with _totals_lock:
+        _totals_cache.clear()
+
+def get_sales_totals(days):
+    """Get every product's sales totals for the last N days from the running totals
+    
+    Results are cached per (days, today) for SALES_TOTALS_TTL_SECONDS; the worker
+    that records an order drops its copy immediately.
+    
+    Args:
+        days: Number of days to look back
+    
+    Returns:
+        dict: {product_id: (total_sold, total_orders)}; products without sales are absent
+    """
+    today = date.today()
+    key = (days, today)
+    try:
+        ttl = current_app.config.get('SALES_TOTALS_TTL_SECONDS', Config.SALES_TOTALS_TTL_SECONDS)
+    except RuntimeError:
+        ttl = Config.SALES_TOTALS_TTL_SECONDS
+    
+    cached = _totals_cache.get(key)
+    if cached is not None and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+    
+    totals = get_range_totals(today - timedelta(days=days))
+    
+    with _totals_lock:
+        # Yesterday's keys can never be hit again
+        for stale_key in [k for k in _totals_cache if k[1] != today]:
+            del _totals_cache[stale_key]
+        _totals_cache[key] = (totals, time.monotonic())
+    return totals
 
 def get_product_sales_by_date_range(product_id, start_date, end_date):
     """Get aggregated sales for a product within date range
@@ -64,8 +414,6 @@ def get_product_sales_by_date_range(product_id, start_date, end_date):
     Returns:
         dict with total_quantity_sold, total_order_count, and daily_breakdown
     """
-    from sqlalchemy import and_
-    
     stats = ProductSalesStats.query.filter(
         and_(
             ProductSalesStats.product_id == product_id,
@@ -74,8 +422,13 @@ def get_product_sales_by_date_range(product_id, start_date, end_date):
         )
     ).order_by(ProductSalesStats.sale_date.desc()).all()
     
-    total_quantity = sum(s.quantity_sold for s in stats)
-    total_orders = sum(s.order_count for s in stats)
+    total_quantity = 0
+    total_orders = 0
+    if stats:
+        # Latest running total minus the running total before the earliest day in range
+        latest, earliest = stats[0], stats[-1]
+        total_quantity = latest.cumulative_quantity_sold - (earliest.cumulative_quantity_sold - earliest.quantity_sold)
+        total_orders = latest.cumulative_order_count - (earliest.cumulative_order_count - earliest.order_count)
     
     return {
         'total_quantity_sold': total_quantity,
@@ -93,28 +446,70 @@ def get_popular_products(days=30, limit=10):
     Returns:
         List of tuples: (product_id, total_sold)
     """
-    from sqlalchemy import func, desc
-    from datetime import timedelta
-    from models.product import Product
+    totals = get_sales_totals(days)
+    popular = sorted(totals.items(), key=lambda entry: entry[1][0], reverse=True)[:limit]
+    return [(product_id, total_sold) for product_id, (total_sold, _) in popular]
+
+def _bucket_end(day, granularity):
+    """Last day of the day/week (Monday-Sunday)/month bucket containing `day`"""
+    if granularity == 'week':
+        return day + timedelta(days=6 - day.weekday())
+    if granularity == 'month':
+        next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return next_month - timedelta(days=1)
+    return day
+
+def get_sales_time_series(product_id, start_date, end_date, granularity='day'):
+    """Sales for one product bucketed by day, week or month
     
-    start_date = date.today() - timedelta(days=days)
+    Each bucket is the difference of two running totals, so the work per
+    bucket is constant; empty buckets are returned with zeros.
     
-    # Aggregate sales stats
-    popular = db.session.query(
-        ProductSalesStats.product_id,
-        func.sum(ProductSalesStats.quantity_sold).label('total_sold')
+    Args:
+        product_id: Product ID
+        start_date: First day (date object); the first bucket is clipped to it
+        end_date: Last day (date object); the last bucket is clipped to it
+        granularity: One of SERIES_GRANULARITIES
+    
+    Returns:
+        list of dicts with period_start, period_end, quantity_sold and order_count
+    """
+    if granularity not in SERIES_GRANULARITIES:
+        raise ValueError(f'Unsupported granularity: {granularity}')
+    
+    rows = db.session.query(
+        ProductSalesStats.sale_date,
+        ProductSalesStats.quantity_sold,
+        ProductSalesStats.order_count,
+        ProductSalesStats.cumulative_quantity_sold,
+        ProductSalesStats.cumulative_order_count
     ).filter(
-        ProductSalesStats.sale_date >= start_date
-    ).group_by(
-        ProductSalesStats.product_id
-    ).order_by(
-        desc('total_sold')
-    ).limit(limit).all()
+        ProductSalesStats.product_id == product_id,
+        ProductSalesStats.sale_date >= start_date,
+        ProductSalesStats.sale_date <= end_date
+    ).order_by(ProductSalesStats.sale_date.asc()).all()
     
-    return [(product_id, int(total_sold)) for product_id, total_sold in popular]
-
-
-
-
-
-
+    # Running totals just before the range (zero if there are no rows)
+    previous = (0, 0)
+    if rows:
+        previous = (rows[0].cumulative_quantity_sold - rows[0].quantity_sold,
+                    rows[0].cumulative_order_count - rows[0].order_count)
+    
+    buckets = []
+    index = 0
+    bucket_start = start_date
+    while bucket_start <= end_date:
+        bucket_end = min(_bucket_end(bucket_start, granularity), end_date)
+        current = previous
+        while index < len(rows) and rows[index].sale_date <= bucket_end:
+            current = (rows[index].cumulative_quantity_sold, rows[index].cumulative_order_count)
+            index += 1
+        buckets.append({
+            'period_start': bucket_start.isoformat(),
+            'period_end': bucket_end.isoformat(),
+            'quantity_sold': current[0] - previous[0],
+            'order_count': current[1] - previous[1]
+        })
+        previous = current
+        bucket_start = bucket_end + timedelta(days=1)
+    return buckets
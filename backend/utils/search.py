@@ -0,0 +1,146 @@
+"""
+Indexed admin search over orders and users.
+
+Every lookup here is an index seek instead of a leading-wildcard LIKE:
+
+- Pickup codes (last segment of the order number) are stored in
+  orders.pickup_code, so QR scans are an equality seek.
+- Phone numbers are matched by prefix on users.phone and by suffix on
+  users.phone_reversed (digits reversed, so "ends with 1234" becomes
+  "phone_reversed LIKE '4321%'").
+- Nickname, email and WeChat ID substrings go through user_search_tokens:
+  every 1-3 character gram of those fields (NFKC, lowercased), which also
+  covers CJK nicknames that have no word boundaries. Terms of up to three
+  characters are one token seek; longer terms intersect their trigrams and
+  the few candidates are then checked with the original LIKE.
+
+Tokens are rewritten in the same flush as the user row by the listener next
+to the models (models/user.py), so the index never lags behind a committed
+change. Search terms are escaped, so '%' and '_' match literally.
+"""
+from sqlalchemy import delete, func, insert, or_, select
+
+from models import db
+from models.order import Order
+from models.user import (
+    TOKEN_FIELDS, TOKEN_LENGTH, User, UserSearchToken, normalize_text, phone_digits, text_grams, tokens_for_values
+)
+
+
+# Digits a search term needs before the order search also matches customer phones
+ORDER_SEARCH_MIN_PHONE_DIGITS = 4
+
+
+def escape_like(value):
+    """Escape LIKE wildcards and the backslash escape character so user input matches literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _user_token_rows(user_id, values):
+    return [{'user_id': user_id, 'token': token} for token in tokens_for_values(values)]
+
+
+def rebuild_user_search_tokens(connection, batch_size=500):
+    """Re-index every user's tokens (after changing TOKEN_FIELDS or the tokenizer)"""
+    connection.execute(delete(UserSearchToken))
+    last_id = 0
+    while True:
+        users = connection.execute(
+            select(User.id, *[getattr(User, field) for field in TOKEN_FIELDS])
+            .where(User.id > last_id)
+            .order_by(User.id)
+            .limit(batch_size)
+        ).all()
+        if not users:
+            return
+        rows = []
+        for user_id, *values in users:
+            rows.extend(_user_token_rows(user_id, values))
+        if rows:
+            connection.execute(insert(UserSearchToken), rows)
+        last_id = users[-1][0]
+
+
+def _token_candidates(term):
+    """
+    Select of user ids whose nickname, email or WeChat ID may contain term.
+
+    Exact for terms of up to three characters; for longer terms every trigram
+    must be present, so the caller still applies the LIKE to the candidates.
+    """
+    text = normalize_text(term)
+    if len(text) <= TOKEN_LENGTH:
+        return select(UserSearchToken.user_id).where(UserSearchToken.token == text)
+    trigrams = text_grams(text, sizes=(TOKEN_LENGTH,))
+    return (
+        select(UserSearchToken.user_id)
+        .where(UserSearchToken.token.in_(trigrams))
+        .group_by(UserSearchToken.user_id)
+        .having(func.count(func.distinct(UserSearchToken.token)) == len(trigrams))
+    )
+
+
+def _phone_user_select(term):
+    """Select of ids of users whose phone starts or ends with the term's digits; None if not a phone number"""
+    digits = phone_digits(term)
+    if not digits or len(digits) != len(''.join(c for c in term if c not in '+-() ')):
+        return None
+    prefix = escape_like(digits)
+    suffix = escape_like(digits[::-1])
+    return select(User.id).where(or_(
+        User.phone.like(f'{prefix}%', escape='\\'),
+        User.phone.like(f'+{prefix}%', escape='\\'),
+        User.phone.like(f'+1{prefix}%', escape='\\'),
+        User.phone_reversed.like(f'{suffix}%', escape='\\')
+    ))
+
+
+def phone_user_ids(term):
+    """
+    Ids of users whose phone number starts (with or without the country code)
+    or ends with the term's digits; None if the term is not a phone number.
+    """
+    user_select = _phone_user_select(term)
+    if user_select is None:
+        return None
+    return set(db.session.scalars(user_select))
+
+
+def search_user_ids(term):
+    """Ids of users matching an admin search: phone prefix/suffix or a nickname/email/WeChat substring"""
+    term = term.strip()
+    like = f'%{escape_like(term)}%'
+    user_ids = set(db.session.scalars(select(User.id).where(
+        User.id.in_(_token_candidates(term)),
+        or_(
+            User.nickname.like(like, escape='\\'),
+            User.email.like(like, escape='\\'),
+            User.wechat.like(like, escape='\\')
+        )
+    )))
+    return user_ids | (phone_user_ids(term) or set())
+
+
+def order_search_clause(term):
+    """
+    Filter for the admin order list: pickup code, order number prefix or the customer's phone.
+
+    Order numbers look like GSF-{YYYYmmddHHMMSS}-{pickup code}; the term may be a
+    (partial) pickup code, the start of the order number with or without the
+    GSF- prefix (e.g. the order date), or a phone number of at least
+    ORDER_SEARCH_MIN_PHONE_DIGITS digits. Matching users are a subquery on the
+    phone indexes, so no id list is sent however many customers match.
+    """
+    term = term.strip()
+    prefix = f'{escape_like(term.upper())}%'
+    clauses = [
+        Order.pickup_code.like(prefix, escape='\\'),
+        Order.order_number.like(prefix, escape='\\'),
+        Order.order_number.like(f'GSF-{prefix}', escape='\\')
+    ]
+    # Shorter digit runs match most customers by prefix or suffix
+    if len(phone_digits(term)) >= ORDER_SEARCH_MIN_PHONE_DIGITS:
+        user_select = _phone_user_select(term)
+        if user_select is not None:
+            clauses.append(Order.user_id.in_(user_select))
+    return or_(*clauses)
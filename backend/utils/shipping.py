@@ -1,8 +1,81 @@
 """
 Shipping fee calculation utilities
+
+The active DeliveryFeeConfig is compiled into a DeliveryFeeTable (sorted
+Decimal thresholds searched with bisect) and kept in memory per worker. The
+table is tagged with the config row's (id, updated_at) and re-checked every
+DELIVERY_FEE_TABLE_REFRESH_SECONDS, so an admin change reaches other workers
+within seconds; the worker that saves the change drops its copy immediately.
 """
+import threading
+import time
+from bisect import bisect_right
 from decimal import Decimal
 
+from config import Config
+
+
+# Used when no active config exists (or it has no tiers)
+DEFAULT_DELIVERY_FEE_TIERS = [
+    {'threshold': 0, 'fee': 7.99},
+    {'threshold': 58.00, 'fee': 5.99},
+    {'threshold': 128.00, 'fee': 3.99},
+    {'threshold': 150.00, 'fee': 0}
+]
+
+_fee_table = None
+_fee_table_checked_at = 0.0
+_fee_table_lock = threading.Lock()
+
+
+class DeliveryFeeTable:
+    """Compiled delivery fee tiers for one config version"""
+
+    __slots__ = ('version', 'tiers', 'thresholds', 'fees')
+
+    def __init__(self, tiers, version=None):
+        self.version = version
+        self.tiers = tiers if tiers is not None else []
+        compiled = sorted(
+            (Decimal(str(tier.get('threshold', 0))), Decimal(str(tier.get('fee', 0))))
+            for tier in (self.tiers or DEFAULT_DELIVERY_FEE_TIERS)
+        )
+        self.thresholds = tuple(threshold for threshold, _ in compiled)
+        self.fees = tuple(fee for _, fee in compiled)
+
+    def fee_for(self, subtotal):
+        """Fee of the highest tier whose threshold is <= subtotal (first tier if none)"""
+        index = bisect_right(self.thresholds, subtotal) - 1
+        return self.fees[max(index, 0)]
+    
+    def next_tier(self, subtotal):
+        """
+        The next cheaper tier above subtotal.
+        
+        Returns:
+            tuple or None: (threshold, fee), or None if already on the cheapest tier
+        """
+        current_fee = self.fee_for(subtotal)
+        for index in range(bisect_right(self.thresholds, subtotal), len(self.thresholds)):
+            if self.fees[index] < current_fee:
+                return self.thresholds[index], self.fees[index]
+        return None
+    
+    def free_shipping_threshold(self):
+        """Lowest threshold with a zero fee, or None if shipping is never free"""
+        for threshold, fee in zip(self.thresholds, self.fees):
+            if fee == 0:
+                return threshold
+        return None
+
+
+def _refresh_seconds():
+    try:
+        from flask import current_app
+        return current_app.config.get('DELIVERY_FEE_TABLE_REFRESH_SECONDS', Config.DELIVERY_FEE_TABLE_REFRESH_SECONDS)
+    except RuntimeError:
+        return Config.DELIVERY_FEE_TABLE_REFRESH_SECONDS
+
 
 def get_delivery_fee_config():
     """
@@ -16,50 +89,68 @@ def get_delivery_fee_config():
     return config
 
 
+def get_delivery_fee_table():
+    """
+    Get the compiled fee table for the active config.
+    
+    Re-reads the config row at most once per refresh interval and only
+    recompiles when its version or tiers changed.
+    
+    Returns:
+        DeliveryFeeTable
+    """
+    global _fee_table, _fee_table_checked_at
+    
+    now = time.monotonic()
+    table = _fee_table
+    if table is not None and now - _fee_table_checked_at < _refresh_seconds():
+        return table
+    
+    from models import db
+    from models.delivery_fee_config import DeliveryFeeConfig
+    row = db.session.query(
+        DeliveryFeeConfig.id, DeliveryFeeConfig.updated_at, DeliveryFeeConfig.tiers
+    ).filter(DeliveryFeeConfig.is_active.is_(True)).first()
+    
+    if row is None:
+        version, tiers = None, DEFAULT_DELIVERY_FEE_TIERS
+    else:
+        version, tiers = (row.id, row.updated_at), row.tiers
+    
+    if table is None or table.version != version or table.tiers != tiers:
+        table = DeliveryFeeTable(tiers, version)
+    with _fee_table_lock:
+        _fee_table = table
+        _fee_table_checked_at = now
+    return table
+
+
+def invalidate_delivery_fee_table():
+    """Drop this worker's fee table so the next lookup reloads it"""
+    global _fee_table
+    with _fee_table_lock:
+        _fee_table = None
+
+
 def get_shipping_fee_for_subtotal(subtotal, config=None):
     """
     Calculate shipping fee based on subtotal and delivery fee config
     
     Args:
         subtotal (Decimal): Order subtotal (excluding products that don't count toward free shipping)
-        config (DeliveryFeeConfig, optional): Delivery fee config. If None, will fetch from DB.
+        config (DeliveryFeeConfig, optional): Delivery fee config. If None, uses the cached active table.
         
     Returns:
         Decimal: Shipping fee amount
     """
+    if not isinstance(subtotal, Decimal):
+        subtotal = Decimal(str(subtotal))
+    
     if config is None:
-        config = get_delivery_fee_config()
-    
-    if not config or not config.tiers:
-        # Fallback to default values if no config found
-        if subtotal >= Decimal('150.00'):
-            return Decimal('0.00')
-        elif subtotal >= Decimal('128.00'):
-            return Decimal('3.99')
-        elif subtotal >= Decimal('58.00'):
-            return Decimal('5.99')
-        else:
-            return Decimal('7.99')
-    
-    # Get tiers sorted by threshold (should already be sorted, but ensure it)
-    tiers = sorted(config.tiers, key=lambda t: t.get('threshold', 0))
-    
-    # Find the appropriate tier (highest threshold that's <= subtotal)
-    applicable_fee = None
-    for tier in tiers:
-        threshold = Decimal(str(tier.get('threshold', 0)))
-        if subtotal >= threshold:
-            applicable_fee = Decimal(str(tier.get('fee', 0)))
-        else:
-            # Since tiers are sorted, we can break early
-            break
-    
-    # If we found a tier, use it; otherwise use the first tier (base fee)
-    if applicable_fee is not None:
-        return applicable_fee
+        table = get_delivery_fee_table()
     else:
-        # This shouldn't happen if tiers[0] has threshold 0, but handle it anyway
-        return Decimal(str(tiers[0].get('fee', 0))) if tiers else Decimal('7.99')
+        table = DeliveryFeeTable(config.tiers, (config.id, config.updated_at))
+    return table.fee_for(subtotal)
 
 # GTA cities (case-insensitive matching)
 GTA_CITIES = {
@@ -112,57 +203,55 @@ def is_gta_address(city):
     return normalized_city in GTA_CITIES
 
 
-def calculate_shipping_fee(subtotal, delivery_method, address=None, order_items=None):
+def get_free_shipping_subtotal(subtotal, order_items=None):
     """
-    Calculate shipping fee based on order details
+    Subtotal that counts toward the free shipping thresholds
     
-    Rules (configurable via DeliveryFeeConfig):
-    - Pickup orders: $0 shipping
-    - Delivery orders: Fee calculated based on subtotal thresholds (configurable in admin)
-    - Default thresholds: < $58: base fee, >= $58: threshold 1 fee, >= $128: threshold 2 fee, >= $150: free
-    
-    Note: Products with counts_toward_free_shipping=False are excluded from subtotal
-    calculation for free shipping threshold determination.
+    Products with counts_toward_free_shipping=False are excluded.
     
     Args:
-        subtotal (Decimal or float): Order subtotal before shipping (full subtotal)
-        delivery_method (str): 'pickup' or 'delivery'
-        address (Address or dict, optional): Delivery address object or dict with 'city' key
-        order_items (list, optional): List of order items with product info. Each item should have:
-            - product_id or product object with counts_toward_free_shipping attribute
-            - total_price or unit_price * quantity
-            
+        subtotal (Decimal or float): Full order subtotal (used when order_items is empty)
+        order_items (list, optional): Items as accepted by calculate_shipping_fee()
+        
     Returns:
-        Decimal: Shipping fee amount
+        Decimal: Subtotal for tier lookup
     """
-    from constants.status_enums import DeliveryMethod
-    
-    # Convert subtotal to Decimal if needed
     if not isinstance(subtotal, Decimal):
         subtotal = Decimal(str(subtotal))
     
-    # Pickup orders have no shipping fee
-    if delivery_method == DeliveryMethod.PICKUP.value:
-        return Decimal('0.00')
-    
-    # Calculate subtotal for free shipping threshold (excluding products that don't count)
     free_shipping_subtotal = subtotal
     if order_items:
         from models.product import Product
         free_shipping_subtotal = Decimal('0.00')
         
+        # Items that only carry a product_id are resolved with one IN query
+        missing_ids = set()
+        for item in order_items:
+            if hasattr(item, 'product'):
+                continue
+            if hasattr(item, 'product_id'):
+                missing_ids.add(item.product_id)
+            elif isinstance(item, dict) and 'product' not in item and 'product_id' in item:
+                missing_ids.add(item['product_id'])
+        products = {}
+        if missing_ids:
+            products = {
+                product.id: product
+                for product in Product.query.filter(Product.id.in_(missing_ids)).all()
+            }
+        
         for item in order_items:
             # Get product to check counts_toward_free_shipping flag
             product = None
             if hasattr(item, 'product'):
                 product = item.product
             elif hasattr(item, 'product_id'):
-                product = Product.query.get(item.product_id)
+                product = products.get(item.product_id)
             elif isinstance(item, dict):
                 if 'product' in item:
                     product = item['product']
                 elif 'product_id' in item:
-                    product = Product.query.get(item['product_id'])
+                    product = products.get(item['product_id'])
             
             # If product doesn't count toward free shipping, exclude it
             if product and not product.counts_toward_free_shipping:
@@ -178,6 +267,45 @@ def calculate_shipping_fee(subtotal, delivery_method, address=None, order_items=
             elif isinstance(item, dict) and 'unit_price' in item and 'quantity' in item:
                 free_shipping_subtotal += Decimal(str(item['unit_price'])) * Decimal(str(item['quantity']))
     
+    return free_shipping_subtotal
+
+
+def calculate_shipping_fee(subtotal, delivery_method, address=None, order_items=None):
+    """
+    Calculate shipping fee based on order details
+    
+    Rules (configurable via DeliveryFeeConfig):
+    - Pickup orders: $0 shipping
+    - Delivery orders: Fee calculated based on subtotal thresholds (configurable in admin)
+    - Default thresholds: < $58: base fee, >= $58: threshold 1 fee, >= $128: threshold 2 fee, >= $150: free
+    
+    Note: Products with counts_toward_free_shipping=False are excluded from subtotal
+    calculation for free shipping threshold determination.
+    
+    Args:
+        subtotal (Decimal or float): Order subtotal before shipping (full subtotal)
+        delivery_method (str): 'pickup' or 'delivery'
+        address (Address or dict, optional): Delivery address object or dict with 'city' key
+        order_items (list, optional): List of order items with product info. Each item should have:
+            - product_id or product object with counts_toward_free_shipping attribute
+            - total_price or unit_price * quantity
+            
+    Returns:
+        Decimal: Shipping fee amount
+    """
+    from constants.status_enums import DeliveryMethod
+    
+    # Convert subtotal to Decimal if needed
+    if not isinstance(subtotal, Decimal):
+        subtotal = Decimal(str(subtotal))
+    
+    # Pickup orders have no shipping fee
+    if delivery_method == DeliveryMethod.PICKUP.value:
+        return Decimal('0.00')
+    
+    # Calculate subtotal for free shipping threshold (excluding products that don't count)
+    free_shipping_subtotal = get_free_shipping_subtotal(subtotal, order_items)
+    
     # Calculate shipping fee based on subtotal using dynamic config
     # Note: Currently all regions use the same fee structure
     # The GTA check is kept for potential future use
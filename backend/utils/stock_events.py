@@ -0,0 +1,179 @@
+"""
+Live deal stock: a short-TTL snapshot and change notifications for SSE streams.
+
+GET /api/group-deals/<id>/stock answers from a per-worker snapshot of
+product_id -> deal_stock_limit that lives for DEAL_STOCK_TTL_SECONDS.
+
+Stock writes in utils/stock_management.py record the deal they touched on the
+session (note_stock_change); once the transaction commits the deal is
+published to this worker's subscribers, which re-read the snapshot and push
+only the products whose stock changed. Streams also re-read on a timer, so
+changes committed by other workers reach them within
+DEAL_STOCK_STREAM_POLL_SECONDS.
+"""
+import json
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import db
+from models.groupdeal import GroupDeal, GroupDealProduct
+
+
+# group_deal_id -> (stock dict, loaded_at monotonic)
+_snapshots = {}
+# group_deal_id -> change counter, bumped on every committed stock change
+_change_counters = {}
+_changed = threading.Condition()
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+_SESSION_KEY = 'stock_changed_deals'
+
+
+def _setting(name):
+    try:
+        return current_app.config.get(name, getattr(Config, name))
+    except RuntimeError:
+        return getattr(Config, name)
+
+
+def note_stock_change(group_deal_id):
+    """Record that the current transaction changed stock for a deal (published on commit)"""
+    db.session.info.setdefault(_SESSION_KEY, set()).add(group_deal_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_on_commit(session):
+    deal_ids = session.info.pop(_SESSION_KEY, None)
+    if deal_ids:
+        publish_stock_change(deal_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def publish_stock_change(deal_ids):
+    """Drop cached snapshots and wake this worker's streams for the given deals"""
+    with _changed:
+        for group_deal_id in deal_ids:
+            _snapshots.pop(group_deal_id, None)
+            _change_counters[group_deal_id] = _change_counters.get(group_deal_id, 0) + 1
+        _changed.notify_all()
+
+
+def _load_stock(group_deal_id):
+    exists = db.session.query(GroupDeal.id).filter(
+        GroupDeal.id == group_deal_id,
+        GroupDeal.deleted_at.is_(None)
+    ).first()
+    if exists is None:
+        return None
+    rows = db.session.query(GroupDealProduct.product_id, GroupDealProduct.deal_stock_limit).filter(
+        GroupDealProduct.group_deal_id == group_deal_id
+    ).all()
+    return {product_id: deal_stock_limit for product_id, deal_stock_limit in rows}
+
+
+def get_stock_snapshot(group_deal_id, max_age=None):
+    """
+    Remaining stock for every product in a deal.
+
+    Args:
+        group_deal_id: ID of the group deal
+        max_age (float): Oldest acceptable snapshot in seconds (defaults to DEAL_STOCK_TTL_SECONDS)
+
+    Returns:
+        dict or None: {product_id: deal_stock_limit} (None = unlimited), or None if the deal does not exist
+    """
+    if max_age is None:
+        max_age = _setting('DEAL_STOCK_TTL_SECONDS')
+
+    cached = _snapshots.get(group_deal_id)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < max_age:
+        return cached[0]
+
+    stock = _load_stock(group_deal_id)
+    if stock is not None:
+        _snapshots[group_deal_id] = (stock, now)
+    return stock
+
+
+def acquire_stream_slot():
+    """Reserve one of this worker's DEAL_STOCK_STREAM_LIMIT stream slots; False if all are taken"""
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= _setting('DEAL_STOCK_STREAM_LIMIT'):
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_stream_slot():
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+
+def _sse(event_name, data):
+    return f'event: {event_name}\ndata: {json.dumps(data, sort_keys=True)}\n\n'
+
+
+def stream_stock_events(group_deal_id, initial_stock):
+    """
+    Generate server-sent events for a deal's stock.
+
+    Sends a 'snapshot' event with every product, then 'stock' events carrying
+    only products whose remaining stock changed. The stream ends after
+    DEAL_STOCK_STREAM_MAX_SECONDS; EventSource clients reconnect on their own.
+    Must run inside the request context (stream_with_context); the route
+    releases the stream slot when the response closes.
+    """
+    poll_seconds = _setting('DEAL_STOCK_STREAM_POLL_SECONDS')
+    deadline = time.monotonic() + _setting('DEAL_STOCK_STREAM_MAX_SECONDS')
+    keepalive_every = 15
+    last_sent_at = time.monotonic()
+
+    # Give back the pooled connection; the stream only needs one between polls
+    db.session.remove()
+
+    with _changed:
+        seen = _change_counters.get(group_deal_id, 0)
+    stock = dict(initial_stock)
+    yield f'retry: {int(poll_seconds * 1000)}\n'
+    yield _sse('snapshot', {'stock': stock})
+
+    while time.monotonic() < deadline:
+        with _changed:
+            _changed.wait_for(lambda: _change_counters.get(group_deal_id, 0) != seen, timeout=poll_seconds)
+            seen = _change_counters.get(group_deal_id, 0)
+
+        try:
+            current = get_stock_snapshot(group_deal_id, max_age=poll_seconds)
+        finally:
+            db.session.remove()
+        if current is None:
+            yield _sse('closed', {'group_deal_id': group_deal_id})
+            return
+
+        deltas = {
+            product_id: remaining
+            for product_id, remaining in current.items()
+            if product_id not in stock or stock[product_id] != remaining
+        }
+        removed = [product_id for product_id in stock if product_id not in current]
+        stock = dict(current)
+
+        if deltas or removed:
+            yield _sse('stock', {'stock': deltas, 'removed': removed})
+            last_sent_at = time.monotonic()
+        elif time.monotonic() - last_sent_at >= keepalive_every:
+            yield ': keepalive\n\n'
+            last_sent_at = time.monotonic()
@@ -3,63 +3,341 @@ Stock management utilities for handling inventory in group deals.
 
 This module provides thread-safe stock management using database row-level locking
 to prevent race conditions during high concurrency scenarios.
+
+All rows a cart needs are locked with a single SELECT ... FOR UPDATE in primary-key
+order (so concurrent checkouts always acquire locks in the same order and cannot
+deadlock each other), the whole cart is validated in memory, and the net changes
+are applied with one UPDATE.
+
+Products flagged with StockMode.ATOMIC skip the lock entirely: each reservation
+is a single conditional UPDATE (deal_stock_limit >= quantity) whose affected
+row count decides success, so a hot product never serializes checkouts on a
+SELECT ... FOR UPDATE and still cannot be oversold.
+
+Every process also keeps a small sold-out gate: whenever a reservation finds a
+product short (or leaves it at zero) the known remaining stock is remembered for
+STOCK_GATE_TTL_SECONDS, and check_stock_gate() rejects carts that cannot be
+filled before any transaction is opened. Restoring stock clears the entry.
+
+Successful changes are noted on the session so live stock streams
+(utils/stock_events.py) are notified once the caller commits.
 """
 
+import threading
+import time
+from collections import OrderedDict
+
 from models import db
 from models.groupdeal import GroupDealProduct
-from sqlalchemy import select
+from constants.status_enums import StockMode
+from sqlalchemy import case
+from sqlalchemy.orm.attributes import set_committed_value
 from flask import current_app
+from config import Config
+from utils.stock_events import note_stock_change
+
+
+# (group_deal_id, product_id) -> (known remaining stock, recorded_at monotonic)
+_known_stock = {}
+_gate_lock = threading.Lock()
+
+
+def _gate_ttl():
+    try:
+        return current_app.config.get('STOCK_GATE_TTL_SECONDS', Config.STOCK_GATE_TTL_SECONDS)
+    except RuntimeError:
+        return Config.STOCK_GATE_TTL_SECONDS
+
+
+def _remember_stock(group_deal_id, product_id, remaining):
+    """Record that a product is known to have at most `remaining` units left"""
+    if remaining is None:
+        return
+    with _gate_lock:
+        _known_stock[(group_deal_id, product_id)] = (remaining, time.monotonic())
+
+
+def invalidate_stock_gate(group_deal_id, product_ids=None):
+    """
+    Forget known stock levels so the next checkout re-validates against the database.
+
+    Args:
+        group_deal_id: ID of the group deal
+        product_ids: Products to forget, or None for every product in the deal
+    """
+    with _gate_lock:
+        if product_ids is None:
+            for key in [key for key in _known_stock if key[0] == group_deal_id]:
+                del _known_stock[key]
+        else:
+            for product_id in product_ids:
+                _known_stock.pop((group_deal_id, product_id), None)
+
+
+def check_stock_gate(group_deal_id, items):
+    """
+    Reject a cart that is already known to be unfillable, without touching the database.
+
+    Only products this process has seen run short within the TTL are checked;
+    everything else passes through to check_and_reserve_stock().
+
+    Args:
+        group_deal_id: ID of the group deal
+        items: List of dicts with 'product_id' and 'quantity' keys
+
+    Returns:
+        tuple: (admitted: bool, error_message: str or None)
+    """
+    if not _known_stock:
+        return True, None
+
+    ttl = _gate_ttl()
+    now = time.monotonic()
+    with _gate_lock:
+        for product_id, quantity in _sum_quantities(items).items():
+            key = (group_deal_id, product_id)
+            entry = _known_stock.get(key)
+            if entry is None:
+                continue
+            remaining, recorded_at = entry
+            if now - recorded_at > ttl:
+                del _known_stock[key]
+                continue
+            if remaining < quantity:
+                return False, f'库存不足。商品当前库存: {remaining}，需要: {quantity}'
+    return True, None
+
+
+def _sum_quantities(items):
+    """Collapse cart lines into {product_id: total quantity}, keeping first-seen order"""
+    quantities = OrderedDict()
+    for item in items:
+        product_id = item['product_id']
+        quantities[product_id] = quantities.get(product_id, 0) + item['quantity']
+    return quantities
+
+
+def _load_stock_modes(group_deal_id, product_ids):
+    """
+    Read row ids and stock modes for a cart without taking locks.
+
+    Returns:
+        dict: {product_id: (group_deal_product_id, stock_mode)}
+    """
+    if not product_ids:
+        return {}
+    rows = db.session.query(
+        GroupDealProduct.product_id, GroupDealProduct.id, GroupDealProduct.stock_mode
+    ).filter(
+        GroupDealProduct.group_deal_id == group_deal_id,
+        GroupDealProduct.product_id.in_(list(product_ids))
+    ).all()
+    return {product_id: (row_id, stock_mode) for product_id, row_id, stock_mode in rows}
+
+
+def _lock_deal_products(row_ids):
+    """
+    Lock group deal product rows in one query.
+
+    Rows are read in primary-key order so every transaction acquires its row
+    locks in the same order.
+
+    Returns:
+        dict: {product_id: GroupDealProduct}
+    """
+    if not row_ids:
+        return {}
+    rows = db.session.query(GroupDealProduct).filter(
+        GroupDealProduct.id.in_(list(row_ids))
+    ).order_by(GroupDealProduct.id).with_for_update().populate_existing().all()
+    return {row.product_id: row for row in rows}
+
+
+def _apply_stock_deltas(rows, deltas):
+    """
+    Apply net stock changes to locked rows with a single UPDATE.
+
+    Args:
+        rows (dict): {product_id: GroupDealProduct} locked by _lock_deal_products
+        deltas (dict): {product_id: change}; negative reserves stock, positive restores it
+
+    Returns:
+        int: Number of rows updated
+    """
+    changes = {
+        rows[product_id].id: delta
+        for product_id, delta in deltas.items()
+        if delta and product_id in rows and rows[product_id].deal_stock_limit is not None
+    }
+    if not changes:
+        return 0
+
+    ids = sorted(changes)
+    db.session.query(GroupDealProduct).filter(
+        GroupDealProduct.id.in_(ids)
+    ).update({
+        GroupDealProduct.deal_stock_limit: GroupDealProduct.deal_stock_limit + case(changes, value=GroupDealProduct.id)
+    }, synchronize_session=False)
+
+    # Keep the already-loaded objects in step without marking them dirty
+    for row in rows.values():
+        if row.id in changes:
+            set_committed_value(row, 'deal_stock_limit', row.deal_stock_limit + changes[row.id])
+    return len(ids)
+
+
+def _apply_atomic_delta(row_id, delta):
+    """
+    Change stock on an atomic-mode row without a prior lock.
+
+    Decrements only succeed while enough stock remains
+    (UPDATE ... WHERE deal_stock_limit >= :quantity), so concurrent checkouts
+    can never drive stock negative; the affected row count is the verdict.
+
+    Returns:
+        tuple: (success: bool, current_stock: int or None). On a failed decrement
+        current_stock is the value read by the one SELECT that also tells
+        unlimited stock apart from a shortage; otherwise it is None.
+    """
+    query = db.session.query(GroupDealProduct).filter(
+        GroupDealProduct.id == row_id,
+        GroupDealProduct.deal_stock_limit.isnot(None)
+    )
+    if delta < 0:
+        query = query.filter(GroupDealProduct.deal_stock_limit >= -delta)
+    updated = query.update({
+        GroupDealProduct.deal_stock_limit: GroupDealProduct.deal_stock_limit + delta
+    }, synchronize_session=False)
+    if updated:
+        return True, None
+    if delta > 0:
+        return True, None  # Unlimited stock: nothing to restore
+    # Distinguish unlimited stock from a failed decrement
+    current_stock = db.session.query(GroupDealProduct.deal_stock_limit).filter(
+        GroupDealProduct.id == row_id
+    ).scalar()
+    return current_stock is None, current_stock
+
+
+def _remember_sold_out(group_deal_id, rows):
+    """Feed the gate with locked rows a successful reservation left at zero"""
+    for product_id, deal_product in rows.items():
+        if deal_product.deal_stock_limit == 0:
+            _remember_stock(group_deal_id, product_id, 0)
+
+
+class _InsufficientStock(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def _change_stock(group_deal_id, deltas, shortage_message, require_all=True):
+    """
+    Apply net stock changes for a cart across both stock modes.
+
+    Locked-mode rows are locked in one query, validated together and written
+    with one UPDATE. Atomic-mode rows are changed with conditional UPDATEs and
+    never locked up front. When atomic rows are involved the writes run in a
+    SAVEPOINT so a failed decrement leaves no partial reservation behind.
+
+    Args:
+        group_deal_id: ID of the group deal
+        deltas (dict): {product_id: change}; negative reserves stock, positive restores it
+        shortage_message (callable): (current_stock, needed) -> error message
+        require_all (bool): Fail if a product is not part of the deal
+
+    Returns:
+        tuple: (success: bool, error_message: str or None, locked_rows: dict)
+    """
+    modes = _load_stock_modes(group_deal_id, deltas.keys())
+
+    if require_all:
+        for product_id in deltas:
+            if product_id not in modes:
+                return False, f'Product {product_id} not found in this group deal', {}
+
+    locked_ids = [row_id for product_id, (row_id, mode) in modes.items() if mode != StockMode.ATOMIC.value]
+    atomic = sorted(
+        (row_id, product_id) for product_id, (row_id, mode) in modes.items()
+        if mode == StockMode.ATOMIC.value and deltas.get(product_id)
+    )
+
+    # Lock every locked-mode row the cart touches in one round trip, then validate in memory
+    rows = _lock_deal_products(locked_ids)
+    for product_id, delta in deltas.items():
+        deal_product = rows.get(product_id)
+        if deal_product is None or deal_product.deal_stock_limit is None or delta >= 0:
+            continue
+        if deal_product.deal_stock_limit < -delta:
+            _remember_stock(group_deal_id, product_id, deal_product.deal_stock_limit)
+            return False, shortage_message(deal_product.deal_stock_limit, -delta), rows
+
+    if not atomic:
+        if _apply_stock_deltas(rows, deltas):
+            note_stock_change(group_deal_id)
+        _remember_sold_out(group_deal_id, rows)
+        return True, None, rows
+
+    try:
+        with db.session.begin_nested():
+            _apply_stock_deltas(rows, deltas)
+            for row_id, product_id in atomic:
+                applied, current_stock = _apply_atomic_delta(row_id, deltas[product_id])
+                if not applied:
+                    _remember_stock(group_deal_id, product_id, current_stock)
+                    raise _InsufficientStock(shortage_message(current_stock, -deltas[product_id]))
+    except _InsufficientStock as e:
+        # SAVEPOINT rolled back; reload locked rows so in-memory values match the database
+        for row in rows.values():
+            db.session.refresh(row)
+        return False, e.message, rows
+
+    note_stock_change(group_deal_id)
+    _remember_sold_out(group_deal_id, rows)
+    return True, None, rows
 
 
 def check_and_reserve_stock(group_deal_id, items):
     """
     Check if sufficient stock is available for the given items and reserve it.
-    
+
     This function uses row-level locking (SELECT FOR UPDATE) to ensure
-    thread-safety during concurrent checkouts.
-    
+    thread-safety during concurrent checkouts. Products in atomic stock mode
+    are reserved with a conditional decrement instead.
+
     Args:
         group_deal_id: ID of the group deal
         items: List of dicts with 'product_id' and 'quantity' keys
-        
+
     Returns:
         tuple: (success: bool, error_message: str or None)
-        
+
     Raises:
         Exception: If database operations fail
     """
     try:
-        for item in items:
-            product_id = item['product_id']
-            quantity = item['quantity']
-            
-            # Get the group deal product with row-level lock to prevent race conditions
-            # This ensures no other transaction can modify this row until we commit
-            deal_product = db.session.query(GroupDealProduct).filter_by(
-                group_deal_id=group_deal_id,
-                product_id=product_id
-            ).with_for_update().first()
-            
-            if not deal_product:
-                return False, f'Product {product_id} not found in this group deal'
-            
-            # Check if stock management is enabled (null/None means unlimited stock)
-            if deal_product.deal_stock_limit is not None:
-                current_stock = deal_product.deal_stock_limit
-                
-                if current_stock < quantity:
-                    return False, f'库存不足。商品当前库存: {current_stock}，需要: {quantity}'
-                
-                # Deduct stock
-                deal_product.deal_stock_limit = current_stock - quantity
+        quantities = _sum_quantities(items)
+
+        success, error_message, rows = _change_stock(
+            group_deal_id,
+            {product_id: -quantity for product_id, quantity in quantities.items()},
+            lambda current_stock, quantity: f'库存不足。商品当前库存: {current_stock}，需要: {quantity}'
+        )
+        if not success:
+            return False, error_message
+
+        for product_id, quantity in quantities.items():
+            deal_product = rows.get(product_id)
+            if deal_product is not None and deal_product.deal_stock_limit is not None:
                 current_app.logger.info(
                     f'Reserved stock for product {product_id}: {quantity} units. '
                     f'Remaining: {deal_product.deal_stock_limit}'
                 )
-        
+
         # Changes will be committed by the calling function
         return True, None
-        
+
     except Exception as e:
         current_app.logger.error(f'Error checking/reserving stock: {e}', exc_info=True)
         raise
@@ -68,40 +346,35 @@ def check_and_reserve_stock(group_deal_id, items):
 def restore_stock(group_deal_id, items):
     """
     Restore stock for the given items (e.g., when an order is cancelled or updated).
-    
+
     This function uses row-level locking to ensure thread-safety.
-    
+
     Args:
         group_deal_id: ID of the group deal
         items: List of dicts with 'product_id' and 'quantity' keys
-        
+
     Returns:
         bool: True if successful
-        
+
     Raises:
         Exception: If database operations fail
     """
     try:
-        for item in items:
-            product_id = item['product_id']
-            quantity = item['quantity']
-            
-            # Get the group deal product with row-level lock
-            deal_product = db.session.query(GroupDealProduct).filter_by(
-                group_deal_id=group_deal_id,
-                product_id=product_id
-            ).with_for_update().first()
-            
+        quantities = _sum_quantities(items)
+
+        # Restore stock
+        _, _, rows = _change_stock(group_deal_id, dict(quantities), None, require_all=False)
+        invalidate_stock_gate(group_deal_id, quantities.keys())
+        for product_id, quantity in quantities.items():
+            deal_product = rows.get(product_id)
             if deal_product and deal_product.deal_stock_limit is not None:
-                # Restore stock
-                deal_product.deal_stock_limit += quantity
                 current_app.logger.info(
                     f'Restored stock for product {product_id}: {quantity} units. '
                     f'New stock: {deal_product.deal_stock_limit}'
                 )
-        
+
         return True
-        
+
     except Exception as e:
         current_app.logger.error(f'Error restoring stock: {e}', exc_info=True)
         raise
@@ -110,11 +383,11 @@ def restore_stock(group_deal_id, items):
 def get_available_stock(group_deal_id, product_id):
     """
     Get the current available stock for a product in a group deal.
-    
+
     Args:
         group_deal_id: ID of the group deal
         product_id: ID of the product
-        
+
     Returns:
         int or None: Available stock count, or None if unlimited stock
     """
@@ -123,12 +396,12 @@ def get_available_stock(group_deal_id, product_id):
             group_deal_id=group_deal_id,
             product_id=product_id
         ).first()
-        
+
         if not deal_product:
             return None
-        
+
         return deal_product.deal_stock_limit
-        
+
     except Exception as e:
         current_app.logger.error(f'Error getting available stock: {e}', exc_info=True)
         return None
@@ -137,62 +410,59 @@ def get_available_stock(group_deal_id, product_id):
 def update_stock_after_order_modification(group_deal_id, old_items, new_items):
     """
     Update stock when an order is modified.
-    
+
     This function calculates the difference between old and new items and
     adjusts stock accordingly.
-    
+
     Args:
         group_deal_id: ID of the group deal
         old_items: List of dicts with 'product_id' and 'quantity' keys (old order)
         new_items: List of dicts with 'product_id' and 'quantity' keys (new order)
-        
+
     Returns:
         tuple: (success: bool, error_message: str or None)
     """
     try:
         # Build dictionaries for easy comparison
-        old_quantities = {item['product_id']: item['quantity'] for item in old_items}
-        new_quantities = {item['product_id']: item['quantity'] for item in new_items}
-        
-        # Get all affected products
-        all_product_ids = set(old_quantities.keys()) | set(new_quantities.keys())
-        
-        # Calculate net changes and check stock availability
-        for product_id in all_product_ids:
-            old_qty = old_quantities.get(product_id, 0)
-            new_qty = new_quantities.get(product_id, 0)
-            net_change = new_qty - old_qty
-            
-            if net_change == 0:
-                continue  # No change for this product
-            
-            # Get the group deal product with row-level lock
-            deal_product = db.session.query(GroupDealProduct).filter_by(
-                group_deal_id=group_deal_id,
-                product_id=product_id
-            ).with_for_update().first()
-            
-            if not deal_product:
-                return False, f'Product {product_id} not found in this group deal'
-            
-            # Check if stock management is enabled
-            if deal_product.deal_stock_limit is not None:
-                if net_change > 0:
-                    # Increasing quantity - check if enough stock
-                    if deal_product.deal_stock_limit < net_change:
-                        return False, f'库存不足。商品当前库存: {deal_product.deal_stock_limit}，需要增加: {net_change}'
-                    deal_product.deal_stock_limit -= net_change
-                else:
-                    # Decreasing quantity - restore stock
-                    deal_product.deal_stock_limit += abs(net_change)
-                
+        old_quantities = _sum_quantities(old_items)
+        new_quantities = _sum_quantities(new_items)
+
+        # Net change per product: positive means more stock is needed
+        net_changes = OrderedDict()
+        for product_id in list(old_quantities.keys()) + list(new_quantities.keys()):
+            if product_id in net_changes:
+                continue
+            net_change = new_quantities.get(product_id, 0) - old_quantities.get(product_id, 0)
+            if net_change != 0:
+                net_changes[product_id] = net_change
+
+        if not net_changes:
+            return True, None
+
+        success, error_message, rows = _change_stock(
+            group_deal_id,
+            {product_id: -net_change for product_id, net_change in net_changes.items()},
+            lambda current_stock, needed: f'库存不足。商品当前库存: {current_stock}，需要增加: {needed}'
+        )
+        if not success:
+            return False, error_message
+
+        # Products handed back by the edit may have left the sold-out state
+        invalidate_stock_gate(
+            group_deal_id,
+            [product_id for product_id, net_change in net_changes.items() if net_change < 0]
+        )
+
+        for product_id, net_change in net_changes.items():
+            deal_product = rows.get(product_id)
+            if deal_product is not None and deal_product.deal_stock_limit is not None:
                 current_app.logger.info(
                     f'Updated stock for product {product_id}: net change {net_change}. '
                     f'New stock: {deal_product.deal_stock_limit}'
                 )
-        
+
         return True, None
-        
+
     except Exception as e:
         current_app.logger.error(f'Error updating stock after order modification: {e}', exc_info=True)
         raise
@@ -0,0 +1,120 @@
+"""
+Set-based bulk changes to users (source, status, roles).
+
+Targets are an explicit id list or a filter (status, user_source, role,
+search). Matching ids are walked in id order, chunk_size at a time; each
+chunk is one UPDATE / INSERT / DELETE and its own commit, so re-tagging a
+few hundred users never holds row locks across the whole set. Callers
+invalidate auth caches for the returned ids (utils/auth.py).
+"""
+from sqlalchemy import delete, insert, select
+
+from models import db
+from models.base import utc_now
+from models.user import User, UserRole
+from utils.search import search_user_ids
+
+
+def user_filters(user_ids=None, user_filter=None, exclude_user_id=None):
+    """
+    Filter expressions on User for a bulk target.
+
+    Args:
+        user_ids (list, optional): Explicit user IDs
+        user_filter (dict, optional): status, user_source, role and/or search
+        exclude_user_id (int, optional): User never affected (the acting admin)
+
+    Returns:
+        list: SQLAlchemy filter expressions
+    """
+    filters = []
+    if user_ids:
+        filters.append(User.id.in_(user_ids))
+    user_filter = user_filter or {}
+    if user_filter.get('status'):
+        filters.append(User.status == user_filter['status'])
+    if user_filter.get('user_source'):
+        filters.append(User.user_source == user_filter['user_source'])
+    if user_filter.get('role'):
+        filters.append(User.id.in_(select(UserRole.user_id).where(UserRole.role == user_filter['role'])))
+    if user_filter.get('search'):
+        filters.append(User.id.in_(search_user_ids(user_filter['search'])))
+    if exclude_user_id is not None:
+        filters.append(User.id != exclude_user_id)
+    return filters
+
+
+def _id_chunks(filters, chunk_size):
+    """Yield lists of matching user IDs in id order (keyset, re-queried after each chunk commits)"""
+    last_id = 0
+    while True:
+        user_ids = list(db.session.scalars(
+            select(User.id).where(*filters, User.id > last_id).order_by(User.id).limit(chunk_size)
+        ))
+        if not user_ids:
+            return
+        yield user_ids
+        if len(user_ids) < chunk_size:
+            return
+        last_id = user_ids[-1]
+
+
+def bulk_set_user_fields(filters, values, chunk_size):
+    """
+    Set columns on every matching user whose value differs.
+
+    Args:
+        filters (list): Filter expressions from user_filters()
+        values (dict): {column name: new value}, e.g. {'user_source': '花泽'}
+        chunk_size (int): Users per transaction
+
+    Returns:
+        list: IDs of the users that changed
+    """
+    differs = db.or_(*[
+        db.or_(getattr(User, name).is_(None), getattr(User, name) != value) for name, value in values.items()
+    ])
+    changes = {getattr(User, name): value for name, value in values.items()}
+    updated_ids = []
+    for user_ids in _id_chunks(filters + [differs], chunk_size):
+        User.query.filter(User.id.in_(user_ids)).update(
+            {**changes, User.updated_at: utc_now()}, synchronize_session=False
+        )
+        db.session.commit()
+        updated_ids.extend(user_ids)
+    return updated_ids
+
+
+def bulk_assign_role(filters, role, chunk_size):
+    """
+    Give a role to every matching user that does not have it yet.
+
+    Returns:
+        list: IDs of the users that gained the role
+    """
+    has_role = User.id.in_(select(UserRole.user_id).where(UserRole.role == role))
+    assigned_ids = []
+    for user_ids in _id_chunks(filters + [~has_role], chunk_size):
+        now = utc_now()
+        db.session.execute(insert(UserRole), [
+            {'user_id': user_id, 'role': role, 'created_at': now, 'updated_at': now} for user_id in user_ids
+        ])
+        db.session.commit()
+        assigned_ids.extend(user_ids)
+    return assigned_ids
+
+
+def bulk_remove_role(filters, role, chunk_size):
+    """
+    Take a role away from every matching user that has it.
+
+    Returns:
+        list: IDs of the users that lost the role
+    """
+    has_role = User.id.in_(select(UserRole.user_id).where(UserRole.role == role))
+    removed_ids = []
+    for user_ids in _id_chunks(filters + [has_role], chunk_size):
+        db.session.execute(delete(UserRole).where(UserRole.role == role, UserRole.user_id.in_(user_ids)))
+        db.session.commit()
+        removed_ids.extend(user_ids)
+    return removed_ids